@@ -0,0 +1,517 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import mutationModifications
+import storage
+
+# Description: Este script contiene el motor de agregación de neoantígenos compartidos entre péptidos, genes y pacientes.
+
+# Directorio de los informes de neoantígenos compartidos
+REPORTS_DIR = "resultados neoantigenos combinados"
+
+
+class NeoantigenIndex:
+    def __init__(self, predictions_df):
+        """
+        Construye los índices de los neoantígenos (predicciones SB y WB) a partir de las predicciones únicas.
+        Cada columna se codifica una sola vez como enteros y las relaciones péptido↔paciente, gen↔péptido y
+        gen↔paciente se guardan como matrices de incidencia dispersas (CSR), cuyas celdas cuentan las apariciones.
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones con las columnas 'peptide', 'gen', 'patientId' y 'Binding_Classification'.
+        """
+        self.neoantigens = mutationModifications.select_neoantigens(predictions_df).reset_index(drop=True)
+        self._codes = {}
+        self._matrices = {}
+
+    @classmethod
+    def from_table(cls, path="resultados/unique_predictions"):
+        """
+        Lee las predicciones una sola vez y construye el índice.
+        Args:
+            path (str, opcional): Ruta de la tabla de predicciones, con o sin extensión. Por defecto es "resultados/unique_predictions".
+        Returns:
+            NeoantigenIndex: El índice de los neoantígenos.
+        """
+        # Sin columnas categóricas, para que los informes contengan los valores originales
+        return cls(storage.read_table(path, categorical=False))
+
+    def codes(self, column):
+        """
+        Devuelve los códigos enteros de una columna y sus etiquetas, ordenadas como en groupby (-1 para los valores nulos).
+        """
+        if column not in self._codes:
+            self._codes[column] = pd.factorize(self.neoantigens[column], sort=True)
+        return self._codes[column]
+
+    def incidence(self, rows, columns):
+        """
+        Devuelve la matriz de incidencia dispersa entre dos columnas, por ejemplo ('peptide', 'patientId').
+        Args:
+            rows (str): Columna de las filas de la matriz.
+            columns (str): Columna de las columnas de la matriz.
+        Returns:
+            scipy.sparse.csr_matrix: Matriz con una fila por valor de rows y una columna por valor de columns.
+                Cada celda es el número de neoantígenos con esa combinación de valores.
+        """
+        if (rows, columns) not in self._matrices:
+            row_codes, row_labels = self.codes(rows)
+            column_codes, column_labels = self.codes(columns)
+            valid = (row_codes >= 0) & (column_codes >= 0)
+            self._matrices[(rows, columns)] = sparse.csr_matrix(
+                (np.ones(valid.sum(), dtype=np.int32), (row_codes[valid], column_codes[valid])),
+                shape=(len(row_labels), len(column_labels)))
+        return self._matrices[(rows, columns)]
+
+    @property
+    def peptide_patient(self):
+        return self.incidence("peptide", "patientId")
+
+    @property
+    def gene_peptide(self):
+        return self.incidence("gen", "peptide")
+
+    @property
+    def gene_patient(self):
+        return self.incidence("gen", "patientId")
+
+    def repeated(self, column):
+        """
+        Selecciona los neoantígenos cuyo valor de una columna aparece más de una vez.
+        Equivale a duplicated(subset=[column], keep=False), pero a partir de los recuentos de cada código.
+        Args:
+            column (str): La columna, por ejemplo 'peptide' o 'gen'.
+        Returns:
+            pandas.DataFrame: Los neoantígenos repetidos, en el orden original.
+        """
+        codes, labels = self.codes(column)
+        occurrences = np.bincount(codes[codes >= 0], minlength=len(labels))
+        repeated = (codes >= 0) & (occurrences[np.maximum(codes, 0)] > 1)
+        return self.neoantigens[repeated]
+
+    def shared(self, key, member):
+        """
+        Agrupa los miembros distintos de cada clave y se queda con las claves que tienen más de uno,
+        por ejemplo los péptidos presentes en más de un paciente (key='peptide', member='patientId').
+        El número de miembros distintos de cada clave es el número de celdas no nulas de su fila en la matriz de incidencia.
+        Args:
+            key (str): Columna de agrupación.
+            member (str): Columna cuyos valores distintos se cuentan y se listan.
+        Returns:
+            pandas.DataFrame: Una fila por clave (ordenadas como en groupby) con el array de sus miembros distintos,
+                en orden de aparición.
+        """
+        key_codes, key_labels = self.codes(key)
+        shared_keys = self.incidence(key, member).getnnz(axis=1) > 1
+
+        # Pares (clave, miembro) distintos de las claves compartidas, en orden de aparición y agrupados por clave
+        rows = (key_codes >= 0) & shared_keys[np.maximum(key_codes, 0)]
+        pairs = pd.DataFrame({"code": key_codes[rows], member: self.neoantigens[member].to_numpy()[rows]}).drop_duplicates()
+        pairs = pairs.sort_values("code", kind="stable")
+        group_codes, starts = np.unique(pairs["code"].to_numpy(), return_index=True)
+
+        members = np.empty(len(group_codes), dtype=object)
+        for position, values in enumerate(np.split(pairs[member].to_numpy(), starts[1:]) if len(starts) else []):
+            members[position] = values
+        return pd.DataFrame({key: np.asarray(key_labels)[group_codes], member: members})
+
+    def reports(self):
+        """
+        Genera todos los informes de neoantígenos compartidos a partir de los índices.
+        Returns:
+            dict: Diccionario {nombre del archivo: DataFrame} con los informes.
+        """
+        return {
+            "neoantigenosRepetidosPorPeptido.csv": self.repeated("peptide"),
+            "genesConNeoantigenosRepetidos.csv": self.repeated("gen"),
+            "pacientesConNeoantigenosRepetidosPor_peptide.csv": self.shared("peptide", "patientId"),
+            "pacientesConNeoantigenosRepetidosPor_gen.csv": self.shared("gen", "patientId"),
+            "genesConNeoantigenosPorPetido.csv": self.shared("gen", "peptide"),
+        }
+
+
+class CohortIncidence:
+    # Archivos en los que se guarda la estructura
+    MATRIX_FILES = {"peptide": "paciente_peptido.npz", "gen": "paciente_gen.npz"}
+    LABEL_FILES = {"patientId": "pacientes", "peptide": "peptidos", "gen": "genes"}
+
+    def __init__(self, patients, peptides, genes, patient_peptide, patient_gene):
+        """
+        Matrices de incidencia binarias paciente × péptido y paciente × gen de los neoantígenos de una cohorte.
+        Los recuentos de pacientes de cada péptido y gen se calculan una sola vez, de modo que las consultas
+        de recurrencia y de neoantígenos públicos no recorren las predicciones.
+        Args:
+            patients (array-like): Etiquetas de las filas (pacientes).
+            peptides (array-like): Etiquetas de las columnas de patient_peptide.
+            genes (array-like): Etiquetas de las columnas de patient_gene.
+            patient_peptide (scipy.sparse matrix): Incidencia paciente × péptido.
+            patient_gene (scipy.sparse matrix): Incidencia paciente × gen.
+        """
+        self.patients = pd.Index(patients)
+        self.labels = {"peptide": pd.Index(peptides), "gen": pd.Index(genes)}
+        self.matrices = {}
+        self.columns = {}
+        self.patient_counts = {}
+        for column, matrix in (("peptide", patient_peptide), ("gen", patient_gene)):
+            matrix = sparse.csr_matrix(matrix, dtype=np.int32)
+            matrix.data[:] = 1
+            matrix.eliminate_zeros()
+            self.matrices[column] = matrix
+            # Copia por columnas (CSC) para consultar los pacientes de cada péptido o gen sin recorrer la matriz
+            self.columns[column] = matrix.tocsc()
+            self.patient_counts[column] = np.diff(self.columns[column].indptr)
+
+    @classmethod
+    def from_predictions(cls, predictions_df):
+        """
+        Construye la estructura a partir de las predicciones clasificadas (solo se usan las SB y WB).
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones con las columnas 'peptide', 'gen', 'patientId' y 'Binding_Classification'.
+        Returns:
+            CohortIncidence: La estructura de incidencia de la cohorte.
+        """
+        return cls.from_index(NeoantigenIndex(predictions_df))
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Construye la estructura a partir de un NeoantigenIndex, reutilizando sus códigos.
+        """
+        return cls(index.codes("patientId")[1], index.codes("peptide")[1], index.codes("gen")[1],
+                   index.incidence("patientId", "peptide"), index.incidence("patientId", "gen"))
+
+    def save(self, directory):
+        """
+        Guarda las matrices en formato .npz y las etiquetas en tablas de storage.
+        Args:
+            directory (str): Directorio donde se guarda la estructura.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for column, filename in self.MATRIX_FILES.items():
+            sparse.save_npz(os.path.join(directory, filename), self.matrices[column])
+        labels = {"patientId": self.patients, **self.labels}
+        for column, filename in self.LABEL_FILES.items():
+            storage.write_table(pd.DataFrame({column: labels[column]}), os.path.join(directory, filename), categorical_columns=[])
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Carga una estructura guardada con save.
+        Args:
+            directory (str): Directorio de la estructura.
+        Returns:
+            CohortIncidence: La estructura de incidencia de la cohorte.
+        """
+        labels = {column: storage.read_table(os.path.join(directory, filename), categorical=False)[column]
+                  for column, filename in cls.LABEL_FILES.items()}
+        matrices = {column: sparse.load_npz(os.path.join(directory, filename)) for column, filename in cls.MATRIX_FILES.items()}
+        return cls(labels["patientId"], labels["peptide"], labels["gen"], matrices["peptide"], matrices["gen"])
+
+    def recurrent(self, min_patients=2, column="peptide"):
+        """
+        Devuelve los péptidos (o genes) presentes en al menos min_patients pacientes.
+        Args:
+            min_patients (int, opcional): Número mínimo de pacientes. Por defecto es 2.
+            column (str, opcional): "peptide" o "gen". Por defecto es "peptide".
+        Returns:
+            pandas.DataFrame: Columnas column y "n_patients", ordenadas de más a menos pacientes.
+        """
+        counts = self.patient_counts[column]
+        selected = np.flatnonzero(counts >= min_patients)
+        selected = selected[np.lexsort((selected, -counts[selected]))]
+        return pd.DataFrame({column: self.labels[column][selected], "n_patients": counts[selected]})
+
+    def top_public(self, k=10, column="peptide"):
+        """
+        Devuelve los k neoantígenos públicos más frecuentes, es decir, los péptidos (o genes) presentes en más pacientes.
+        Args:
+            k (int, opcional): Número de neoantígenos. Por defecto es 10.
+            column (str, opcional): "peptide" o "gen". Por defecto es "peptide".
+        Returns:
+            pandas.DataFrame: Columnas column y "n_patients", ordenadas de más a menos pacientes.
+        """
+        counts = self.patient_counts[column]
+        k = min(k, len(counts))
+        # Selección parcial en tiempo lineal: solo se ordenan los candidatos con al menos el k-ésimo recuento
+        threshold = np.partition(counts, len(counts) - k)[len(counts) - k] if k else np.inf
+        candidates = np.flatnonzero(counts >= threshold)
+        selected = candidates[np.lexsort((candidates, -counts[candidates]))][:k]
+        return pd.DataFrame({column: self.labels[column][selected], "n_patients": counts[selected]})
+
+    def patients_with(self, value, column="peptide"):
+        """
+        Devuelve los pacientes que presentan un péptido (o gen).
+        """
+        matrix = self.columns[column]
+        position = self.labels[column].get_loc(value)
+        return self.patients[matrix.indices[matrix.indptr[position]:matrix.indptr[position + 1]]].tolist()
+
+    def jaccard(self, patient_a, patient_b, column="peptide"):
+        """
+        Calcula el índice de Jaccard entre los neoantígenos de dos pacientes.
+        Returns:
+            float: |A ∩ B| / |A ∪ B|, o 0 si ninguno de los dos tiene neoantígenos.
+        """
+        matrix = self.matrices[column]
+        rows = matrix[[self.patients.get_loc(patient_a), self.patients.get_loc(patient_b)]]
+        shared = rows[0].multiply(rows[1]).nnz
+        union = rows.getnnz(axis=1).sum() - shared
+        return shared / union if union else 0.0
+
+    def overlap(self, patients=None, min_jaccard=0.0, column="peptide"):
+        """
+        Calcula el solapamiento entre todos los pares de pacientes que comparten al menos un neoantígeno.
+        Las intersecciones se obtienen con un único producto disperso M · Mᵀ, sin comparar los pares sin solapamiento.
+        Args:
+            patients (list, opcional): Pacientes a comparar. Por defecto todos.
+            min_jaccard (float, opcional): Índice de Jaccard mínimo de los pares devueltos. Por defecto es 0.
+            column (str, opcional): "peptide" o "gen". Por defecto es "peptide".
+        Returns:
+            pandas.DataFrame: Columnas "patient_a", "patient_b", "shared" y "jaccard", con cada par una sola vez.
+        Raises:
+            KeyError: Si algún paciente de patients no está en la cohorte.
+        """
+        matrix = self.matrices[column]
+        labels = self.patients
+        if patients is not None:
+            positions = self.patients.get_indexer(patients)
+            # get_indexer devuelve -1 para los pacientes desconocidos, que seleccionaría el último paciente
+            if (positions < 0).any():
+                raise KeyError(f"Pacientes que no están en la cohorte: {list(pd.Index(patients)[positions < 0])}")
+            matrix, labels = matrix[positions], self.patients[positions]
+        sizes = matrix.getnnz(axis=1)
+        intersections = sparse.triu(matrix @ matrix.T, k=1).tocoo()
+        jaccard = intersections.data / (sizes[intersections.row] + sizes[intersections.col] - intersections.data)
+        keep = jaccard >= min_jaccard
+        result = pd.DataFrame({
+            "patient_a": labels[intersections.row[keep]],
+            "patient_b": labels[intersections.col[keep]],
+            "shared": intersections.data[keep],
+            "jaccard": jaccard[keep],
+        })
+        return result.sort_values(["jaccard", "shared"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+class PatientCounts:
+    # Tabla en la que se guardan los contadores y tabla con el hash de las entradas de cada muestra contada
+    FILE = "contadores_pacientes"
+    FINGERPRINTS_FILE = "huellas_muestras"
+
+    # Contadores de cada muestra: número de predicciones de cada clase y número de neoantígenos (SB y WB)
+    # de cada longitud y de cada alelo. El total es el número de predicciones de todas las clases
+    COUNTERS = ["Binding_Classification", "longitud", "allele"]
+    COLUMNS = ["patientId", "sampleId", "counter", "value", "count"]
+
+    # Nombre de las columnas de cada contador en la tabla por paciente
+    COLUMN_NAMES = {"Binding_Classification": "Neoantigen_{}_Count", "longitud": "Neoantigen_Length_{}_Count", "allele": "Neoantigen_Allele_{}_Count"}
+    TOTAL_COLUMN = "Neoantigen_Total_Count"
+
+    def __init__(self, counts_df=None, fingerprints=None):
+        """
+        Contadores de neoantígenos por paciente y muestra, guardados en una tabla pequeña en formato largo
+        (una fila por muestra, contador y valor). Al añadir las predicciones de unas muestras solo se recalculan
+        los contadores de esas muestras, sin volver a recorrer las predicciones del resto de la cohorte.
+        Args:
+            counts_df (pandas.DataFrame, opcional): Tabla de contadores con las columnas de COLUMNS. Por defecto está vacía.
+            fingerprints (pandas.Series, opcional): Hash de las entradas de cada muestra contada por sync
+                (ver sample_fingerprints). Por defecto está vacío.
+        """
+        if counts_df is None:
+            counts_df = pd.DataFrame(columns=self.COLUMNS).astype({"count": "int64"})
+        if fingerprints is None:
+            fingerprints = pd.Series(dtype=object, index=pd.MultiIndex.from_tuples([], names=["patientId", "sampleId"]), name="hash")
+        self.counts = counts_df[self.COLUMNS].reset_index(drop=True)
+        self.fingerprints = fingerprints
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Carga los contadores guardados con save. Si no existen se devuelven unos contadores vacíos.
+        Args:
+            directory (str): Directorio de la tabla.
+        Returns:
+            PatientCounts: Los contadores.
+        """
+        path, fingerprints_path = os.path.join(directory, cls.FILE), os.path.join(directory, cls.FINGERPRINTS_FILE)
+        if storage.resolve_table(path) is None:
+            return cls()
+        fingerprints = None
+        if storage.resolve_table(fingerprints_path) is not None:
+            fingerprints = storage.read_table(fingerprints_path, categorical=False).set_index(["patientId", "sampleId"])["hash"]
+        return cls(storage.read_table(path, categorical=False), fingerprints)
+
+    def save(self, directory):
+        """
+        Guarda los contadores y el hash de las entradas de cada muestra en dos tablas de storage.
+        Args:
+            directory (str): Directorio de las tablas.
+        Returns:
+            str: La ruta de la tabla de contadores.
+        """
+        storage.write_table(self.fingerprints.reset_index(), os.path.join(directory, self.FINGERPRINTS_FILE), categorical_columns=[])
+        return storage.write_table(self.counts, os.path.join(directory, self.FILE), categorical_columns=["patientId", "counter"])
+
+    @classmethod
+    def count(cls, predictions_df):
+        """
+        Calcula los contadores de cada muestra de unas predicciones.
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones con las columnas 'patientId' y 'Binding_Classification' y,
+                si existen, 'sampleId' (si no, cada paciente es una muestra), 'longitud' (si no, se usa la longitud
+                de 'peptide') y 'allele' o 'best_allele'.
+        Returns:
+            pandas.DataFrame: Los contadores, con las columnas de COLUMNS.
+        """
+        keys = pd.DataFrame({
+            "patientId": predictions_df["patientId"].astype(object),
+            "sampleId": predictions_df["sampleId" if "sampleId" in predictions_df.columns else "patientId"].astype(object),
+        })
+        values = {"Binding_Classification": predictions_df["Binding_Classification"].astype(object)}
+        if "longitud" in predictions_df.columns:
+            values["longitud"] = predictions_df["longitud"]
+        elif "peptide" in predictions_df.columns:
+            values["longitud"] = predictions_df["peptide"].astype(str).str.len()
+        allele_column = next((column for column in ["allele", "best_allele"] if column in predictions_df.columns), None)
+        if allele_column is not None:
+            values["allele"] = predictions_df[allele_column].astype(object)
+
+        neoantigens = predictions_df["Binding_Classification"].isin(mutationModifications.NEOANTIGEN_CLASSES).to_numpy()
+        parts = []
+        for counter, column in values.items():
+            rows = slice(None) if counter == "Binding_Classification" else neoantigens
+            counted = keys[rows].assign(value=column[rows].astype(str).to_numpy()).value_counts(sort=False).rename("count").reset_index()
+            parts.append(counted.assign(counter=counter))
+        counts = pd.concat(parts, ignore_index=True)[cls.COLUMNS]
+        return counts.sort_values(["patientId", "sampleId", "counter", "value"], kind="stable").reset_index(drop=True)
+
+    def update(self, predictions_df):
+        """
+        Actualiza los contadores con las predicciones de unas muestras. Los contadores de esas muestras se sustituyen
+        (volver a añadir las mismas predicciones no los duplica) y los del resto de muestras no se modifican.
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones de las muestras nuevas o repetidas (ver count).
+        Returns:
+            list: Los pacientes cuyos contadores han cambiado.
+        """
+        new_counts = self.count(predictions_df)
+        samples = pd.MultiIndex.from_frame(new_counts[["patientId", "sampleId"]].drop_duplicates())
+        kept = ~pd.MultiIndex.from_frame(self.counts[["patientId", "sampleId"]]).isin(samples)
+        self.counts = pd.concat([self.counts[kept], new_counts], ignore_index=True) if kept.any() else new_counts
+        return list(samples.get_level_values("patientId").unique())
+
+    def drop_samples(self, samples):
+        """
+        Elimina los contadores de unas muestras, por ejemplo las que ya no están en el estudio.
+        Args:
+            samples (list): Pares (patientId, sampleId) de las muestras a eliminar.
+        Returns:
+            list: Los pacientes cuyos contadores han cambiado.
+        """
+        dropped = pd.MultiIndex.from_frame(self.counts[["patientId", "sampleId"]]).isin(list(samples))
+        patients = list(self.counts.loc[dropped, "patientId"].unique())
+        self.counts = self.counts[~dropped].reset_index(drop=True)
+        return patients
+
+    @staticmethod
+    def _sample_keys(df):
+        sample_column = "sampleId" if "sampleId" in df.columns else "patientId"
+        return [df["patientId"].astype(object).rename("patientId"), df[sample_column].astype(object).rename("sampleId")]
+
+    @classmethod
+    def sample_fingerprints(cls, inputs_df, key=""):
+        """
+        Calcula un hash de las entradas de cada muestra (por ejemplo, sus mutaciones), para saber qué muestras han
+        cambiado entre dos ejecuciones sin recorrer sus predicciones, que son muchas más filas.
+        Args:
+            inputs_df (pandas.DataFrame): Entradas con la columna 'patientId' y, si existe, 'sampleId'.
+            key (str, opcional): Hash de los parámetros que afectan a todas las muestras. Si cambia, cambian todas.
+        Returns:
+            pandas.Series: El hash de cada muestra, con (patientId, sampleId) como índice.
+        """
+        rows = pd.util.hash_pandas_object(inputs_df, index=False)
+        # El hash de la muestra es la suma de los de sus filas, que no depende del orden; se guarda como texto
+        return (key + ":" + rows.groupby(cls._sample_keys(inputs_df)).sum().map("{:016x}".format)).rename("hash")
+
+    def sync(self, predictions_df, inputs_df, key=""):
+        """
+        Actualiza los contadores con las predicciones de la cohorte, recalculando solo las muestras nuevas o cuyas entradas
+        han cambiado desde la última llamada (según sample_fingerprints) y eliminando las que ya no aparecen.
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones de toda la cohorte (ver count). Solo se leen las filas de
+                las muestras que han cambiado.
+            inputs_df (pandas.DataFrame): Entradas de toda la cohorte de las que salen las predicciones.
+            key (str, opcional): Hash de los parámetros que afectan a todas las muestras (ver sample_fingerprints).
+        Returns:
+            list: Los pacientes cuyos contadores han cambiado.
+        """
+        fingerprints = self.sample_fingerprints(inputs_df, key)
+        changed = fingerprints.index[fingerprints.ne(self.fingerprints.reindex(fingerprints.index)).to_numpy()]
+        # Los contadores de las muestras cambiadas se eliminan antes de recontarlas, por si ya no tienen predicciones
+        patients = self.drop_samples(list(self.fingerprints.index.difference(fingerprints.index)) + list(changed))
+
+        rows = pd.MultiIndex.from_arrays(self._sample_keys(predictions_df)).isin(changed)
+        if rows.any():
+            patients += self.update(predictions_df[rows])
+        self.fingerprints = fingerprints
+        return list(dict.fromkeys(patients))
+
+    def by_patient(self, patients=None):
+        """
+        Devuelve los contadores por paciente (suma de sus muestras), con una columna por contador y valor:
+        'Neoantigen_<clase>_Count' (siempre con SB y WB), 'Neoantigen_Total_Count', 'Neoantigen_Length_<n>_Count'
+        y 'Neoantigen_Allele_<alelo>_Count'.
+        Args:
+            patients (list, opcional): Pacientes a devolver. Por defecto se devuelven todos.
+        Returns:
+            pandas.DataFrame: Una fila por paciente, con 'patientId' como índice.
+        """
+        counts = self.counts if patients is None else self.counts[self.counts["patientId"].isin(patients)]
+        names = [self.COLUMN_NAMES[counter].format(value) for counter, value in zip(counts["counter"].astype(str), counts["value"].astype(str))]
+        wide = counts.assign(column=names).pivot_table(index="patientId", columns="column", values="count", aggfunc="sum", fill_value=0)
+        classes = [self.COLUMN_NAMES["Binding_Classification"].format(value) for value in mutationModifications.NEOANTIGEN_CLASSES]
+        wide = wide.reindex(columns=list(dict.fromkeys(classes + list(wide.columns))), fill_value=0)
+        is_class = counts["counter"] == "Binding_Classification"
+        wide[self.TOTAL_COLUMN] = counts[is_class].groupby("patientId")["count"].sum().reindex(wide.index, fill_value=0)
+        wide.columns.name = None
+        return wide.astype("int64")
+
+    def update_clinical(self, clinical_df, patients=None, columns=None):
+        """
+        Escribe los contadores por paciente en el DataFrame clínico. Con patients solo se modifican las filas de esos
+        pacientes, de modo que el CSV clínico se puede actualizar después de añadir unas muestras sin recalcular el resto.
+        Args:
+            clinical_df (pandas.DataFrame): Datos clínicos con la columna 'Patient ID'.
+            patients (list, opcional): Pacientes a actualizar (por ejemplo, el resultado de update). Por defecto son todos.
+            columns (list, opcional): Columnas de by_patient que se escriben. Por defecto se escriben todas.
+        Returns:
+            pandas.DataFrame: Una copia del DataFrame clínico con las columnas de by_patient. Los pacientes sin
+                predicciones tienen los contadores a 0.
+        """
+        clinical_df = clinical_df.copy()
+        wide = self.by_patient(patients)
+        if columns is not None:
+            wide = wide.reindex(columns=columns, fill_value=0)
+        rows = clinical_df["Patient ID"].isin(patients) if patients is not None else slice(None)
+        for column in wide.columns:
+            if column not in clinical_df.columns:
+                clinical_df[column] = 0
+            clinical_df.loc[rows, column] = clinical_df.loc[rows, "Patient ID"].map(wide[column]).fillna(0).astype("int64")
+        return clinical_df
+
+
+def write_reports(predictions_path="resultados/unique_predictions", output_dir=REPORTS_DIR):
+    """
+    Lee las predicciones una sola vez y guarda todos los informes de neoantígenos compartidos.
+    Args:
+        predictions_path (str, opcional): Ruta de la tabla de predicciones. Por defecto es "resultados/unique_predictions".
+        output_dir (str, opcional): Directorio de los informes. Por defecto es "resultados neoantigenos combinados".
+    Returns:
+        dict: Diccionario {nombre del archivo: DataFrame} con los informes guardados.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    reports = NeoantigenIndex.from_table(predictions_path).reports()
+    for filename, report in reports.items():
+        report.to_csv(os.path.join(output_dir, filename), index=False, sep=",")
+    return reports
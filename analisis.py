@@ -1,131 +1,139 @@
 import getGraphics
-import getDuplicates
+import aggregation
+import rendering
+import statisticalTests
+import storage
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import shapiro, kstest
 
 
-##### Preprocesamiento de los datos  #########
+# Las figuras se renderizan en un pool de procesos, así que el script solo se ejecuta como programa principal
+if __name__ == '__main__':
+    ##### Preprocesamiento de los datos  #########
+
+
+    # Leer el archivo de datos clínicos
+    clinical_df = pd.read_csv('es_dfarber_broad_2014_clinical_data_with_neoantigens.csv')
+
+    # Filtrar solo las muestras que son tumores
+    clinical_df = clinical_df[clinical_df['Sample Class'] == 'Tumor']
+
+    # Obtener los datos clínicos de los pacientes únicos. Se quitan las muestras de los pacientes
+    clinical_df = clinical_df.drop_duplicates(subset=['Patient ID'])
+
+    # Eliminar columna número de muestras
+    clinical_df = clinical_df.drop(columns=['Number of Samples Per Patient'])
 
-
-# Leer el archivo de datos clínicos
-clinical_df = pd.read_csv('es_dfarber_broad_2014_clinical_data_with_neoantigens.csv')
-
-# Filtrar solo las muestras que son tumores
-clinical_df = clinical_df[clinical_df['Sample Class'] == 'Tumor']
-
-# Obtener los datos clínicos de los pacientes únicos. Se quitan las muestras de los pacientes
-clinical_df = clinical_df.drop_duplicates(subset=['Patient ID'])
-
-# Eliminar columna número de muestras
-clinical_df = clinical_df.drop(columns=['Number of Samples Per Patient'])
-
-# Guardar en .csv el archivo con el resumen de los datos clínicos
-clinical_df.describe().to_csv('resultados/es_dfarber_broad_2014_clinical_data_summary.csv')
-
-# Crear los intervalos de edad basados en la edad máxima
-clinical_df = getGraphics.createIntervalosEdad(clinical_df)
-
-
-##### Ejecución de pruebas estadísticas para comprobar la normalidad de las variables numéricas  #########
-
-df = clinical_df.select_dtypes(include=['number']) # Seleccionar solo las columnas numéricas
-df = df.dropna() # Elimina filas con valores nulos
-
-custom_titles = {
-    'Diagnosis Age': 'Edad de diagnóstico',
-    'Mutation Count': 'Número de mutaciones',
-    'TMB (nonsynonymous)': 'TMB (no sinónimas)',
-    'Neoantigen_SB_Count': 'Número de neoantígenos fuertes',
-    'Neoantigen_WB_Count': 'Número de neoantígenos débiles',
-}
-
-# Generación de gráficos Q-Q para cada variable numérica
-for column in df.columns:
-    series = df[column] 
-    # crear el gráfico qqplot
-    title = custom_titles.get(column)
-    getGraphics.graficoqq(series, title)
-
-for idx, column in enumerate(df.columns, 1):
-    print(f"\nPruebas para la columna: {column}") 
-    series = df[column] 
-    # Prueba de Shapiro-Wilk 
-    stat, p = shapiro(series) 
-    print(f'Prueba de Shapiro-Wilk: Estadístico={stat}, p={p}') 
-    # Prueba de Kolmogorov-Smirnov 
-    stat, p = kstest(series, 'norm') 
-    print(f'Prueba de Kolmogorov-Smirnov: Estadístico={stat}, p={p}')
-
-    # Crear subgráfico para cada columna
-    plt.subplot(2, len(df.columns)//2 + 1, idx)  # 2 filas, columnas según el número de variables
-    sns.boxplot(y=column, data=clinical_df)
-    title = custom_titles.get(column)
-    plt.title(f'Boxplot {title}')
-    plt.ylabel(title)
-
-plt.tight_layout()  # Ajusta el espaciado entre subgráficos
-plt.savefig('Figuras/boxplots_columnas_numericas.png')  # Guarda la figura como imagen
-plt.close()
-
-##### Generación de gráficos  #########
-
-# Obtener matriz de correlación de variables numéricas
-getGraphics.matrizCorrelacion(clinical_df)
-
-# Crear boxplots de neoantígenos por atributo
-getGraphics.boxplotConjuntoNeoantigenoPorAtributo(clinical_df, 'Sex', title='Boxplot de neoantígenos por sexo', traduccion_atributo='Sexo')
-getGraphics.boxplotConjuntoNeoantigenoPorAtributo(clinical_df, 'Age Interval', title='Boxplot de neoantígenos por intervalo de edad', traduccion_atributo='Intervalo de edad')
-getGraphics.boxplotConjuntoNeoantigenoPorAtributo(clinical_df, 'Overall Survival Status', title='Boxplot de neoantígenos por estado de supervivencia', traduccion_atributo='Estado de supervivencia')
-
-box_pairs=[
-            (("White/Europe", "SB"), ("White/Latin America", "SB")),
-            (("White/Europe", "WB"), ("White/Latin America", "WB"))
-            ]
-getGraphics.boxplotConjuntoNeoantigenoPorAtributo(clinical_df, 'Ethnicity Category', box_pairs=box_pairs, title='Boxplot de neoantígenos por etnia', traduccion_atributo='Etnia')
-
-# Obtener gráfico de número de mutaciones por tipo de mutación
-getGraphics.mutacionesTipo()
-
-# Obtener gráfico de número de mutaciones por tipo de mutación general
-getGraphics.mutacionesTipoGeneral()
-
-# Obtener gráfico de número de neoantígenos por tipo de neoantígeno
-getGraphics.neoantigenosFuertesVsDebiles()
-
-# Obtener gráfico de número de neoantígenos por tipo de mutación
-getGraphics.neoantigenosPorMutacion()
-
-##### Buscar neoantígenos combinados  #########
-
-getDuplicates.genesConNeoantigenosRepetidos()
-getDuplicates.neoantigenosRepetidosPorPeptido()
-getDuplicates.pacientesConNeoantigenosRepetidos('peptide')
-getDuplicates.pacientesConNeoantigenosRepetidos('gen')
-getDuplicates.genesConNeoantigenosPorPetido()
-
-
-######### Generación de gráficos auxiliares  #########
-
-
-# Crear boxplots para cada columna numérica en función de los intervalos de edad
-for column in clinical_df.select_dtypes(include=['number']).columns:
-    if column != 'Diagnosis Age':  # Eliminar la columna de edad
-        #column = clinical_df.dropna(subset=[column])
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(x='Age Interval', y=column, data=clinical_df)
-        plt.title(f'Boxplot of {column} by Age Interval')
-        plt.xlabel('Age Interval')
-        plt.ylabel(column)
-        plt.xticks(rotation=45)
-        plt.savefig(f'Figuras 2/Boxplot of {column} by Age Interval.png', bbox_inches='tight')
-
-# Crear boxplots para cada columna numérica en función del sexo
-getGraphics.boxplotsVariablesNumericasPorAtributo(clinical_df, 'Sex')
-
-# Crear boxplots para cada columna numérica en función de la etnia
-getGraphics.boxplotsVariablesNumericasPorAtributo(clinical_df, 'Ethnicity Category')
-
-# Crear boxplots para cada columna numérica en función de la etnia
-getGraphics.boxplotsVariablesNumericasPorAtributo(clinical_df, 'Overall Survival Status')
+    # Guardar en .csv el archivo con el resumen de los datos clínicos
+    clinical_df.describe().to_csv('resultados/es_dfarber_broad_2014_clinical_data_summary.csv')
+
+    # Crear los intervalos de edad basados en la edad máxima
+    clinical_df = getGraphics.createIntervalosEdad(clinical_df)
+
+
+    ##### Pruebas estadísticas  #########
+
+    df = clinical_df.select_dtypes(include=['number']) # Seleccionar solo las columnas numéricas
+    df = df.dropna() # Elimina filas con valores nulos
+
+    custom_titles = {
+        'Diagnosis Age': 'Edad de diagnóstico',
+        'Mutation Count': 'Número de mutaciones',
+        'TMB (nonsynonymous)': 'TMB (no sinónimas)',
+        'Neoantigen_SB_Count': 'Número de neoantígenos fuertes',
+        'Neoantigen_WB_Count': 'Número de neoantígenos débiles',
+    }
+
+    # Boxplots de neoantígenos por atributo y sus pares de cajas (None compara todas las categorías dentro de cada tipo)
+    box_pairs=[
+                (("White/Europe", "SB"), ("White/Latin America", "SB")),
+                (("White/Europe", "WB"), ("White/Latin America", "WB"))
+                ]
+    boxplots_neoantigenos = [
+        ('Sex', None, 'Boxplot de neoantígenos por sexo', 'Sexo'),
+        ('Age Interval', None, 'Boxplot de neoantígenos por intervalo de edad', 'Intervalo de edad'),
+        ('Overall Survival Status', None, 'Boxplot de neoantígenos por estado de supervivencia', 'Estado de supervivencia'),
+        ('Ethnicity Category', box_pairs, 'Boxplot de neoantígenos por etnia', 'Etnia'),
+    ]
+
+    # Calcular en un solo paso las pruebas de normalidad (Shapiro-Wilk y Kolmogorov-Smirnov) de las variables numéricas,
+    # las de Mann-Whitney de todos los pares de cajas con corrección por comparaciones múltiples y la de chi-cuadrado
+    # de los tipos de mutación. Los resultados se guardan en una tabla que después leen los gráficos
+    contingency_table = getGraphics.tablaContingenciaPorTipoMutacion(getGraphics.leerNeoantigenosPorTipoMutacion())
+    statistics_df = statisticalTests.compute_statistics(
+        numeric_df=df, clinical_df=clinical_df,
+        attributes={atributo: pairs for atributo, pairs, _, _ in boxplots_neoantigenos},
+        contingency_tables={('Clasificación', 'Binding_Classification'): contingency_table})
+    statistics_path = statisticalTests.save_statistics(statistics_df)
+    print(statistics_df.to_string())
+
+
+    ##### Buscar neoantígenos combinados  #########
+
+    # Leer las predicciones una sola vez y generar todos los informes de neoantígenos compartidos
+    aggregation.write_reports()
+
+
+    ##### Generación de gráficos  #########
+
+    # Cada figura se describe como una tarea con sus datos y sus parámetros. Las tareas se renderizan en paralelo
+    # y solo se repiten las figuras cuyos datos han cambiado desde la última ejecución
+    neoantigen_columns = ['Neoantigen_SB_Count', 'Neoantigen_WB_Count']
+    mutations_table = storage.resolve_table('resultados/mutations')
+    mutations_to_be_treated_table = storage.resolve_table('resultados/mutationsToBeTreated')
+    predictions_table = storage.resolve_table('resultados/unique_predictions')
+
+    # Gráficos Q-Q y boxplots de cada variable numérica
+    figure_tasks = [
+        rendering.FigureTask(f'qq {column}', getGraphics.graficoqq, df[column], {'title': custom_titles.get(column)},
+                             outputs=[f'Figuras/Gráfico q-q por {custom_titles.get(column)}.png'])
+        for column in df.columns
+    ]
+    figure_tasks.append(rendering.FigureTask('boxplots columnas numéricas', getGraphics.boxplotsColumnasNumericas, clinical_df[df.columns],
+                                             {'columns': list(df.columns), 'titles': custom_titles},
+                                             outputs=['Figuras/boxplots_columnas_numericas.png']))
+
+    # Obtener matriz de correlación de variables numéricas
+    figure_tasks.append(rendering.FigureTask('matriz de correlación', getGraphics.matrizCorrelacion, clinical_df.select_dtypes(include=['number']),
+                                             outputs=['Figuras 2/matriz_correlacion.png']))
+
+    # Crear boxplots de neoantígenos por atributo, anotados con los p-valores de la tabla de pruebas estadísticas
+    for atributo, pairs, title, traduccion in boxplots_neoantigenos:
+        figure_tasks.append(rendering.FigureTask(f'neoantígenos por {atributo}', getGraphics.boxplotConjuntoNeoantigenoPorAtributo,
+                                                 clinical_df[[atributo] + neoantigen_columns],
+                                                 {'atributo': atributo, 'box_pairs': pairs, 'title': title, 'traduccion_atributo': traduccion,
+                                                  'statistics_path': statistics_path},
+                                                 inputs=[statistics_path],
+                                                 outputs=[f'Figuras 2/Boxplot del Número de Neoantígenos SB y WB por {atributo}.png']))
+
+    # Gráficos de número de mutaciones por tipo de mutación, por tipo de mutación general, de neoantígenos por tipo
+    # de neoantígeno y de neoantígenos por tipo de mutación. Estas funciones leen sus tablas de 'resultados'
+    figure_tasks += [
+        rendering.FigureTask('mutaciones por tipo', getGraphics.mutacionesTipo, inputs=[mutations_table],
+                             outputs=['Figuras/número_mutaciones_por_tipo.png']),
+        rendering.FigureTask('mutaciones por tipo general', getGraphics.mutacionesTipoGeneral, inputs=[mutations_table],
+                             outputs=['Figuras/número_mutaciones_por_tipo_general.png']),
+        rendering.FigureTask('neoantígenos fuertes vs débiles', getGraphics.neoantigenosFuertesVsDebiles, inputs=[predictions_table],
+                             outputs=['Figuras/número_antígenos_fuertes_vs_debiles.png']),
+        rendering.FigureTask('neoantígenos por tipo de mutación', getGraphics.neoantigenosPorMutacion,
+                             inputs=[mutations_to_be_treated_table, predictions_table],
+                             outputs=['Figuras/neoantígenos_por_tipo_mutación.png']),
+    ]
+
+
+    ######### Generación de gráficos auxiliares  #########
+
+
+    # Crear boxplots para cada columna numérica en función de los intervalos de edad (sin la columna de edad),
+    # del sexo, de la etnia y del estado de supervivencia
+    auxiliares = [('Age Interval', 45), ('Sex', None), ('Ethnicity Category', None), ('Overall Survival Status', None)]
+    for atributo, rotation in auxiliares:
+        for column in clinical_df.select_dtypes(include=['number']).columns:
+            if atributo == 'Age Interval' and column == 'Diagnosis Age':
+                continue
+            figure_tasks.append(rendering.FigureTask(f'boxplot {column} por {atributo}', getGraphics.boxplotVariablePorAtributo,
+                                                     clinical_df[[atributo, column]],
+                                                     {'column': column, 'atributo': atributo, 'rotation': rotation},
+                                                     outputs=[f'Figuras 2/Boxplot of {column} by {atributo}.png']))
+
+    # Renderizar las figuras que han cambiado
+    rendering.FigureRenderer().run(figure_tasks)
@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import aggregation
+import getGraphics
+import main
+import mhcPredictions
+import mutationModifications
+import rendering
+import statisticalTests
+import storage
+
+# Description: Este script contiene el benchmark del pipeline completo sobre una cohorte sintética, con un predictor
+# falso en lugar de MHCflurry para que se pueda ejecutar sin conexión ni modelos.
+
+# Archivo JSON con los resultados del benchmark
+BENCHMARK_RESULTS = "resultados/benchmark.json"
+
+# Etapas que se miden, en orden de ejecución
+STAGES = ["mutations_dict", "mutation_classification", "peptides", "prediction", "binding_classification", "aggregation", "rendering"]
+
+# Aminoácidos y nucleótidos con los que se generan las proteínas y los alelos de las mutaciones sintéticas
+AMINO_ACIDS = np.array(list("ACDEFGHIKLMNPQRSTVWY"))
+NUCLEOTIDES = np.array(list("ACGT"))
+
+# Longitud de las proteínas del proteoma sintético
+PROTEIN_LENGTH = 400
+
+# Fracción de las mutaciones sintéticas que son deleciones en el marco de lectura (el resto son mutaciones puntuales)
+INDEL_FRACTION = 0.1
+
+# Alelos de los pacientes sintéticos, que no tienen genotipo
+BENCHMARK_ALLELES = ["HLA-A*02:01", "HLA-B*07:02"]
+
+# Cociente a partir del cual una etapa se considera más lenta que en la ejecución de referencia
+REGRESSION_TOLERANCE = 1.25
+
+
+class StubPredictor:
+    def __init__(self):
+        """
+        Predictor falso con la misma salida que Class1PresentationPredictor.predict, que usan el benchmark y las pruebas.
+        Las puntuaciones son deterministas: la afinidad es el número de residuos distintos del péptido y el percentil
+        de presentación, el código del primer residuo módulo 5. Cada llamada se registra en calls como (péptidos, alelos).
+        """
+        self.calls = []
+
+    def predict(self, peptides, alleles, verbose=0):
+        self.calls.append((list(peptides), list(alleles)))
+        return pd.DataFrame({
+            "peptide": peptides,
+            "peptide_num": range(len(peptides)),
+            "sample_name": "sample1",
+            "affinity": [float(len(set(peptide))) for peptide in peptides],
+            "best_allele": alleles[0],
+            "processing_score": 0.5,
+            "presentation_score": 0.5,
+            "presentation_percentile": [float(ord(peptide[0]) % 5) for peptide in peptides],
+        })
+
+
+def load_stub_predictor():
+    """
+    Carga el predictor falso. Es la función de carga que se pasa a ShardedPredictor en lugar de mhcPredictions.load_predictor.
+    """
+    return StubPredictor()
+
+
+def generate_cohort(n_patients, mutations_per_patient, proteome_size, duplication_rate, seed=0):
+    """
+    Genera un estudio sintético con la estructura de los datos de cBioPortal y UniProt.
+    Las mutaciones recurrentes (el mismo cambio de proteína en el mismo gen de otro paciente) generan los mismos
+    péptidos, de modo que duplication_rate controla cuántos péptidos se repiten en la cohorte.
+    Args:
+        n_patients (int): Número de pacientes, con una muestra tumoral cada uno.
+        mutations_per_patient (int): Número de mutaciones de cada paciente.
+        proteome_size (int): Número de genes del proteoma sintético.
+        duplication_rate (float): Fracción de las mutaciones que repiten una mutación de otro paciente (entre 0 y 1).
+        seed (int, opcional): Semilla del generador aleatorio. Por defecto es 0.
+    Returns:
+        tuple: Las mutaciones como objetos con los atributos que espera mutationModifications.create_mutations_dict,
+            el proteoma como diccionario gen → (UniProt ID, secuencia) y los datos clínicos como DataFrame.
+    """
+    rng = np.random.default_rng(seed)
+    genes = [f"GEN{index:05d}" for index in range(proteome_size)]
+    sequences = ["".join(residues) for residues in rng.choice(AMINO_ACIDS, size=(proteome_size, PROTEIN_LENGTH))]
+    proteome = {gene: (f"U{index:05d}", sequence) for index, (gene, sequence) in enumerate(zip(genes, sequences))}
+
+    # Mutaciones distintas; las recurrentes se eligen entre ellas
+    n_mutations = n_patients * mutations_per_patient
+    n_distinct = max(1, int(round(n_mutations * (1 - duplication_rate))))
+    gene_index = rng.integers(proteome_size, size=n_distinct)
+    positions = rng.integers(1, PROTEIN_LENGTH + 1, size=n_distinct)
+    alt_shift = rng.integers(1, len(AMINO_ACIDS), size=n_distinct)
+    is_indel = rng.random(n_distinct) < INDEL_FRACTION
+    ref_nucleotide = rng.integers(len(NUCLEOTIDES), size=n_distinct)
+    alt_nucleotide = (ref_nucleotide + rng.integers(1, len(NUCLEOTIDES), size=n_distinct)) % len(NUCLEOTIDES)
+    chosen = np.concatenate([np.arange(n_distinct), rng.integers(n_distinct, size=n_mutations - n_distinct)])
+    chosen = rng.permutation(chosen)
+
+    mutations = []
+    for number, distinct in enumerate(chosen):
+        gene, position = genes[gene_index[distinct]], int(positions[distinct])
+        ref_aa = sequences[gene_index[distinct]][position - 1]
+        if is_indel[distinct]:
+            protein_change, mutation_type, ref, alt = f"{ref_aa}{position}del", "In_Frame_Del", "AAA", "-"
+        else:
+            alt_aa = AMINO_ACIDS[(np.flatnonzero(AMINO_ACIDS == ref_aa)[0] + alt_shift[distinct]) % len(AMINO_ACIDS)]
+            protein_change, mutation_type = f"{ref_aa}{position}{alt_aa}", "Missense_Mutation"
+            ref, alt = NUCLEOTIDES[ref_nucleotide[distinct]], NUCLEOTIDES[alt_nucleotide[distinct]]
+        patient = number // mutations_per_patient
+        start = int(gene_index[distinct]) * 10 * PROTEIN_LENGTH + 3 * position
+        mutations.append(SimpleNamespace(
+            chr=str(gene_index[distinct] % 22 + 1), startPosition=start, endPosition=start + len(ref) - 1,
+            referenceAllele=ref, variantAllele=alt, variantType="DEL" if is_indel[distinct] else "SNP",
+            gene=SimpleNamespace(hugoGeneSymbol=gene), proteinChange=protein_change,
+            patientId=f"P{patient:06d}", sampleId=f"S{patient:06d}", tumorAltCount=10, tumorRefCount=20,
+            mutationType=mutation_type, molecularProfileId="sintetico_mutations", studyId="sintetico"))
+
+    clinical_df = pd.DataFrame({
+        "Patient ID": [f"P{patient:06d}" for patient in range(n_patients)],
+        "Sample Class": "Tumor",
+        "Sex": rng.permutation(np.resize(["Male", "Female"], n_patients)),
+        "Diagnosis Age": rng.integers(20, 90, size=n_patients),
+    })
+    return mutations, proteome, clinical_df
+
+
+@contextmanager
+def working_directory(path):
+    """
+    Cambia el directorio de trabajo durante el bloque, porque los gráficos de getGraphics usan rutas relativas.
+    """
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def run_benchmark(n_patients=100, mutations_per_patient=50, proteome_size=2000, duplication_rate=0.2, seed=0,
+                  lengths=main.PEPTIDE_LENGTHS, render_workers=1):
+    """
+    Ejecuta las etapas del pipeline sobre una cohorte sintética y mide la duración de cada una. Las etapas llaman a las
+    mismas funciones que main.run_study y analisis.py, pero sin descargas, cachés ni manifiesto, para que cada
+    ejecución mida todo el trabajo:
+        mutations_dict: conversión de las mutaciones de cBioPortal a diccionarios (create_mutations_dict).
+        mutation_classification: clasificación de las mutaciones, identificadores y secuencias del proteoma.
+        peptides: generación de los péptidos de las mutaciones puntuales y de las deleciones.
+        prediction: predicción con el predictor falso y unión de las predicciones a cada aparición del péptido.
+        binding_classification: clasificación SB/WB.
+        aggregation: predicciones únicas, matrices de incidencia, contadores por paciente y datos clínicos.
+        rendering: pruebas estadísticas y figuras de neoantígenos por tipo de mutación y por sexo.
+    Args:
+        n_patients (int, opcional): Número de pacientes. Por defecto es 100.
+        mutations_per_patient (int, opcional): Número de mutaciones de cada paciente. Por defecto es 50.
+        proteome_size (int, opcional): Número de genes del proteoma sintético. Por defecto es 2000.
+        duplication_rate (float, opcional): Fracción de mutaciones recurrentes (ver generate_cohort). Por defecto es 0.2.
+        seed (int, opcional): Semilla de la cohorte. Por defecto es 0.
+        lengths (list, opcional): Longitudes de los péptidos. Por defecto son las de main.PEPTIDE_LENGTHS.
+        render_workers (int, opcional): Número de procesos para renderizar las figuras. Por defecto es 1.
+    Returns:
+        dict: La configuración, el entorno y, para cada etapa, su duración en segundos y el número de filas que produce.
+    """
+    config = {"n_patients": n_patients, "mutations_per_patient": mutations_per_patient, "proteome_size": proteome_size,
+              "duplication_rate": duplication_rate, "seed": seed, "lengths": list(np.atleast_1d(lengths).tolist()),
+              "alleles": BENCHMARK_ALLELES}
+    mutations, proteome, clinical_df = generate_cohort(n_patients, mutations_per_patient, proteome_size, duplication_rate, seed)
+    stages = {}
+
+    @contextmanager
+    def stage(name):
+        # Mide la duración de la etapa; el bloque guarda en result["rows"] el tamaño de su salida
+        result = {}
+        start = time.perf_counter()
+        yield result
+        stages[name] = {"seconds": time.perf_counter() - start, "rows": result.get("rows")}
+
+    with tempfile.TemporaryDirectory() as directory, working_directory(directory):
+        for folder in ["resultados", "Figuras", "Figuras 2", "cache"]:
+            os.makedirs(folder)
+
+        with stage("mutations_dict") as result:
+            mutations_df = pd.DataFrame(mutationModifications.create_mutations_dict(mutations))
+            result["rows"] = len(mutations_df)
+
+        with stage("mutation_classification") as result:
+            mutations_df["Clasificación"] = mutations_df.apply(mutationModifications.clasificar_mutacion, axis=1)
+            mutations_df = mutationModifications.add_mutation_ids(mutations_df)
+            mutations_df = mutations_df[mutations_df["Mutation Type"].isin(["Missense_Mutation"] + mutationModifications.INDEL_MUTATION_TYPES)]
+            mutations_df["Protein_Sequence"] = mutations_df["Gene"].map({gene: sequence for gene, (_, sequence) in proteome.items()})
+            result["rows"] = len(mutations_df)
+
+        with stage("peptides") as result:
+            missense_df = mutations_df[mutations_df["Mutation Type"] == "Missense_Mutation"]
+            indel_df = mutations_df[mutations_df["Mutation Type"].isin(mutationModifications.INDEL_MUTATION_TYPES)]
+            mutated_peptides_df = pd.concat([mutationModifications.generate_peptides_batch(missense_df, lengths=lengths),
+                                             mutationModifications.generate_indel_peptides_batch(indel_df, lengths=lengths)],
+                                            ignore_index=True)
+            result["rows"] = len(mutated_peptides_df)
+
+        with stage("prediction") as result:
+            predictions_df = mhcPredictions.predict_patient_alleles(
+                StubPredictor(), mutated_peptides_df, pd.DataFrame(columns=["patientId", "allele"]), default_alleles=BENCHMARK_ALLELES)
+            result["rows"] = len(predictions_df)
+
+        with stage("binding_classification") as result:
+            predictions_df["Binding_Classification"] = mutationModifications.classify_binding_batch(
+                predictions_df, column="presentation_percentile", allele_column="best_allele")
+            result["rows"] = int(predictions_df["Binding_Classification"].isin(mutationModifications.NEOANTIGEN_CLASSES).sum())
+
+        with stage("aggregation") as result:
+            unique_predictions = main.best_allele_predictions(predictions_df)
+            aggregation.CohortIncidence.from_predictions(unique_predictions)
+            aggregation.PatientCounts().update(unique_predictions)
+            clinical_df = mutationModifications.calcularNeoantigenosPaciente(clinical_df, mutationModifications.select_neoantigens(unique_predictions))
+            result["rows"] = len(unique_predictions)
+
+        with stage("rendering") as result:
+            storage.write_table(mutations_df.drop(columns="Protein_Sequence"), "resultados/mutationsToBeTreated")
+            storage.write_table(unique_predictions, "resultados/unique_predictions")
+            statistics_path = statisticalTests.save_statistics(statisticalTests.compute_statistics(
+                clinical_df=clinical_df, attributes={"Sex": None},
+                contingency_tables={("Clasificación", "Binding_Classification"):
+                                    getGraphics.tablaContingenciaPorTipoMutacion(getGraphics.leerNeoantigenosPorTipoMutacion())}))
+            tasks = [
+                rendering.FigureTask("neoantígenos por Sex", getGraphics.boxplotConjuntoNeoantigenoPorAtributo,
+                                     clinical_df[["Sex"] + list(statisticalTests.NEOANTIGEN_TYPES)],
+                                     {"atributo": "Sex", "statistics_path": statistics_path}, inputs=[statistics_path],
+                                     outputs=["Figuras 2/Boxplot del Número de Neoantígenos SB y WB por Sex.png"]),
+                rendering.FigureTask("neoantígenos por tipo de mutación", getGraphics.neoantigenosPorMutacion,
+                                     inputs=[storage.resolve_table("resultados/mutationsToBeTreated"), storage.resolve_table("resultados/unique_predictions")],
+                                     outputs=["Figuras/neoantígenos_por_tipo_mutación.png"]),
+            ]
+            result["rows"] = len(rendering.FigureRenderer(rendering.RENDER_MANIFEST).run(tasks, n_workers=render_workers))
+
+    total = sum(stage_result["seconds"] for stage_result in stages.values())
+    return {
+        "config": config,
+        "environment": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": stages,
+        "total_seconds": total,
+    }
+
+
+def scaling_exponents(runs):
+    """
+    Estima cómo crece la duración de cada etapa con el número de pacientes ajustando una recta a log(segundos)
+    frente a log(pacientes). Un exponente cercano a 1 indica crecimiento lineal y uno mayor, superlineal.
+    Args:
+        runs (list): Resultados de run_benchmark con distinto número de pacientes.
+    Returns:
+        dict: El exponente de cada etapa y del total, o un diccionario vacío si hay menos de dos tamaños distintos.
+    """
+    patients = np.array([run["config"]["n_patients"] for run in runs], dtype=float)
+    if len(np.unique(patients)) < 2:
+        return {}
+    series = {name: [run["stages"][name]["seconds"] for run in runs] for name in STAGES}
+    series["total"] = [run["total_seconds"] for run in runs]
+    return {name: float(np.polyfit(np.log(patients), np.log(np.maximum(seconds, 1e-6)), 1)[0]) for name, seconds in series.items()}
+
+
+def compare_results(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compara dos archivos de resultados y devuelve las etapas que se han vuelto más lentas.
+    Solo se comparan las ejecuciones con la misma configuración.
+    Args:
+        baseline (dict): Resultados de referencia (ver save_results).
+        current (dict): Resultados nuevos.
+        tolerance (float, opcional): Cociente de duraciones a partir del cual hay regresión. Por defecto es REGRESSION_TOLERANCE.
+    Returns:
+        list: Una tupla (configuración, etapa, segundos de referencia, segundos nuevos) por cada regresión.
+    """
+    reference = {json.dumps(run["config"], sort_keys=True): run for run in baseline["runs"]}
+    regressions = []
+    for run in current["runs"]:
+        key = json.dumps(run["config"], sort_keys=True)
+        if key not in reference:
+            continue
+        for name, stage_result in run["stages"].items():
+            reference_seconds = reference[key]["stages"].get(name, {}).get("seconds")
+            if reference_seconds and stage_result["seconds"] > reference_seconds * tolerance:
+                regressions.append((run["config"], name, reference_seconds, stage_result["seconds"]))
+    return regressions
+
+
+def save_results(runs, path=BENCHMARK_RESULTS):
+    """
+    Guarda los resultados de varias ejecuciones y sus exponentes de escalado en un archivo JSON.
+    Returns:
+        dict: El contenido guardado.
+    """
+    results = {"runs": runs, "scaling_exponents": scaling_exponents(runs)}
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+    return results
+
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de neoantígenos sobre cohortes sintéticas.")
+    parser.add_argument("--patients", type=int, nargs="+", default=[100, 200, 400],
+                        help="Número de pacientes de cada cohorte. Con varios valores se estima el escalado.")
+    parser.add_argument("--mutations-per-patient", type=int, default=50, help="Número de mutaciones de cada paciente.")
+    parser.add_argument("--proteome-size", type=int, default=2000, help="Número de genes del proteoma sintético.")
+    parser.add_argument("--duplication-rate", type=float, default=0.2, help="Fracción de mutaciones recurrentes entre pacientes.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de las cohortes.")
+    parser.add_argument("--output", default=BENCHMARK_RESULTS, help="Archivo JSON de resultados.")
+    parser.add_argument("--compare", default=None, help="Archivo JSON de referencia con el que comparar los resultados.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Cociente de duraciones que se considera regresión.")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for n_patients in args.patients:
+        run = run_benchmark(n_patients, args.mutations_per_patient, args.proteome_size, args.duplication_rate, args.seed)
+        print(f"{n_patients} pacientes: " + ", ".join(f"{name} {result['seconds']:.2f}s" for name, result in run["stages"].items())
+              + f" | total {run['total_seconds']:.2f}s")
+        runs.append(run)
+    results = save_results(runs, args.output)
+    if results["scaling_exponents"]:
+        print("Exponentes de escalado: " + ", ".join(f"{name} {exponent:.2f}" for name, exponent in results["scaling_exponents"].items()))
+    print(f"Resultados guardados en {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare_results(json.load(file), results, args.tolerance)
+        for config, name, reference_seconds, seconds in regressions:
+            print(f"Regresión en {name} con {config['n_patients']} pacientes: {reference_seconds:.2f}s -> {seconds:.2f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
@@ -1,5 +1,7 @@
-import pandas as pd
+import aggregation
 
+# Estas funciones generan un único informe cada una. Para generar todos los informes leyendo las
+# predicciones una sola vez se usa aggregation.write_reports.
 
 def neoantigenosRepetidosPorPeptido():
     """
@@ -11,23 +13,14 @@ def neoantigenosRepetidosPorPeptido():
         pandas.DataFrame: Un DataFrame que contiene los neoantígenos duplicados basados en secuencias de péptidos.
                             El archivo contiene los péptidos que que han sido considerados neoantígenos más de una vez.
     """
-    # Leer la tabla de predicciones
-    predictions_df = pd.read_csv('resultados/unique_predictions.csv')
-
-    # Filtrar los datos para incluir solo las filas con información sobre la fuerza del neoantígeno
-    neoantigen_data = predictions_df[predictions_df['Binding_Classification'].notna()]
-
-    # Identificar los neoantígenos duplicados en la columna 'péptido'
-    duplicated_neoantigens = neoantigen_data[neoantigen_data.duplicated(subset=['peptide'], keep=False)]
-
-    # Crear DataFrame con los péptidos mutados
-    duplicated_neoantigens_df = pd.DataFrame(duplicated_neoantigens)
+    duplicated_neoantigens = aggregation.NeoantigenIndex.from_table('resultados/unique_predictions').repeated('peptide')
 
     # Guardar los péptidos mutados en un archivo .csv
-    duplicated_neoantigens_df.to_csv("resultados neoantigenos combinados/neoantigenosRepetidosPorPeptido.csv", index=False, sep=",")
+    duplicated_neoantigens.to_csv("resultados neoantigenos combinados/neoantigenosRepetidosPorPeptido.csv", index=False, sep=",")
 
     return duplicated_neoantigens
 
+
 def genesConNeoantigenosRepetidos():
     """
     Identifica y guarda genes con neoantígenos repetidos.
@@ -40,20 +33,10 @@ def genesConNeoantigenosRepetidos():
         None
         El archivo contiene los genes que han sido considerados neoantígenos más de una vez.
     """
-    # Leer la tabla de predicciones
-    predictions_df = pd.read_csv('resultados/unique_predictions.csv')
-
-    # Filtrar los datos para incluir solo las filas con información sobre la fuerza del neoantígeno
-    neoantigen_data = predictions_df[predictions_df['Binding_Classification'].notna()]
-
-    # Identificar los neoantígenos duplicados en la columna 'gen'
-    duplicated_neoantigens = neoantigen_data[neoantigen_data.duplicated(subset=['gen'], keep=False)]
-
-    # Crear DataFrame con los péptidos mutados
-    duplicated_neoantigens_df = pd.DataFrame(duplicated_neoantigens)
+    duplicated_neoantigens = aggregation.NeoantigenIndex.from_table('resultados/unique_predictions').repeated('gen')
 
     # Guardar los péptidos mutados en un archivo .csv
-    duplicated_neoantigens_df.to_csv("resultados neoantigenos combinados/genesConNeoantigenosRepetidos.csv", index=False, sep=",")
+    duplicated_neoantigens.to_csv("resultados neoantigenos combinados/genesConNeoantigenosRepetidos.csv", index=False, sep=",")
 
 
 def pacientesConNeoantigenosRepetidos(atributo):
@@ -64,71 +47,30 @@ def pacientesConNeoantigenosRepetidos(atributo):
     Returns:
         None: La función guarda un archivo .csv con los neoantígenos repetidos entre diferentes pacientes.
     Proceso:
-        1. Lee la tabla de predicciones desde 'resultados/unique_predictions.csv'.
-        2. Filtra los datos para incluir solo las filas con información sobre la fuerza del neoantígeno.
-        3. Identifica los neoantígenos duplicados en la columna especificada entre diferentes pacientes.
-        4. Agrupa los neoantígenos duplicados para ver cuáles están repetidos entre pacientes.
-        5. Filtra los neoantígenos repetidos por más de un paciente.
-        6. Crea un DataFrame con los péptidos mutados.
-        7. Guarda los péptidos mutados en un archivo .csv en 'resultados neoantigenos combinados/'.
+        1. Lee la tabla de predicciones desde 'resultados/unique_predictions' y se queda con los neoantígenos (SB y WB).
+        2. Cuenta los pacientes distintos de cada valor del atributo con la matriz de incidencia atributo↔paciente.
+        3. Guarda los valores presentes en más de un paciente, con sus pacientes, en 'resultados neoantigenos combinados/'.
     """
-    # Leer la tabla de predicciones
-    predictions_df = pd.read_csv('resultados/unique_predictions.csv')
-
-    # Filtrar los datos para incluir solo las filas con información sobre la fuerza del neoantígeno
-    neoantigen_data = predictions_df[predictions_df['Binding_Classification'].notna()]
-
-    # Identificar los neoantígenos duplicados en la columna 'Binding_Classification' entre diferentes pacientes
-    duplicated_neoantigens = neoantigen_data[neoantigen_data.duplicated(subset=[atributo], keep=False)]
-
-    # Agrupar por 'Binding_Classification' para ver cuáles neoantígenos están repetidos entre pacientes
-    grouped_duplicated_neoantigens = duplicated_neoantigens.groupby(atributo)['patientId'].unique().reset_index()
-
-    # Filtrar los neoantígenos repetidos por más de un paciente
-    multiple_patients_neoantigens = grouped_duplicated_neoantigens[grouped_duplicated_neoantigens['patientId'].apply(lambda x: len(x) > 1)]
-
-    # Crear DataFrame con los péptidos mutados
-    multiple_patients_neoantigens_df = pd.DataFrame(multiple_patients_neoantigens)
+    multiple_patients_neoantigens = aggregation.NeoantigenIndex.from_table('resultados/unique_predictions').shared(atributo, 'patientId')
 
     # Guardar los péptidos mutados en un archivo .csv
-    multiple_patients_neoantigens_df.to_csv(f"resultados neoantigenos combinados/pacientesConNeoantigenosRepetidosPor_{atributo}.csv", index=False, sep=",")
+    multiple_patients_neoantigens.to_csv(f"resultados neoantigenos combinados/pacientesConNeoantigenosRepetidosPor_{atributo}.csv", index=False, sep=",")
 
 
 def genesConNeoantigenosPorPetido():
     """
     Identifica y guarda neoantígenos que están duplicados entre diferentes pacientes.
     Esta función realiza los siguientes pasos:
-        1. Lee un archivo CSV que contiene datos de predicción.
-        2. Filtra los datos para incluir solo las filas con información sobre la fuerza del neoantígeno.
-        3. Identifica neoantígenos duplicados en la columna 'Binding_Classification' entre diferentes pacientes.
-        4. Agrupa los neoantígenos duplicados por 'gen' para ver cuáles neoantígenos están repetidos entre pacientes.
-        5. Filtra los neoantígenos agrupados para incluir solo aquellos repetidos en más de un paciente.
-        6. Crea un DataFrame con los péptidos mutados.
-        7. Guarda el DataFrame en un archivo CSV.
+        1. Lee la tabla de predicciones y se queda con los neoantígenos (SB y WB).
+        2. Cuenta los péptidos distintos de cada gen con la matriz de incidencia gen↔péptido.
+        3. Guarda los genes con más de un péptido, con sus péptidos, en un archivo CSV.
     Returns:
         None: La función guarda un archivo .csv con los péptidos considerados neoantígenos agrupados por gen.
-    El archivo CSV de entrada debe estar ubicado en 'resultados/unique_predictions.csv'.
+    La tabla de entrada debe estar ubicada en 'resultados/unique_predictions' (Parquet o CSV).
     El archivo CSV de salida se guardará en 'resultados neoantigenos combinados/genesConNeoantigenosPorPetido.csv'.
     """
-    # Leer la tabla de predicciones
-    predictions_df = pd.read_csv('resultados/unique_predictions.csv')
-
-    # Filtrar los datos para incluir solo las filas con información sobre la fuerza del neoantígeno
-    neoantigen_data = predictions_df[predictions_df['Binding_Classification'].notna()]
-
-    # Identificar los neoantígenos duplicados en la columna 'Binding_Classification' entre diferentes pacientes
-    duplicated_neoantigens = neoantigen_data[neoantigen_data.duplicated(subset='gen', keep=False)]
-
-    # Agrupar por 'Binding_Classification' para ver cuáles neoantígenos están repetidos entre pacientes
-    grouped_duplicated_neoantigens = duplicated_neoantigens.groupby('gen')['peptide'].unique().reset_index()
-
-    # Filtrar los neoantígenos repetidos por más de un paciente
-    multiple_patients_neoantigens = grouped_duplicated_neoantigens[grouped_duplicated_neoantigens['peptide'].apply(lambda x: len(x) > 1)]
-
-    # Crear DataFrame con los péptidos mutados
-    multiple_patients_neoantigens_df = pd.DataFrame(multiple_patients_neoantigens)
+    multiple_peptides_genes = aggregation.NeoantigenIndex.from_table('resultados/unique_predictions').shared('gen', 'peptide')
 
     # Guardar los péptidos mutados en un archivo .csv
-    multiple_patients_neoantigens_df.to_csv("resultados neoantigenos combinados/genesConNeoantigenosPorPetido.csv", index=False, sep=",")
-
+    multiple_peptides_genes.to_csv("resultados neoantigenos combinados/genesConNeoantigenosPorPetido.csv", index=False, sep=",")
 
@@ -2,9 +2,32 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from statannot import add_stat_annotation
-from itertools import combinations
+from contextlib import contextmanager
 import scipy.stats as stats
-from scipy.stats import chi2_contingency
+import mutationModifications
+import statisticalTests
+import storage
+
+@contextmanager
+def figura(path, figsize=None, nrows=1, ncols=1, bbox_inches='tight'):
+    """
+    Crea una figura con sus ejes, la guarda al salir del bloque 'with' y la cierra siempre, también si se produce
+    un error, para que pyplot no acumule figuras abiertas ni memoria entre gráficos.
+    Parámetros:
+        path (str): Ruta de la imagen.
+        figsize (tuple, opcional): Tamaño de la figura en pulgadas. Por defecto es el de matplotlib.
+        nrows (int, opcional): Número de filas de ejes. El valor predeterminado es 1.
+        ncols (int, opcional): Número de columnas de ejes. El valor predeterminado es 1.
+        bbox_inches (str, opcional): Ajuste del borde al guardar. El valor predeterminado es 'tight'.
+    Retorna:
+        tuple: La figura y sus ejes (un objeto Axes, o un array de ejes si hay más de uno), como plt.subplots.
+    """
+    fig, axes = plt.subplots(nrows, ncols, figsize=figsize)
+    try:
+        yield fig, axes
+        fig.savefig(path, bbox_inches=bbox_inches)
+    finally:
+        plt.close(fig)
 
 def mutacionesTipo():
     """
@@ -17,26 +40,23 @@ def mutacionesTipo():
         None
     """
     # Leer el archivo de mutaciones
-    df = pd.read_csv("resultados/mutations.csv")
+    df = storage.read_table("resultados/mutations", columns=["Clasificación"])
 
     # Contar el número de mutaciones por tipo
     mutations_count = df["Clasificación"].value_counts().reset_index()
     mutations_count.columns = ["Tipo de Mutación", "Número de Mutaciones"]
 
-    # Crear el gráfico de barras
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x="Tipo de Mutación", y="Número de Mutaciones", data=mutations_count, palette="viridis")
-
-    # Añadir títulos y etiquetas
-    plt.title("Número de Mutaciones por Tipo de Mutación")
-    plt.xlabel("Tipo de Mutación")
-    plt.ylabel("Número de Mutaciones")
+    # Crear el gráfico de barras y guardarlo en un archivo
+    with figura('Figuras/número_mutaciones_por_tipo.png', figsize=(10, 6)) as (fig, ax):
+        sns.barplot(x="Tipo de Mutación", y="Número de Mutaciones", data=mutations_count, palette="viridis", ax=ax)
 
-    # Rotar las etiquetas del eje x para mayor legibilidad
-    plt.xticks(rotation=45)
+        # Añadir títulos y etiquetas
+        ax.set_title("Número de Mutaciones por Tipo de Mutación")
+        ax.set_xlabel("Tipo de Mutación")
+        ax.set_ylabel("Número de Mutaciones")
 
-    # Guardar el gráfico en un archivo 
-    plt.savefig(f'Figuras/número_mutaciones_por_tipo.png', bbox_inches='tight')
+        # Rotar las etiquetas del eje x para mayor legibilidad
+        ax.tick_params(axis="x", labelrotation=45)
 
 def mutacionesTipoGeneral():
     """
@@ -49,26 +69,23 @@ def mutacionesTipoGeneral():
         None
     """
     # Leer el archivo de mutaciones
-    df = pd.read_csv("resultados/mutations.csv")
+    df = storage.read_table("resultados/mutations", columns=["Mutation Type"])
 
     # Contar el número de mutaciones por tipo
     mutations_count = df["Mutation Type"].value_counts().reset_index()
     mutations_count.columns = ["Tipo de Mutación", "Número de Mutaciones"]
 
-    # Crear el gráfico de barras
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x="Tipo de Mutación", y="Número de Mutaciones", data=mutations_count, palette="viridis")
-
-    # Añadir títulos y etiquetas
-    plt.title("Número de Mutaciones por Tipo de Mutación")
-    plt.xlabel("Tipo de Mutación")
-    plt.ylabel("Número de Mutaciones")
+    # Crear el gráfico de barras y guardarlo en un archivo
+    with figura('Figuras/número_mutaciones_por_tipo_general.png', figsize=(10, 6)) as (fig, ax):
+        sns.barplot(x="Tipo de Mutación", y="Número de Mutaciones", data=mutations_count, palette="viridis", ax=ax)
 
-    # Rotar las etiquetas del eje x para mayor legibilidad
-    plt.xticks(rotation=45, ha="right")
+        # Añadir títulos y etiquetas
+        ax.set_title("Número de Mutaciones por Tipo de Mutación")
+        ax.set_xlabel("Tipo de Mutación")
+        ax.set_ylabel("Número de Mutaciones")
 
-    # Guardar el gráfico en un archivo 
-    plt.savefig(f'Figuras/número_mutaciones_por_tipo_general.png', bbox_inches='tight')
+        # Rotar las etiquetas del eje x para mayor legibilidad
+        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
 
 
 def neoantigenosFuertesVsDebiles():
@@ -82,90 +99,105 @@ def neoantigenosFuertesVsDebiles():
     Returns:
         None
     """
-    predictions_df = pd.read_csv("resultados/unique_predictions.csv")
+    predictions_df = storage.read_table("resultados/unique_predictions", columns=["Binding_Classification"])
     # Contar el número de neoantígenos fuertes (SB) y débiles (WB)
-    neoantigen_counts = predictions_df["Binding_Classification"].value_counts().reset_index()
+    neoantigen_counts = mutationModifications.select_neoantigens(predictions_df)["Binding_Classification"].value_counts().reset_index()
     neoantigen_counts.columns = ["Clasificación", "Número de Neoantígenos"]
 
     # Crear el gráfico de barras
-    plt.figure(figsize=(10, 6))
-    ax = sns.barplot(x="Clasificación", y="Número de Neoantígenos", data=neoantigen_counts, order=["SB", "WB"])
+    with figura('Figuras/número_antígenos_fuertes_vs_debiles.png', figsize=(10, 6)) as (fig, ax):
+        sns.barplot(x="Clasificación", y="Número de Neoantígenos", data=neoantigen_counts, order=["SB", "WB"], ax=ax)
 
-    ax.bar_label(ax.containers[0], fmt='%d', label_type='edge', fontsize=12, padding=3)
-    # Añadir títulos y etiquetas
-    plt.title("Número de Neoantígenos Fuertes (SB) vs Débiles (WB)")
-    plt.xlabel("Clasificación")
-    plt.ylabel("Número de Neoantígenos")
+        ax.bar_label(ax.containers[0], fmt='%d', label_type='edge', fontsize=12, padding=3)
+        # Añadir títulos y etiquetas
+        ax.set_title("Número de Neoantígenos Fuertes (SB) vs Débiles (WB)")
+        ax.set_xlabel("Clasificación")
+        ax.set_ylabel("Número de Neoantígenos")
+
+def contarNeoantigenosPorTipoMutacion(mutations_df, predictions_df):
+    """
+    Cuenta los neoantígenos de cada tipo de mutación y clasificación de unión uniendo cada predicción con la
+    mutación que la ha generado a través de "mutationId" (ver mutationModifications.add_mutation_ids).
+    La unión es de uno a muchos y se resuelve con un mapeo mutationId → Clasificación, por lo que cada predicción
+    se cuenta una sola vez y no se construye la tabla combinada de mutaciones y predicciones.
+    Args:
+        mutations_df (pandas.DataFrame): Mutaciones con las columnas "mutationId" y "Clasificación".
+        predictions_df (pandas.DataFrame): Predicciones con las columnas "mutationId" y "Binding_Classification".
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas "Clasificación", "Binding_Classification" y "Número de Neoantígenos".
+    """
+    mutation_types = mutations_df.drop_duplicates(subset="mutationId").set_index("mutationId")["Clasificación"]
+    prediction_types = predictions_df["mutationId"].map(mutation_types).rename("Clasificación")
+    return (predictions_df.groupby([prediction_types, predictions_df["Binding_Classification"]], observed=True)
+            .size().reset_index(name='Número de Neoantígenos'))
 
-    plt.savefig('Figuras/número_antígenos_fuertes_vs_debiles.png', bbox_inches='tight')
+
+def leerNeoantigenosPorTipoMutacion():
+    """
+    Lee las mutaciones tratadas y las predicciones únicas y cuenta los neoantígenos débiles (WB) y fuertes (SB) de cada tipo de mutación.
+    Si ambas tablas tienen "mutationId" se usa contarNeoantigenosPorTipoMutacion; si no (tablas anteriores a ese
+    identificador), se combinan por 'patientId' y 'Gene'.
+    Tablas de entrada (Parquet o CSV, ver storage.read_table):
+        'resultados/mutationsToBeTreated': Contiene datos de mutaciones a tratar.
+        'resultados/unique_predictions': Contiene datos de predicciones únicas.
+    Archivo CSV de salida (solo con tablas sin "mutationId"):
+        'resultados/combinaciónmutaciones.csv': Contiene los datos combinados de mutaciones y predicciones.
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas "Clasificación", "Binding_Classification" y "Número de Neoantígenos".
+    """
+    mutations_path, predictions_path = 'resultados/mutationsToBeTreated', 'resultados/unique_predictions'
+    if "mutationId" in storage.table_columns(mutations_path) and "mutationId" in storage.table_columns(predictions_path):
+        # Leer solo las columnas necesarias y contar los neoantígenos débiles (WB) y fuertes (SB) de cada tipo de mutación
+        # uniendo cada predicción con su mutación de origen
+        mutations_to_be_treated_df = storage.read_table(mutations_path, columns=['mutationId', 'Clasificación'])
+        predictions_df = mutationModifications.select_neoantigens(
+            storage.read_table(predictions_path, columns=['mutationId', 'Binding_Classification']))
+        neoantigen_counts = contarNeoantigenosPorTipoMutacion(mutations_to_be_treated_df, predictions_df)
+    else:
+        # Tablas sin identificador de mutación: unir las mutaciones tratadas con las predicciones usando 'patientId' y 'Gene'
+        mutations_to_be_treated_df = storage.read_table(mutations_path)
+        predictions_df = mutationModifications.select_neoantigens(storage.read_table(predictions_path))
+        mutations_combined = mutations_to_be_treated_df.merge(predictions_df, left_on=['patientId', 'Gene'], right_on=['patientId', 'gen'])
+        mutations_combined.to_csv("resultados/combinaciónmutaciones.csv", index=False)
+
+        # Contar el número de neoantígenos débiles (WB) y fuertes (SB) para cada tipo de mutación
+        neoantigen_counts = mutations_combined.groupby(['Clasificación', 'Binding_Classification'], observed=True).size().reset_index(name='Número de Neoantígenos')
+    return neoantigen_counts
+
+def tablaContingenciaPorTipoMutacion(neoantigen_counts):
+    """
+    Crea la tabla de contingencia tipo de mutación × clasificación de unión para la prueba de chi-cuadrado (ver statisticalTests).
+    Args:
+        neoantigen_counts (pandas.DataFrame): Los conteos de leerNeoantigenosPorTipoMutacion.
+    Returns:
+        pandas.DataFrame: La tabla de contingencia, con los tipos de mutación como filas.
+    """
+    return neoantigen_counts.pivot_table(index='Clasificación', columns='Binding_Classification', values='Número de Neoantígenos', aggfunc='sum', fill_value=0, observed=True)
 
 def neoantigenosPorMutacion():
     """
     Genera un gráfico de barras que muestra el número de neoantígenos débiles (WB) y fuertes (SB) para cada tipo de mutación.
-    Esta función realiza los siguientes pasos:
-        1. Lee los datos de mutaciones y predicciones desde archivos CSV.
-        2. Combina los datos de mutaciones con los datos de predicciones basándose en 'patientId' y 'Gene'.
-        3. Cuenta el número de neoantígenos débiles y fuertes para cada tipo de mutación.
-        4. Ejecuta la prueba de chi-cuadrado para evaluar la asociación entre los tipos de mutación y las clasificaciones de unión.
-        5. Crea y guarda un gráfico de barras visualizando el número de neoantígenos por tipo de mutación y clasificación de unión.
-        6. El gráfico resultante se guarda como 'neoantígenos_por_tipo_mutación.png' en el directorio 'Figuras'.
-    Archivos CSV de entrada:
-        'resultados/mutationsToBeTreated.csv': Contiene datos de mutaciones a tratar.
-        'resultados/unique_predictions.csv': Contiene datos de predicciones únicas.
-    Archivo CSV de salida:
-        'resultados/combinaciónmutaciones.csv': Contiene los datos combinados de mutaciones y predicciones.
+    Los conteos se obtienen con leerNeoantigenosPorTipoMutacion. La prueba de chi-cuadrado de la asociación entre los tipos
+    de mutación y las clasificaciones de unión se calcula aparte, en statisticalTests.
     Archivo de salida del gráfico:
         'Figuras/neoantígenos_por_tipo_mutación.png': El gráfico de barras generado.
     Returns:
         None
     """
-    # Leer las tablas
-    mutations_to_be_treated_df = pd.read_csv('resultados/mutationsToBeTreated.csv')
-    predictions_df = pd.read_csv('resultados/unique_predictions.csv')
-
-    # Unir las mutaciones tratadas con las predicciones usando 'patientId' y 'Gene'
-    mutations_combined = mutations_to_be_treated_df.merge(predictions_df, left_on=['patientId', 'Gene'], right_on=['patientId', 'gen'])
-    mutations_combined.to_csv("resultados/combinaciónmutaciones.csv", index=False)
-
-    # Contar el número de neoantígenos débiles (WB) y fuertes (SB) para cada tipo de mutación
-    neoantigen_counts = mutations_combined.groupby(['Clasificación', 'Binding_Classification']).size().reset_index(name='Número de Neoantígenos')
-
-    # Crear la tabla de contingencia con los datos reestructurados
-    contingency_table = neoantigen_counts.pivot_table(index='Clasificación', columns='Binding_Classification', values='Número de Neoantígenos', aggfunc='sum', fill_value=0)
-
-    # Mostrar la tabla de contingencia
-    print(contingency_table)
-    # Realizar la prueba de Chi-cuadrado
-    chi2, p, dof, expected = chi2_contingency(contingency_table)
-
-    # Mostrar los resultados
-    print(f"Chi-cuadrado: {chi2}")
-    print(f"p-valor: {p}")
-    print(f"Grados de libertad: {dof}")
-    print(f"Frecuencias esperadas: \n{expected}")
-
-    # Evaluar la significancia
-    if p < 0.05:
-        print("La diferencia es significativa (rechazamos la hipótesis nula).")
-    else:
-        print("La diferencia no es significativa (no rechazamos la hipótesis nula).")
-
-
+    neoantigen_counts = leerNeoantigenosPorTipoMutacion()
 
     # Crear el gráfico de barras
-    plt.figure(figsize=(12, 8))
-    ax = sns.barplot(x='Clasificación', y='Número de Neoantígenos', hue='Binding_Classification', data=neoantigen_counts)
-    # Añadir números automáticamente
-    for container in ax.containers:
-        ax.bar_label(container, fmt='%d', label_type='edge', fontsize=12, padding=3)
-
-    # Añadir títulos y etiquetas
-    plt.title("Número de Neoantígenos Débiles (WB) vs Fuertes (SB) para Transiciones y Transversiones")
-    plt.xlabel("Tipo de Mutación")
-    plt.ylabel("Número de Neoantígenos")
-    plt.legend(title='Clasificación de Unión')
-
-    plt.savefig('Figuras/neoantígenos_por_tipo_mutación.png', bbox_inches='tight')
+    with figura('Figuras/neoantígenos_por_tipo_mutación.png', figsize=(12, 8)) as (fig, ax):
+        sns.barplot(x='Clasificación', y='Número de Neoantígenos', hue='Binding_Classification', data=neoantigen_counts, ax=ax)
+        # Añadir números automáticamente
+        for container in ax.containers:
+            ax.bar_label(container, fmt='%d', label_type='edge', fontsize=12, padding=3)
+
+        # Añadir títulos y etiquetas
+        ax.set_title("Número de Neoantígenos Débiles (WB) vs Fuertes (SB) para Transiciones y Transversiones")
+        ax.set_xlabel("Tipo de Mutación")
+        ax.set_ylabel("Número de Neoantígenos")
+        ax.legend(title='Clasificación de Unión')
 
 def matrizCorrelacion(clinical_df):
     """
@@ -194,17 +226,12 @@ def matrizCorrelacion(clinical_df):
     # Calcular la matriz de correlación 
     correlation_matrix = numerical_df.corr()
 
-    # Configurar el tamaño del gráfico
-    plt.figure(figsize=(12, 10))
-
-    # Crear un heatmap usando seaborn
-    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0)
-
-    # Añadir títulos
-    plt.title('Matriz de Correlación entre variables no categóricas')
+    # Crear un heatmap usando seaborn y guardar el gráfico
+    with figura('Figuras 2/matriz_correlacion.png', figsize=(12, 10)) as (fig, ax):
+        sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0, ax=ax)
 
-    # Guardar el gráfico
-    plt.savefig('Figuras 2/matriz_correlacion.png', bbox_inches='tight')
+        # Añadir títulos
+        ax.set_title('Matriz de Correlación entre variables no categóricas')
 
 def createIntervalosEdad(clinical_df, num_intervals=5):
     """
@@ -236,60 +263,99 @@ def boxplotsVariablesNumericasPorAtributo(clinical_df, atributo):
         None
     """
     for column in clinical_df.select_dtypes(include=['number']).columns:
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(x=atributo, y=column, data=clinical_df)
-        plt.title(f'Boxplot of {column} by {atributo}')
-        plt.xlabel(atributo)
-        plt.ylabel(column)
-        plt.savefig(f'Figuras 2/Boxplot of {column} by {atributo}.png', bbox_inches='tight')
-
-def boxplotConjuntoNeoantigenoPorAtributo(clinical_df, atributo, box_pairs=None, title=None, traduccion_atributo=None):
+        boxplotVariablePorAtributo(clinical_df, column, atributo)
+
+def boxplotVariablePorAtributo(clinical_df, column, atributo, rotation=None):
+    """
+    Genera y guarda el boxplot de una variable numérica agrupada por un atributo.
+    El gráfico se guarda como 'Boxplot of <column> by <atributo>.png' en el directorio 'Figuras 2'.
+    Parámetros:
+        clinical_df (pandas.DataFrame): El DataFrame con las columnas column y atributo.
+        column (str): La variable numérica.
+        atributo (str): El atributo por el cual agrupar la variable.
+        rotation (int, opcional): Ángulo de las etiquetas del eje x. Por defecto no se rotan.
+    Retorna:
+        None
+    """
+    with figura(f'Figuras 2/Boxplot of {column} by {atributo}.png', figsize=(10, 6)) as (fig, ax):
+        sns.boxplot(x=atributo, y=column, data=clinical_df, ax=ax)
+        ax.set_title(f'Boxplot of {column} by {atributo}')
+        ax.set_xlabel(atributo)
+        ax.set_ylabel(column)
+        if rotation is not None:
+            ax.tick_params(axis='x', labelrotation=rotation)
+
+def boxplotsColumnasNumericas(clinical_df, columns, titles=None):
+    """
+    Genera y guarda en una sola figura el boxplot de cada variable numérica, en una rejilla de dos filas.
+    El gráfico se guarda como 'boxplots_columnas_numericas.png' en el directorio 'Figuras'.
+    Parámetros:
+        clinical_df (pandas.DataFrame): El DataFrame con las variables numéricas.
+        columns (list): Las variables numéricas a representar.
+        titles (dict, opcional): Traducción de los nombres de las variables para los títulos.
+    Retorna:
+        None
+    """
+    titles = titles or {}
+    # 2 filas, columnas según el número de variables
+    with figura('Figuras/boxplots_columnas_numericas.png', nrows=2, ncols=len(columns)//2 + 1, bbox_inches=None) as (fig, axes):
+        for ax, column in zip(axes.flat, columns):
+            # Crear subgráfico para cada columna
+            sns.boxplot(y=column, data=clinical_df, ax=ax)
+            title = titles.get(column)
+            ax.set_title(f'Boxplot {title}')
+            ax.set_ylabel(title)
+
+        # Quitar los subgráficos que sobran
+        for ax in axes.flat[len(columns):]:
+            fig.delaxes(ax)
+        fig.tight_layout()  # Ajusta el espaciado entre subgráficos
+
+def boxplotConjuntoNeoantigenoPorAtributo(clinical_df, atributo, box_pairs=None, title=None, traduccion_atributo=None, statistics_path=None):
     """
     Genera un boxplot comparando los conteos de dos tipos de neoantígenos (SB y WB) a través de diferentes categorías de un atributo dado.
     Parámetros:
         clinical_df (pd.DataFrame): DataFrame que contiene datos clínicos, incluyendo conteos de neoantígenos y el atributo a comparar.
         atributo (str): El atributo en el DataFrame por el cual agrupar y comparar.
         box_pairs (list of tuples, opcional): Pares específicos de cajas a comparar para la anotación estadística. Si es None, se comparan todos los pares posibles.
+        statistics_path (str, opcional): Tabla de pruebas estadísticas (ver statisticalTests.save_statistics) de la que se leen
+            los p-valores de Mann-Whitney. Si es None, se calculan solo las pruebas de este gráfico.
     Retorna:
         None
     La función realiza los siguientes pasos:
         1. Convierte el DataFrame a formato largo adecuado para seaborn.
-        2. Identifica categorías únicas del atributo dado.
-        3. Crea pares de cajas para comparación si no se proporcionan.
+        2. Crea pares de cajas para comparación si no se proporcionan.
+        3. Obtiene los p-valores corregidos de Mann-Whitney de cada par.
         4. Genera un boxplot con seaborn.
-        5. Añade anotaciones estadísticas al gráfico.
+        5. Añade las anotaciones estadísticas al gráfico, sin repetir las pruebas.
         6. Guarda el gráfico como un archivo PNG.
     """
     # Crear un DataFrame en formato largo (long format) para seaborn
-    long_df = pd.melt(clinical_df, id_vars=[atributo], value_vars=['Neoantigen_SB_Count', 'Neoantigen_WB_Count'],
-                    var_name='Neoantigen_Type', value_name='Count')
-    
-    long_df['Neoantigen_Type'] = long_df['Neoantigen_Type'].replace({
-        'Neoantigen_SB_Count': 'SB',
-        'Neoantigen_WB_Count': 'WB'
-    })
-
-    # Obtener las categorías únicas del atributo para hacer las comparaciones
-    categoria_atributo = long_df[atributo].dropna().unique()
+    long_df = statisticalTests.neoantigen_long_format(clinical_df, atributo)
 
     # Crear pares de cajas para comparar
     if box_pairs is None:
-        box_pairs = [((valor1, type_), (valor2, type_)) for valor1, valor2 in combinations(categoria_atributo, 2) for type_ in long_df['Neoantigen_Type'].unique()]
-    
-    # Crear un boxplot de las dos variables combinadas por atributo
-    plt.figure(figsize=(12, 8))
-    ax = sns.boxplot(x=atributo, y='Count', hue='Neoantigen_Type', data=long_df)
+        box_pairs = statisticalTests.default_box_pairs(long_df, atributo)
 
-    # Añadir las pruebas estadísticas, para mostar las significancias
-    add_stat_annotation(ax, data=long_df, x=atributo, y='Count', hue='Neoantigen_Type',
-                    box_pairs=box_pairs,
-                    test='Mann-Whitney', text_format='star', loc='inside')
-    plt.title(title)
-    plt.xlabel(traduccion_atributo)
-    plt.ylabel('Número de Neoantígenos')
-    plt.legend(title='Tipo de Neoantígeno')
+    # Leer los p-valores de la tabla de pruebas estadísticas o, si no se indica, calcularlos
+    if statistics_path is not None:
+        statistics_df = statisticalTests.load_statistics(statistics_path)
+    else:
+        statistics_df = statisticalTests.mann_whitney_tests(clinical_df, {atributo: box_pairs})
+    pvalues = statisticalTests.box_pair_pvalues(statistics_df, atributo, box_pairs)
 
-    plt.savefig(f'Figuras 2/Boxplot del Número de Neoantígenos SB y WB por {atributo}.png', bbox_inches='tight')
+    # Crear un boxplot de las dos variables combinadas por atributo
+    with figura(f'Figuras 2/Boxplot del Número de Neoantígenos SB y WB por {atributo}.png', figsize=(12, 8)) as (fig, ax):
+        sns.boxplot(x=atributo, y='Count', hue='Neoantigen_Type', data=long_df, ax=ax)
+
+        # Añadir las pruebas estadísticas, para mostar las significancias
+        add_stat_annotation(ax, data=long_df, x=atributo, y='Count', hue='Neoantigen_Type',
+                        box_pairs=box_pairs, perform_stat_test=False, pvalues=pvalues,
+                        test_short_name='M.W.W.', text_format='star', loc='inside')
+        ax.set_title(title)
+        ax.set_xlabel(traduccion_atributo)
+        ax.set_ylabel('Número de Neoantígenos')
+        ax.legend(title='Tipo de Neoantígeno')
 
 def graficoqq(series, title):
     """
@@ -300,12 +366,10 @@ def graficoqq(series, title):
     Retorna:
         None
     """
-    stats.probplot(series, dist="norm", plot=plt)
-
-    plt.title(f"Gráfico Q-Q {title}")  # Título del gráfico
-    plt.xlabel("Cuantiles teóricos")  # Etiqueta del eje X
-    plt.ylabel("Cuantiles de la muestra")  # Etiqueta del eje Y
-
     # Guardar el gráfico en un archivo PNG
-    plt.savefig(f'Figuras/Gráfico q-q por {title}.png', bbox_inches='tight')
-    plt.close()
+    with figura(f'Figuras/Gráfico q-q por {title}.png') as (fig, ax):
+        stats.probplot(series, dist="norm", plot=ax)
+
+        ax.set_title(f"Gráfico Q-Q {title}")  # Título del gráfico
+        ax.set_xlabel("Cuantiles teóricos")  # Etiqueta del eje X
+        ax.set_ylabel("Cuantiles de la muestra")  # Etiqueta del eje Y
@@ -1,8 +1,72 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 from bravado.client import SwaggerClient
+from requests.adapters import HTTPAdapter
+
+import mutationModifications
+
+UNIPROT_REST_URL = "https://rest.uniprot.org"
+# Códigos de estado de UniProt que se reintentan
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Marcador de resolve_genes_bulk para los genes cuya consulta ha fallado (distinto de (None, None), no encontrado)
+UNIPROT_FAILED = None
+CBIOPORTAL_API_DOCS_URL = "https://www.cbioportal.org/api/v2/api-docs"
+# Cabecera con el número total de resultados en las respuestas de cBioPortal con la proyección META
+TOTAL_COUNT_HEADER = "total-count"
+CBIOPORTAL_CONFIG = {"validate_requests": False, "validate_responses": False, "validate_swagger_spec": False}
+
+# Esquema de la instantánea local de mutaciones (las columnas de mutationModifications.create_mutations_dict)
+MUTATIONS_SCHEMA = pa.schema([
+    ("chr", pa.string()),
+    ("startPosition", pa.int64()),
+    ("endPosition", pa.int64()),
+    ("referenceAllele", pa.string()),
+    ("variantAllele", pa.string()),
+    ("variantType", pa.string()),
+    ("Gene", pa.string()),
+    ("Protein Change", pa.string()),
+    ("patientId", pa.string()),
+    ("sampleId", pa.string()),
+    ("tumorAltCount", pa.int64()),
+    ("tumorRefCount", pa.int64()),
+    ("Mutation Type", pa.string()),
+    ("molecularProfileId", pa.string()),
+    ("studyId", pa.string()),
+])
+
+# Función para crear el cliente de la API de cBioPortal
+def get_cbioportal_client(spec_path="cache/cbioportal_api-docs.json"):
+    """
+    Crea el cliente de la API de cBioPortal a partir de una copia local de su especificación swagger.
+    La especificación se descarga solo la primera vez y se reutiliza en las siguientes ejecuciones.
+    Args:
+        spec_path (str, opcional): Ruta de la copia local de la especificación. Por defecto es "cache/cbioportal_api-docs.json".
+    Returns:
+        SwaggerClient: El cliente de la API de cBioPortal.
+    """
+    if not os.path.exists(spec_path):
+        if os.path.dirname(spec_path):
+            os.makedirs(os.path.dirname(spec_path), exist_ok=True)
+        response = requests.get(CBIOPORTAL_API_DOCS_URL)
+        response.raise_for_status()
+        with open(spec_path, "w") as spec_file:
+            spec_file.write(response.text)
+    with open(spec_path) as spec_file:
+        spec = json.load(spec_file)
+    return SwaggerClient.from_spec(spec, origin_url=CBIOPORTAL_API_DOCS_URL, config=CBIOPORTAL_CONFIG)
 
 ### Función para obtener las mutaciones del estudio
-def get_mutations_cBioPortal(studyId):
+def get_mutations_cBioPortal(studyId, client=None):
     """
     Obtener mutaciones de cBioPortal para un ID de estudio dado.
     Esta función establece una conexión con la API de cBioPortal y recupera
@@ -11,22 +75,120 @@ def get_mutations_cBioPortal(studyId):
     de los genes.
     Args:
         studyId (str): El ID del estudio para el cual se desea recuperar datos de mutaciones.
+        client (SwaggerClient, opcional): Cliente de la API a reutilizar. Por defecto se crea con get_cbioportal_client.
     Returns:
         list: Una lista de mutaciones para el estudio especificado, incluyendo
               información detallada de los genes.
     """
-    # Establecer la conexión con cBioPortal a su API
-    cbioportal = SwaggerClient.from_url('https://www.cbioportal.org/api/v2/api-docs',
-                                        config={"validate_requests":False,"validate_responses":False,"validate_swagger_spec": False})
+    return [mutation for page in iter_mutation_pages(studyId, client=client) for mutation in page]
+
+def count_mutations(studyId, client=None):
+    """
+    Obtiene el número total de mutaciones de un estudio sin descargarlas, con la proyección META de cBioPortal,
+    que devuelve el recuento en la cabecera "total-count" de la respuesta.
+    Args:
+        studyId (str): El ID del estudio.
+        client (SwaggerClient, opcional): Cliente de la API a reutilizar. Por defecto se crea con get_cbioportal_client.
+    Returns:
+        int: El número de mutaciones del estudio.
+    """
+    cbioportal = client or get_cbioportal_client()
+    response = cbioportal.Mutations.getMutationsInMolecularProfileBySampleListIdUsingGET(
+        molecularProfileId=f"{studyId}_mutations",
+        sampleListId=f"{studyId}_all",
+        projection="META"
+    ).response()
+    headers = response.incoming_response.headers
+    return int(headers.get(TOTAL_COUNT_HEADER) or headers["X-Total-Count"])
+
+def iter_mutation_pages(studyId, page_size=10000, client=None, sort_by="startPosition"):
+    """
+    Recorre página a página las mutaciones de un estudio de cBioPortal.
+    Las páginas se piden con un orden explícito: sin él, la API no garantiza el mismo orden entre peticiones y una
+    mutación puede aparecer en dos páginas (y otra en ninguna). Como el campo de ordenación no es único, las
+    mutaciones empatadas en el borde de una página todavía pueden repetirse o perderse; fetch_mutations_snapshot
+    lo comprueba con el recuento total de count_mutations.
+    Args:
+        studyId (str): El ID del estudio.
+        page_size (int, opcional): Número de mutaciones por página. Por defecto es 10.000.
+        client (SwaggerClient, opcional): Cliente de la API a reutilizar. Por defecto se crea con get_cbioportal_client.
+        sort_by (str, opcional): Campo por el que se ordenan las mutaciones, en orden ascendente. Por defecto es "startPosition".
+    Returns:
+        generator: Listas de mutaciones, una por página.
+    """
+    cbioportal = client or get_cbioportal_client()
+    page_number = 0
+    while True:
+        muts = cbioportal.Mutations.getMutationsInMolecularProfileBySampleListIdUsingGET(
+            molecularProfileId=f"{studyId}_mutations", # obtiene las mutaciones del perfil molecular del estudio 
+            sampleListId=f"{studyId}_all", # obtiene todas las muestras
+            projection="DETAILED", # obtiene la información de los genes
+            pageSize=page_size,
+            pageNumber=page_number,
+            sortBy=sort_by,
+            direction="ASC"
+        ).result()
+        if muts:
+            yield muts
+        if len(muts) < page_size:
+            break
+        page_number += 1
+
+def fetch_mutations_snapshot(studyId, snapshot_dir="cache/mutaciones", page_size=10000, client=None, refresh=False):
+    """
+    Descarga las mutaciones de un estudio en una instantánea local en formato Parquet, o reutiliza la existente.
+    Cada página de la API se convierte y se escribe directamente en el archivo, sin acumular el estudio completo en memoria.
+    Como el campo de ordenación no es único, las mutaciones repetidas entre páginas (misma muestra, posición y alelos,
+    ver mutationModifications.MUTATION_ID_COLUMNS) se descartan antes de escribirlas, y al terminar se comprueba que
+    el número de mutaciones distintas coincide con el total que declara la API: si falta alguna, no se guarda la instantánea.
+    Args:
+        studyId (str): El ID del estudio.
+        snapshot_dir (str, opcional): Directorio de las instantáneas. Por defecto es "cache/mutaciones".
+        page_size (int, opcional): Número de mutaciones por página. Por defecto es 10.000.
+        client (SwaggerClient, opcional): Cliente de la API a reutilizar. Por defecto se crea con get_cbioportal_client.
+        refresh (bool, opcional): Si es True se vuelve a descargar aunque exista la instantánea. Por defecto es False.
+    Returns:
+        str: La ruta de la instantánea del estudio.
+    Raises:
+        MutationsSnapshotError: Si se han descargado menos mutaciones distintas que el total del estudio.
+    """
+    snapshot_path = os.path.join(snapshot_dir, f"{studyId}.parquet")
+    if os.path.exists(snapshot_path) and not refresh:
+        return snapshot_path
 
-    # Obtener las mutaciones por estudio 
-    muts = cbioportal.Mutations.getMutationsInMolecularProfileBySampleListIdUsingGET(
-        molecularProfileId=f"{studyId}_mutations", # obtiene las mutaciones del perfil molecular del estudio 
-        sampleListId=f"{studyId}_all", # obtiene todas las muestras
-        projection="DETAILED" # obtiene la información de los genes
-    ).result()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    partial_path = snapshot_path + ".part"
+    client = client or get_cbioportal_client()
+    total = count_mutations(studyId, client=client)
+    seen = set()
+    with pq.ParquetWriter(partial_path, MUTATIONS_SCHEMA) as writer:
+        for muts in iter_mutation_pages(studyId, page_size=page_size, client=client):
+            rows = []
+            for row in mutationModifications.create_mutations_dict(muts):
+                key = tuple(row[column] for column in mutationModifications.MUTATION_ID_COLUMNS)
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(row)
+            writer.write_table(pa.Table.from_pylist(rows, schema=MUTATIONS_SCHEMA))
+    if len(seen) < total:
+        os.remove(partial_path)
+        raise MutationsSnapshotError(f"Se han descargado {len(seen)} de las {total} mutaciones de {studyId}: "
+                                     "el orden de las páginas ha cambiado entre peticiones")
+    os.replace(partial_path, snapshot_path)
+    return snapshot_path
 
-    return muts
+def get_mutations_dataframe(studyId, columns=None, **snapshot_options):
+    """
+    Obtiene las mutaciones de un estudio como DataFrame a partir de su instantánea local.
+    Args:
+        studyId (str): El ID del estudio.
+        columns (list, opcional): Columnas a leer. Por defecto se leen todas.
+        **snapshot_options: Opciones para fetch_mutations_snapshot (snapshot_dir, page_size, client, refresh).
+    Returns:
+        pandas.DataFrame: Las mutaciones del estudio, con las columnas de mutationModifications.create_mutations_dict.
+    """
+    snapshot_path = fetch_mutations_snapshot(studyId, **snapshot_options)
+    return pd.read_parquet(snapshot_path, columns=columns)
 
 # Función para buscar el identificador de UniProt a partir del nombre del gen y el organismo
 def get_uniprot_id(gene_name, taxonomy_id="9606"):
@@ -36,9 +198,10 @@ def get_uniprot_id(gene_name, taxonomy_id="9606"):
         gene_name (str): El nombre del gen a buscar.
         taxonomy_id (str, opcional): El ID de taxonomía del organismo. Por defecto es "9606" (Homo sapiens).
     Returns:
-        str o None: El primer ID de UniProt encontrado para el nombre del gen y el ID de taxonomía dados, o None si no se encuentra ningún ID o si ocurre un error.
+        str o None: El primer ID de UniProt encontrado para el nombre del gen y el ID de taxonomía dados, o None si la búsqueda no tiene resultados.
     Raises:
-        None: Esta función no lanza ninguna excepción, pero imprime mensajes de error en la consola.
+        UniProtRequestError: Si UniProt responde con un código de error.
+        requests.exceptions.RequestException: Si hay un problema con la solicitud de red.
     """
     url = f"https://rest.uniprot.org/uniprotkb/search?query=gene_exact:{gene_name}+AND+taxonomy_id:{taxonomy_id}&format=tsv&fields=accession"
     response = requests.get(url)
@@ -50,8 +213,7 @@ def get_uniprot_id(gene_name, taxonomy_id="9606"):
             print(f"No se encontraron identificadores de UniProt para el gen {gene_name} y el organismo {taxonomy_id}.")
             return None
     else:
-        print(f"Error al buscar el identificador de UniProt: {response.status_code}")
-        return None
+        raise UniProtRequestError(f"Error al buscar el identificador de UniProt: {response.status_code}")
 
 # Función para obtener la secuencia proteica de UniProt
 def get_protein_sequence(uniprot_id):
@@ -61,8 +223,9 @@ def get_protein_sequence(uniprot_id):
         uniprot_id (str): El ID de UniProt de la proteína.
     Returns:
         str: La secuencia proteica si la solicitud es exitosa.
-        None: Si hay un error al obtener la secuencia.
+        None: Si la entrada no tiene secuencia.
     Raises:
+        UniProtRequestError: Si UniProt responde con un código de error.
         requests.exceptions.RequestException: Si hay un problema con la solicitud de red.
     """
     url = f"https://www.uniprot.org/uniprot/{uniprot_id}.fasta"
@@ -72,9 +235,160 @@ def get_protein_sequence(uniprot_id):
         # Extraer la secuencia del archivo FASTA
         lines = fasta_data.split('\n')
         sequence = ''.join(line for line in lines if not line.startswith('>'))
-        return sequence
+        return sequence or None
     else:
-        print("Error al obtener la secuencia:", response.status_code)
-        return None
+        raise UniProtRequestError(f"Error al obtener la secuencia: {response.status_code}")
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        """
+        Limita el número de peticiones por segundo compartido entre varios hilos.
+        Args:
+            requests_per_second (float): Número máximo de peticiones por segundo. None o 0 desactiva el límite.
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Espera hasta que se pueda hacer la siguiente petición.
+        """
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """
+        Retrasa la siguiente petición de todos los hilos, por ejemplo tras una respuesta 429 con Retry-After.
+        Args:
+            seconds (float): Segundos que hay que esperar desde ahora.
+        """
+        with self.lock:
+            self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+
+class MutationsSnapshotError(Exception):
+    """La instantánea de mutaciones descargada no contiene todas las mutaciones del estudio."""
+
+
+class UniProtRequestError(Exception):
+    """La consulta a UniProt ha fallado tras agotar los reintentos."""
+
+
+def create_session(pool_size=16):
+    """
+    Crea una sesión HTTP con un pool de conexiones persistentes (keep-alive).
+    Los reintentos no se delegan en urllib3 sino en _query_uniprot, para que cada reintento pase por el RateLimiter.
+    Args:
+        pool_size (int, opcional): Número máximo de conexiones abiertas por host. Por defecto es 16.
+    Returns:
+        requests.Session: La sesión configurada.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _query_uniprot(session, rate_limiter, url, query, retries=5, backoff_factor=0.5):
+    """
+    Ejecuta una consulta TSV a UniProt y devuelve sus filas como diccionarios.
+    Los errores de red y los códigos RETRY_STATUS se reintentan con espera exponencial (o la indicada en Retry-After),
+    y cada intento vuelve a pasar por el RateLimiter. Si la consulta no se puede completar se lanza UniProtRequestError,
+    de modo que un fallo no se confunda con una consulta sin resultados.
+    """
+    for attempt in range(retries + 1):
+        rate_limiter.wait()
+        try:
+            response = session.get(url, params={"query": query, "format": "tsv", "fields": "accession,reviewed,gene_primary,sequence"})
+        except requests.RequestException as error:
+            failure, delay = error, backoff_factor * 2 ** attempt
+        else:
+            if response.status_code == 200:
+                return list(csv.DictReader(io.StringIO(response.text), delimiter="\t"))
+            failure = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUS:
+                break
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff_factor * 2 ** attempt
+        if attempt < retries:
+            rate_limiter.pause(delay)
+    raise UniProtRequestError(f"Error al consultar UniProt: {failure}")
+
+
+def _best_entry(rows):
+    """
+    Elige la primera entrada revisada (Swiss-Prot) o, si no hay ninguna, la primera entrada.
+    """
+    reviewed = [row for row in rows if row.get("Reviewed") == "reviewed"]
+    row = (reviewed or rows)[0]
+    return row["Entry"], row["Sequence"]
+
+
+def resolve_genes_bulk(genes, taxonomy_id="9606", batch_size=100, max_workers=8, requests_per_second=10,
+                       base_url=UNIPROT_REST_URL, session=None, retries=5, backoff_factor=0.5):
+    """
+    Resuelve en bloque el ID de UniProt y la secuencia proteica de un conjunto de genes.
+    Primero se obtiene el conjunto de genes únicos y se consultan por lotes con el endpoint stream de UniProt,
+    que devuelve el ID y la secuencia en la misma respuesta. Los lotes se envían de forma concurrente con un pool
+    de hilos que comparte una sesión con conexiones persistentes, un límite de peticiones por segundo y reintentos.
+    Los genes que no aparecen como nombre principal en su lote se buscan de uno en uno con el endpoint search.
+    Un lote o un gen cuya consulta falla no aborta el resto: sus genes se devuelven con el marcador UNIPROT_FAILED.
+    Args:
+        genes (iterable): Los símbolos de los genes. Puede contener repetidos.
+        taxonomy_id (str, opcional): El ID de taxonomía del organismo. Por defecto es "9606" (Homo sapiens).
+        batch_size (int, opcional): Número de genes por consulta. Por defecto es 100.
+        max_workers (int, opcional): Número máximo de peticiones simultáneas. Por defecto es 8.
+        requests_per_second (float, opcional): Número máximo de peticiones por segundo. Por defecto es 10.
+        base_url (str, opcional): URL base de la API REST de UniProt. Por defecto es UNIPROT_REST_URL.
+        session (requests.Session, opcional): Sesión HTTP a reutilizar. Por defecto se crea una con create_session.
+        retries (int, opcional): Número máximo de reintentos por petición. Por defecto es 5.
+        backoff_factor (float, opcional): Factor de la espera exponencial entre reintentos. Por defecto es 0.5.
+    Returns:
+        dict: Un diccionario gen -> (ID de UniProt, secuencia). Los genes no encontrados tienen (None, None) y
+            los genes cuya consulta ha fallado tienen UNIPROT_FAILED.
+    """
+    unique_genes = sorted({gene for gene in genes if isinstance(gene, str)})
+    session = session or create_session(pool_size=max_workers)
+    rate_limiter = RateLimiter(requests_per_second)
+
+    def query(url, query):
+        return _query_uniprot(session, rate_limiter, url, query, retries=retries, backoff_factor=backoff_factor)
+
+    def resolve_batch(batch):
+        query_text = "(" + " OR ".join(f"gene_exact:{gene}" for gene in batch) + f") AND taxonomy_id:{taxonomy_id}"
+        try:
+            rows = query(f"{base_url}/uniprotkb/stream", query_text)
+        except UniProtRequestError as error:
+            print(error)
+            return dict.fromkeys(batch, UNIPROT_FAILED)
+        by_gene = {}
+        for row in rows:
+            by_gene.setdefault(row.get("Gene Names (primary)", ""), []).append(row)
+        return {gene: _best_entry(by_gene[gene]) for gene in batch if gene in by_gene}
+
+    def resolve_gene(gene):
+        try:
+            rows = query(f"{base_url}/uniprotkb/search", f"gene_exact:{gene} AND taxonomy_id:{taxonomy_id}")
+        except UniProtRequestError as error:
+            print(error)
+            return gene, UNIPROT_FAILED
+        return gene, _best_entry(rows) if rows else (None, None)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batches = [unique_genes[start:start + batch_size] for start in range(0, len(unique_genes), batch_size)]
+        resolved = {}
+        for result in executor.map(resolve_batch, batches):
+            resolved.update(result)
 
+        # Los genes buscados por un sinónimo no aparecen como nombre principal: se buscan de uno en uno
+        missing = [gene for gene in unique_genes if gene not in resolved]
+        resolved.update(executor.map(resolve_gene, missing))
 
+    return resolved
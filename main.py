@@ -1,150 +1,345 @@
 # **************************************************************************** #
 
+import argparse
+import os
+
 import pandas as pd
-from mhcflurry import Class1PresentationPredictor
 
+import aggregation
 import getInformation
+import mhcPredictions
 import mutationModifications
+import pipeline
+import predictionCache
+import proteomeIndex
+import storage
 import uniProtCache
 
 
-######### Obtener información clínica y mutaciones  #########
-
-
-# Leer el archivo de datos clínicos
-clinical_df = pd.read_csv('es_dfarber_broad_2014_clinical_data.tsv', sep='\t')
-
-# Filtrar solo las muestras que son tumores
-tumor_samples = clinical_df[clinical_df['Sample Class'] == 'Tumor']['Patient ID'].tolist()
-
-# Obtener las mutaciones del estudio
-muts = getInformation.get_mutations_cBioPortal("es_dfarber_broad_2014")
-
-# Estructurar los datos correctamente con los datos que son relevantes
-mutation_dicts = mutationModifications.create_mutations_dict(muts)
-
-# Crear un DataFrame de las mutaciones obtenidas
-df = pd.DataFrame(mutation_dicts)
-
-
-######### Filtrar datos  #########
-
-
-# Filtrar mutaciones solo para los tumores
-df = df[df['patientId'].isin(tumor_samples)]
-
-# Clasificar las mutaciones y añadir una nueva columna al DataFrame
-df["Clasificación"] = df.apply(mutationModifications.clasificar_mutacion, axis=1)
-
-# Guardar las mutaciones que se han descargado en un archivo CSV
-df.to_csv("resultados/mutations.csv", index=False)
-
-# Filtrar solo las mutaciones de tipo 'Missense_Mutation' 
-df = df[df["Mutation Type"] == "Missense_Mutation"]
-
-# Guardar las mutaciones que se van a tratar en un archivo CSV
-df.to_csv("resultados/mutationsToBeTreated.csv", index=False)
-print("Datos clínicos cargados y filtrados")
-
-
-######### Obtener secuencias de UniProt  #########
-
-
-# Crear una instancia de UniProtCache
-cache = uniProtCache.UniProtCache()
-
-# Aplicar el método cached_get_uniprot_info a la columna "Gene"
-uniprot_info = df["Gene"].apply(cache.cached_get_uniprot_info)
-df["UniProt_ID"], df["Protein_Sequence"] = zip(*uniprot_info)
-
-# Crear DataFrame con los péptidos mutados
-uniprot_info_df = pd.DataFrame(uniprot_info)
-
-# Guardar los péptidos mutados en un archivo .csv
-uniprot_info_df.to_csv("resultados/uniprot_info_df.csv", index=False, sep=",")
-
-print("Información de UniProt obtenida y añadida al DataFrame")
-
-
-######### Generar péptidos mutados #########
-
-
-# Generar todas las secuencias mutadas 
-mutated_peptides = df.apply(mutationModifications.generate_peptides, axis=1).explode().tolist()
-print("Péptidos mutados generados")
-
-# Filtrar los datos válidos (solo diccionarios)
-valid_peptides = [item for item in mutated_peptides if isinstance(item, dict)]
-
-# Verificar si hay elementos inválidos en la lista
-invalid_peptides = [item for item in mutated_peptides if not isinstance(item, dict)]
-if invalid_peptides:
-    print("Se encontraron elementos inválidos en la lista y fueron ignorados:", invalid_peptides)
-
-# Crear DataFrame con los péptidos mutados
-mutated_peptides_df = pd.DataFrame(valid_peptides)
-
-# Guardar los péptidos mutados en un archivo .csv
-mutated_peptides_df.to_csv("resultados/mutated_peptides.csv", index=False, sep=",")
-print("Péptidos mutados guardados en mutated_peptides.csv")
-
-######### Predecir neoanígenos y clasificarlos #########
-
-mutated_peptides_df = pd.read_csv('resultados/mutated_peptides.csv')
-
-# Cargar MHCflurry predictor
-predictor = Class1PresentationPredictor.load()
-
-# Predecir la afinidad de unión usando MHCflurry
-predictions = predictor.predict(peptides=mutated_peptides_df["peptido"].tolist(), alleles=["HLA-A*02:01"])
-print("Predicciones de afinidad de unión realizadas")
-
-# Convertir las predicciones en un DataFrame 
-predictions_df = pd.DataFrame(predictions) 
-
-# Agregar la información del gen, el ID del paciente y la muestra a las predicciones 
-predictions_df["gen"] = mutated_peptides_df["gen"] 
-predictions_df["patientId"] = mutated_peptides_df["patientId"]
-predictions_df["sampleId"] = mutated_peptides_df["sampleId"]
-
-# Guardar las predicciones en un archivo .csv 
-predictions_df.to_csv("resultados/predictions.csv", index=False, sep=",")
-predictions_df = pd.read_csv('resultados/predictions.csv')
-
-# Clasificar las predicciones en SB (Strong Binding) y WB (Weak Binding)
-predictions_df["Binding_Classification"] = predictions_df.apply(mutationModifications.classify_binding, axis=1)
-
-# Guardar las clasificaciones de las predicciones en un archivo .csv 
-predictions_df.to_csv("resultados/predictions.csv", index=False, sep=",")
-
-
-######### Tratamiento de los datos para unificar y separar en archivos  #########
-
-
-# Eliminar filas duplicadas basadas en 'peptido', 'gen' y 'patientId'
-unique_predictions = predictions_df.drop_duplicates(subset=['peptide', 'gen', 'patientId'])
-
-# Guardar las predicciones únicas en un archivo .csv
-unique_predictions.to_csv("resultados/unique_predictions.csv", index=False, sep=",")
-print("Predicciones únicas guardadas en unique_predictions.csv")
-
-unique_predictions = pd.read_csv('resultados/unique_predictions.csv')
-# Filtrar y guardar los péptidos con alta probabilidad de presentación
-strong_binding_peptides = predictions_df[predictions_df["Binding_Classification"] == "SB"]
-strong_binding_peptides.to_csv("resultados/strong_binding_peptides.csv", index=False)
-print("Predicciones con alta probabilidad de presentación guardadas en strong_binding_peptides.csv")
+# Estudio por defecto del TFM y su archivo de datos clínicos
+DEFAULT_STUDIES = [("es_dfarber_broad_2014", "es_dfarber_broad_2014_clinical_data.tsv")]
+
+# Directorio de resultados. Con varios estudios cada uno se guarda en su propio subdirectorio
+RESULTS_DIR = "resultados"
+
+# Directorio de las instantáneas de mutaciones descargadas de cBioPortal
+MUTATIONS_SNAPSHOT_DIR = "cache/mutaciones"
+
+# Longitudes de los epítopos a generar
+PEPTIDE_LENGTHS = [8, 9, 10, 11]
+
+# Alelos que se usan para los pacientes sin genotipo HLA
+DEFAULT_ALLELES = ["HLA-A*02:01"]
+
+# Tabla opcional de umbrales SB/WB por alelo, con las columnas "allele", "strong" y "weak"
+BINDING_THRESHOLDS_PATH = "umbrales_union.csv"
+
+# Etapas del pipeline en orden de ejecución
+STAGES = ["fetch", "filter", "uniprot", "peptides", "predict", "classify", "aggregate", "report"]
+
+# Tablas que se exportan a CSV en la etapa final de informes
+REPORT_TABLES = ["unique_predictions", "strong_binding_peptides", "weak_binding_peptides"]
+
+
+def best_allele_predictions(predictions_df):
+    """
+    Se queda con una predicción por péptido, gen y paciente: la del alelo con mejor percentil de presentación.
+    Args:
+        predictions_df (pandas.DataFrame): Predicciones por alelo, con las columnas "peptide", "gen", "patientId",
+            "best_allele" y "presentation_percentile".
+    Returns:
+        pandas.DataFrame: Las filas del mejor alelo, en el orden original. La columna "best_allele" indica ese alelo.
+    """
+    return predictions_df.sort_values('presentation_percentile', kind='stable').drop_duplicates(subset=['peptide', 'gen', 'patientId']).sort_index()
 
-# Filtrar y guardar los péptidos con alta afinidad
-weak_binding_peptides = predictions_df[predictions_df["Binding_Classification"] == "WB"]
-weak_binding_peptides.to_csv("resultados/weak_binding_peptides.csv", index=False)
-print("Predicciones de alta afinidad guardadas en weak_binding_peptides.csv")
 
-# Calcular el número de neoantígenos por paciente y actualizar el DataFrame clínico
-clinical_df = mutationModifications.calcularNeoantigenosPaciente(clinical_df, unique_predictions)
+def run_study(study_id, clinical_path, predictor, uniprot_cache, prediction_cache, output_dir=RESULTS_DIR,
+              clinical_output_path=None, genotypes_path=None, force=()):
+    """
+    Ejecuta el pipeline completo de un estudio de cBioPortal como una serie de etapas: descarga (fetch), filtrado (filter),
+    secuencias de UniProt (uniprot), generación de péptidos (peptides), predicción con MHCflurry (predict), clasificación
+    (classify), recuento de neoantígenos por paciente (aggregate) y exportación de los informes en CSV (report). Cada
+    etapa se omite si el hash de sus entradas y parámetros coincide con el guardado en "<output_dir>/manifest.json", de
+    modo que tras una interrupción el pipeline se reanuda desde la etapa que falló. El predictor y las cachés se reciben
+    como parámetros para compartirlos entre estudios: los genes y péptidos que ya se resolvieron o predijeron en un
+    estudio anterior no se vuelven a consultar.
+    Args:
+        study_id (str): El ID del estudio en cBioPortal.
+        clinical_path (str): Ruta del archivo TSV con los datos clínicos del estudio.
+        predictor: Predictor de MHCflurry (o ShardedPredictor) compartido.
+        uniprot_cache (UniProtCache): Caché de UniProt compartida.
+        prediction_cache (PredictionCache): Caché de predicciones compartida.
+        output_dir (str, opcional): Directorio donde se guardan los resultados del estudio. Por defecto es "resultados".
+        clinical_output_path (str, opcional): Ruta del CSV clínico con los recuentos de neoantígenos.
+            Por defecto es "<study_id>_clinical_data_with_neoantigens.csv" dentro de output_dir.
+        genotypes_path (str, opcional): Ruta de la tabla de genotipos HLA. Por defecto es "<study_id>_hla_genotypes.csv"
+            si existe; en otro caso se usan los alelos por defecto para todos los pacientes.
+        force (list, opcional): Nombres de las etapas que se ejecutan aunque estén al día.
+    Returns:
+        list: Nombres de las etapas que se han ejecutado.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if clinical_output_path is None:
+        clinical_output_path = os.path.join(output_dir, f"{study_id}_clinical_data_with_neoantigens.csv")
+    if genotypes_path is None:
+        genotypes_path = f"{study_id}_hla_genotypes.csv"
+
+    def table(name):
+        # Las tablas intermedias se guardan en Parquet; solo los informes finales se exportan a CSV
+        return os.path.join(output_dir, name + storage.FORMATS[storage.DEFAULT_FORMAT])
+
+    snapshot_path = os.path.join(MUTATIONS_SNAPSHOT_DIR, f"{study_id}.parquet")
+    incidence_dir = os.path.join(output_dir, "incidencia")
+
+    ######### Obtener información clínica y mutaciones  #########
+
+    def fetch():
+        # Descargar las mutaciones del estudio por páginas a una instantánea local. Si la etapa se fuerza se vuelve a descargar
+        getInformation.fetch_mutations_snapshot(study_id, snapshot_dir=MUTATIONS_SNAPSHOT_DIR, refresh="fetch" in force)
 
-# Guardar el DataFrame actualizado en un nuevo archivo CSV
-clinical_df.to_csv('es_dfarber_broad_2014_clinical_data_with_neoantigens.csv', index=False)
+    ######### Filtrar datos  #########
+
+    def filter_mutations():
+        # Leer el archivo de datos clínicos y filtrar solo las muestras que son tumores
+        clinical_df = pd.read_csv(clinical_path, sep='\t')
+        tumor_samples = clinical_df[clinical_df['Sample Class'] == 'Tumor']['Patient ID'].tolist()
+
+        # Filtrar mutaciones solo para los tumores
+        df = storage.read_table(snapshot_path, categorical=False)
+        df = df[df['patientId'].isin(tumor_samples)]
 
-print("Archivo actualizado con los contajes de neoantígenos SB y WB guardado como 'es_dfarber_broad_2014_clinical_data_with_neoantigens.csv'")
+        # Clasificar las mutaciones y añadir una nueva columna al DataFrame
+        df["Clasificación"] = df.apply(mutationModifications.clasificar_mutacion, axis=1)
+
+        # Identificar cada mutación para poder unir después sus péptidos y predicciones con ella
+        df = mutationModifications.add_mutation_ids(df)
+
+        # Guardar las mutaciones que se han descargado
+        storage.write_table(df, table("mutations"))
+
+        # Filtrar las mutaciones de tipo 'Missense_Mutation' y las inserciones y deleciones sin desplazamiento del marco de lectura
+        df = df[df["Mutation Type"].isin(["Missense_Mutation"] + mutationModifications.INDEL_MUTATION_TYPES)]
+
+        # Guardar las mutaciones que se van a tratar
+        storage.write_table(df, table("mutationsToBeTreated"))
+        print(f"[{study_id}] Datos clínicos cargados y filtrados")
+
+    ######### Obtener secuencias de UniProt  #########
+
+    def uniprot():
+        df = storage.read_table(table("mutationsToBeTreated"), categorical=False)
+
+        # Resolver en bloque cada gen distinto una sola vez y asignar el resultado a la columna "Gene"
+        uniprot_info_by_gene = uniprot_cache.bulk_get_uniprot_info(df["Gene"])
+        # Los genes nulos o sin resultado (por ejemplo, por un fallo de la consulta) se quedan sin ID ni secuencia
+        uniprot_info = [uniprot_info_by_gene.get(gene) or (None, None) for gene in df["Gene"]]
+        df["UniProt_ID"], df["Protein_Sequence"] = zip(*uniprot_info) if len(df) else ([], [])
+
+        # Guardar la información de UniProt de cada gen y las mutaciones con su secuencia
+        uniprot_info_df = pd.DataFrame([(gene, *info) for gene, info in uniprot_info_by_gene.items()],
+                                       columns=["Gene", "UniProt_ID", "Protein_Sequence"])
+        storage.write_table(uniprot_info_df, table("uniprot_info_df"))
+        storage.write_table(df, table("mutations_uniprot"))
+
+        print(f"[{study_id}] Información de UniProt obtenida y añadida al DataFrame", uniprot_cache.stats())
+
+    ######### Generar péptidos mutados #########
+
+    def peptides():
+        df = storage.read_table(table("mutations_uniprot"), categorical=False)
+
+        # Generar todas las secuencias mutadas de las mutaciones puntuales en una sola llamada vectorizada
+        missense_df = df[df["Mutation Type"] == "Missense_Mutation"]
+        missense_peptides_df = mutationModifications.generate_peptides_batch(missense_df, lengths=PEPTIDE_LENGTHS)
+
+        # Generar los péptidos nuevos de las inserciones y deleciones sin desplazamiento del marco de lectura
+        indel_df = df[df["Mutation Type"].isin(mutationModifications.INDEL_MUTATION_TYPES)]
+        indel_peptides_df = mutationModifications.generate_indel_peptides_batch(indel_df, lengths=PEPTIDE_LENGTHS)
+
+        # Unir todos los péptidos para predecirlos en el mismo lote deduplicado
+        mutated_peptides_df = pd.concat([missense_peptides_df, indel_peptides_df], ignore_index=True)
+
+        # Guardar los péptidos mutados
+        storage.write_table(mutated_peptides_df, table("mutated_peptides"))
+        print(f"[{study_id}] Péptidos mutados guardados en {table('mutated_peptides')}")
+
+    ######### Predecir neoanígenos y clasificarlos #########
+
+    def predict():
+        mutated_peptides_df = storage.read_table(table("mutated_peptides"), categorical=False)
+
+        # Leer los genotipos HLA de los pacientes. Si no hay tabla de genotipos se usan los alelos por defecto para todos
+        if os.path.exists(genotypes_path):
+            genotypes_df = mhcPredictions.load_hla_genotypes(genotypes_path)
+        else:
+            genotypes_df = pd.DataFrame(columns=["patientId", "allele"])
+
+        # Predecir la afinidad de unión usando MHCflurry contra los alelos de cada paciente,
+        # puntuando una sola vez cada par (péptido, alelo) y solo los que no están en caché.
+        # Las predicciones se guardan en la caché por alelo, así que una interrupción no obliga a repetirlas.
+        # Las predicciones sin clasificar se escriben alelo a alelo en su tabla, sin reunirlas en memoria
+        mhcPredictions.write_patient_allele_predictions(predictor, mutated_peptides_df, genotypes_df, table("mhcflurry_predictions"),
+                                                        cache=prediction_cache, default_alleles=DEFAULT_ALLELES)
+        print(f"[{study_id}] Predicciones de afinidad de unión realizadas")
+
+    def classify():
+        predictions_df = storage.read_table(table("mhcflurry_predictions"))
+
+        # Clasificar las predicciones en SB (Strong Binding) y WB (Weak Binding) en una sola operación vectorizada,
+        # con los umbrales de cada alelo si existe la tabla de umbrales
+        allele_thresholds = pd.read_csv(BINDING_THRESHOLDS_PATH) if os.path.exists(BINDING_THRESHOLDS_PATH) else None
+        predictions_df["Binding_Classification"] = mutationModifications.classify_binding_batch(
+            predictions_df, column="presentation_percentile", allele_thresholds=allele_thresholds, allele_column="best_allele")
+
+        # Guardar las clasificaciones de las predicciones
+        storage.write_table(predictions_df, table("predictions"))
+
+        # Los informes SB y WB tienen una fila por péptido, gen y paciente (la del mejor alelo, como unique_predictions)
+        best_df = best_allele_predictions(predictions_df)
+
+        # Filtrar y guardar los péptidos con alta probabilidad de presentación
+        strong_binding_peptides = best_df[best_df["Binding_Classification"] == "SB"]
+        storage.write_table(strong_binding_peptides, table("strong_binding_peptides"))
+
+        # Filtrar y guardar los péptidos con alta afinidad
+        weak_binding_peptides = best_df[best_df["Binding_Classification"] == "WB"]
+        storage.write_table(weak_binding_peptides, table("weak_binding_peptides"))
+        print(f"[{study_id}] Predicciones clasificadas en SB y WB")
+
+    ######### Tratamiento de los datos para unificar y separar en archivos  #########
+
+    def counts_key():
+        # Parámetros y archivos que cambian las predicciones de todas las muestras a la vez
+        inputs = [path for path in [genotypes_path, BINDING_THRESHOLDS_PATH] if os.path.exists(path)]
+        params = {"model_version": prediction_cache.model_version, "default_alleles": DEFAULT_ALLELES, "lengths": PEPTIDE_LENGTHS}
+        return pipeline.Stage("counts", None, inputs=inputs, params=params).fingerprint()[:16]
+
+    def aggregate():
+        predictions_df = storage.read_table(table("predictions"))
+
+        # Eliminar filas duplicadas basadas en 'peptido', 'gen' y 'patientId', quedándose con el alelo de mejor presentación
+        unique_predictions = best_allele_predictions(predictions_df)
+
+        # Guardar las predicciones únicas
+        storage.write_table(unique_predictions, table("unique_predictions"))
+        print(f"[{study_id}] Predicciones únicas guardadas en {table('unique_predictions')}")
+
+        # Guardar las matrices de incidencia paciente × péptido y paciente × gen para las consultas de neoantígenos compartidos
+        aggregation.CohortIncidence.from_predictions(unique_predictions).save(incidence_dir)
+
+        # Actualizar los contadores por paciente y muestra (clasificación, longitud y alelo). Solo se recalculan las muestras
+        # nuevas o cuyas mutaciones han cambiado desde la última ejecución; si cambian los parámetros comunes, todas
+        mutations_df = storage.read_table(table("mutations_uniprot"), categorical=False)
+        patient_counts = aggregation.PatientCounts.load(output_dir)
+        patient_counts.sync(unique_predictions, mutations_df, key=counts_key())
+        patient_counts.save(output_dir)
+
+        # Escribir el número de neoantígenos SB y WB por paciente en el DataFrame clínico a partir de los contadores
+        clinical_df = pd.read_csv(clinical_path, sep='\t')
+        count_columns = [f"Neoantigen_{classification}_Count" for classification in mutationModifications.NEOANTIGEN_CLASSES]
+        clinical_df = patient_counts.update_clinical(clinical_df, columns=count_columns)
+        # Guardar el DataFrame actualizado en un nuevo archivo CSV
+        clinical_df.to_csv(clinical_output_path, index=False)
+        print(f"[{study_id}] Archivo actualizado con los contajes de neoantígenos SB y WB guardado como '{clinical_output_path}'")
+
+    ######### Exportar los informes en CSV  #########
+
+    def report():
+        # Solo las tablas finales se exportan a CSV para consultarlas fuera del pipeline
+        for name in REPORT_TABLES:
+            storage.export_csv(table(name))
+        print(f"[{study_id}] Informes exportados a CSV en {output_dir}")
+
+    prediction_inputs = [table("mutated_peptides")] + ([genotypes_path] if os.path.exists(genotypes_path) else [])
+    stages = [
+        pipeline.Stage("fetch", fetch, outputs=[snapshot_path], params={"study_id": study_id}),
+        pipeline.Stage("filter", filter_mutations, inputs=[snapshot_path, clinical_path],
+                       outputs=[table("mutations"), table("mutationsToBeTreated")]),
+        pipeline.Stage("uniprot", uniprot, inputs=[table("mutationsToBeTreated")],
+                       outputs=[table("uniprot_info_df"), table("mutations_uniprot")]),
+        pipeline.Stage("peptides", peptides, inputs=[table("mutations_uniprot")],
+                       outputs=[table("mutated_peptides")], params={"lengths": PEPTIDE_LENGTHS}),
+        pipeline.Stage("predict", predict, inputs=prediction_inputs, outputs=[table("mhcflurry_predictions")],
+                       params={"model_version": prediction_cache.model_version, "default_alleles": DEFAULT_ALLELES}),
+        pipeline.Stage("classify", classify, inputs=[table("mhcflurry_predictions")] + ([BINDING_THRESHOLDS_PATH] if os.path.exists(BINDING_THRESHOLDS_PATH) else []),
+                       outputs=[table("predictions"), table("strong_binding_peptides"), table("weak_binding_peptides")]),
+        pipeline.Stage("aggregate", aggregate, inputs=[table("predictions"), table("mutations_uniprot"), clinical_path],
+                       outputs=[table("unique_predictions"), clinical_output_path,
+                                os.path.join(incidence_dir, aggregation.CohortIncidence.MATRIX_FILES["peptide"]),
+                                table(aggregation.PatientCounts.FILE), table(aggregation.PatientCounts.FINGERPRINTS_FILE)]),
+        pipeline.Stage("report", report, inputs=[table(name) for name in REPORT_TABLES],
+                       outputs=[os.path.join(output_dir, name + ".csv") for name in REPORT_TABLES]),
+    ]
+    return pipeline.Pipeline(os.path.join(output_dir, pipeline.MANIFEST_FILE)).run(stages, force=force)
+
+
+def run_studies(studies, results_dir=RESULTS_DIR, n_workers=None, shard_size=50000, force=()):
+    """
+    Ejecuta el pipeline para una lista de estudios compartiendo un único predictor, una caché de UniProt
+    y una caché de predicciones. Como los genes y los péptidos se repiten mucho entre estudios del mismo tipo
+    de tumor, cada estudio adicional solo consulta UniProt y MHCflurry por lo que aún no está en caché.
+    Args:
+        studies (list): Lista de tuplas (study_id, ruta del TSV clínico).
+        results_dir (str, opcional): Directorio de resultados. Con un solo estudio los resultados se guardan
+            directamente en él, como hasta ahora; con varios, en "<results_dir>/<study_id>".
+        n_workers (int, opcional): Número de procesos para la predicción. Por defecto es el número de CPUs.
+        shard_size (int, opcional): Número de péptidos por fragmento de predicción. Por defecto es 50000.
+        force (list, opcional): Nombres de las etapas que se ejecutan aunque estén al día.
+    Returns:
+        dict: Diccionario con las etapas ejecutadas en cada estudio.
+    """
+    n_workers = n_workers or os.cpu_count()
+
+    # Crear una instancia de UniProtCache persistente. Si existe el índice local del proteoma se usa en lugar de la API
+    proteome_index = proteomeIndex.ProteomeIndex('proteoma') if os.path.exists('proteoma/indice.tsv') else None
+    uniprot_cache = uniProtCache.UniProtCache(proteome_index=proteome_index, db_path='cache/uniprot_cache.sqlite')
+
+    # Abrir la caché persistente de predicciones para la versión actual de los modelos
+    prediction_cache = predictionCache.PredictionCache("cache/predicciones_mhcflurry.sqlite", model_version=mhcPredictions.get_model_version())
+    prediction_cache.purge_stale_versions()
+
+    # Cargar MHCflurry predictor. Con varios procesos, cada uno carga el predictor una sola vez para todos los estudios
+    if n_workers > 1:
+        predictor = mhcPredictions.ShardedPredictor(mhcPredictions.load_predictor, max_workers=n_workers, shard_size=shard_size)
+    else:
+        predictor = mhcPredictions.load_predictor()
+
+    results = {}
+    try:
+        for study_id, clinical_path in studies:
+            if len(studies) == 1:
+                # Un solo estudio: se mantienen las rutas de salida originales
+                output_dir = results_dir
+                clinical_output_path = f"{study_id}_clinical_data_with_neoantigens.csv"
+            else:
+                output_dir = os.path.join(results_dir, study_id)
+                clinical_output_path = None
+            results[study_id] = run_study(study_id, clinical_path, predictor, uniprot_cache, prediction_cache,
+                                          output_dir=output_dir, clinical_output_path=clinical_output_path, force=force)
+    finally:
+        if n_workers > 1:
+            predictor.close()
+        if proteome_index is not None:
+            proteome_index.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predicción de neoantígenos para uno o varios estudios de cBioPortal.")
+    parser.add_argument("--study", nargs=2, action="append", metavar=("STUDY_ID", "CLINICAL_TSV"),
+                        help="ID del estudio en cBioPortal y ruta de su archivo de datos clínicos. Se puede repetir.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="Directorio de resultados.")
+    parser.add_argument("--workers", type=int, default=None, help="Número de procesos para la predicción.")
+    parser.add_argument("--shard-size", type=int, default=50000, help="Número de péptidos por fragmento de predicción.")
+    parser.add_argument("--force", nargs="*", default=[], choices=STAGES, metavar="STAGE",
+                        help=f"Etapas que se ejecutan aunque estén al día: {', '.join(STAGES)}.")
+    args = parser.parse_args(argv)
+
+    studies = [tuple(study) for study in args.study] if args.study else DEFAULT_STUDIES
+    run_studies(studies, results_dir=args.results_dir, n_workers=args.workers, shard_size=args.shard_size, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
 
 
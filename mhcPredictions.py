@@ -0,0 +1,354 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+
+import pipeline
+import storage
+from predictionCache import PREDICTION_COLUMNS
+
+# Description: Este script contiene las funciones para predecir la presentación de los péptidos mutados con MHCflurry.
+
+# Predictor cargado en cada proceso del pool de ShardedPredictor
+_worker_predictor = None
+
+def get_model_version():
+    """
+    Obtiene una cadena que identifica la versión de MHCflurry y de sus modelos descargados.
+    Se utiliza como parte de la clave de la caché de predicciones, para que al cambiar los modelos
+    no se reutilicen predicciones antiguas.
+    Returns:
+        str: La versión de MHCflurry y la versión de los modelos, por ejemplo "2.1.1/2.2.0".
+    """
+    import mhcflurry
+    from mhcflurry.downloads import get_current_release
+
+    return f"{mhcflurry.__version__}/{get_current_release()}"
+
+
+def load_predictor():
+    """
+    Carga el predictor de presentación de MHCflurry con los modelos descargados.
+    Returns:
+        Class1PresentationPredictor: El predictor de MHCflurry.
+    """
+    from mhcflurry import Class1PresentationPredictor
+
+    return Class1PresentationPredictor.load()
+
+
+def _init_worker(predictor_factory):
+    """
+    Inicializa un proceso del pool cargando el predictor una sola vez.
+    """
+    global _worker_predictor
+    _worker_predictor = predictor_factory()
+
+
+def _predict_shard(peptides, alleles, output_path):
+    """
+    Predice un fragmento de péptidos en un proceso del pool y guarda el resultado en disco.
+    Returns:
+        str: La ruta del archivo con las predicciones del fragmento.
+    """
+    predictions = pd.DataFrame(_worker_predictor.predict(peptides=peptides, alleles=alleles, verbose=0))
+    return storage.write_table(predictions.reindex(columns=["peptide"] + PREDICTION_COLUMNS), output_path, categorical_columns=[])
+
+
+class ShardedPredictor:
+    def __init__(self, predictor_factory=load_predictor, max_workers=None, shard_size=50000, shard_dir="cache/shards", max_pending=None):
+        """
+        Predictor que reparte los péptidos en fragmentos de tamaño fijo y los puntúa en un pool de procesos.
+        Tiene la misma interfaz predict que Class1PresentationPredictor, por lo que se puede usar en su lugar
+        con predict_allele, predict_patient_alleles y predict_unique_peptides.
+        Args:
+            predictor_factory (callable, opcional): Función sin argumentos que carga el predictor. Cada proceso
+                la llama una sola vez al arrancar. Por defecto es load_predictor.
+            max_workers (int, opcional): Número de procesos del pool. Por defecto es el número de CPUs.
+            shard_size (int, opcional): Número de péptidos de cada fragmento. Por defecto es 50.000.
+            shard_dir (str, opcional): Directorio donde se guardan las predicciones de cada fragmento. Por defecto es "cache/shards".
+            max_pending (int, opcional): Número máximo de fragmentos en curso o esperando a ser leídos. Acota la memoria
+                y el disco que ocupan los fragmentos. Por defecto son dos por proceso (ver pipeline.bounded_map).
+        """
+        self.shard_size = shard_size
+        self.shard_dir = shard_dir
+        self.max_pending = max_pending
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(predictor_factory,))
+
+    def iter_predict(self, peptides, alleles):
+        """
+        Predice la presentación de los péptidos repartiéndolos en fragmentos entre los procesos del pool y devuelve
+        las predicciones fragmento a fragmento. Cada fragmento se escribe en disco en cuanto termina, se lee al
+        devolverlo y se borra, y solo hay max_pending fragmentos en curso a la vez, así que la memoria no crece con
+        el número de péptidos.
+        Args:
+            peptides (list): Lista de péptidos a puntuar.
+            alleles (list): Lista de alelos HLA.
+        Yields:
+            pandas.DataFrame: Las predicciones de cada fragmento, en el orden de los péptidos, con la columna "peptide"
+                y las columnas de PREDICTION_COLUMNS.
+        """
+        peptides = list(peptides)
+        os.makedirs(self.shard_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(dir=self.shard_dir)
+        try:
+            starts = range(0, len(peptides), self.shard_size)
+            shard_paths = pipeline.bounded_map(
+                self.executor, _predict_shard, (peptides[start:start + self.shard_size] for start in starts), repeat(list(alleles)),
+                (os.path.join(work_dir, f"shard_{start // self.shard_size}") for start in starts), max_pending=self.max_pending)
+            for path in shard_paths:
+                shard = storage.read_table(path, categorical=False)
+                os.remove(path)
+                yield shard
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def predict(self, peptides, alleles, verbose=0):
+        """
+        Predice la presentación de los péptidos y une todos los fragmentos en un solo DataFrame, con la misma interfaz
+        que Class1PresentationPredictor.predict. Para no tener todas las predicciones en memoria, usar iter_predict.
+        Args:
+            peptides (list): Lista de péptidos a puntuar.
+            alleles (list): Lista de alelos HLA.
+            verbose (int, opcional): Se ignora; se mantiene por compatibilidad con Class1PresentationPredictor.
+        Returns:
+            pandas.DataFrame: Las predicciones con la columna "peptide" y las columnas de PREDICTION_COLUMNS.
+        """
+        shards = list(self.iter_predict(peptides, alleles))
+        if not shards:
+            return pd.DataFrame(columns=["peptide"] + PREDICTION_COLUMNS)
+        return pd.concat(shards, ignore_index=True)
+
+    def close(self):
+        """
+        Cierra el pool de procesos.
+        """
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_allele_predictions(predictor, peptides, allele, cache=None):
+    """
+    Predice la presentación de una lista de péptidos únicos contra un alelo y devuelve las predicciones por bloques:
+    primero las que ya estaban en la caché y después cada fragmento predicho. Si el predictor tiene iter_predict
+    (como ShardedPredictor) los fragmentos se reciben a medida que terminan; si no, las predicciones nuevas forman
+    un solo bloque. Cada bloque se guarda en la caché al recibirlo.
+    Args:
+        predictor (Class1PresentationPredictor o ShardedPredictor): El predictor ya cargado.
+        peptides (list): Lista de péptidos sin duplicados.
+        allele (str): El alelo HLA contra el que se puntúan los péptidos.
+        cache (PredictionCache, opcional): Caché persistente de predicciones. Por defecto es None.
+    Yields:
+        pandas.DataFrame: Bloques con las columnas "peptide", las columnas de PREDICTION_COLUMNS y "allele".
+    """
+    columns = ["peptide"] + PREDICTION_COLUMNS
+    cached = cache.get_many(peptides, allele) if cache is not None else pd.DataFrame(columns=columns)
+    if not cached.empty:
+        yield cached.reindex(columns=columns).assign(allele=allele)
+
+    # Predecir solo los péptidos que no estaban en la caché
+    cached_peptides = set(cached["peptide"])
+    missing = [peptide for peptide in peptides if peptide not in cached_peptides]
+    if not missing:
+        return
+    if hasattr(predictor, "iter_predict"):
+        chunks = predictor.iter_predict(missing, [allele])
+    else:
+        chunks = [predictor.predict(peptides=missing, alleles=[allele], verbose=0)]
+    for chunk in chunks:
+        predicted = pd.DataFrame(chunk).reindex(columns=columns)
+        if cache is not None:
+            cache.put_many(predicted, allele)
+        yield predicted.assign(allele=allele)
+
+
+def predict_allele(predictor, peptides, allele, cache=None):
+    """
+    Predice la presentación de una lista de péptidos únicos contra un alelo.
+    Si se proporciona una caché, primero se buscan en bloque las predicciones ya guardadas y solo se
+    envían al modelo los péptidos que no están en ella. Las predicciones nuevas se guardan en la caché.
+    Args:
+        predictor (Class1PresentationPredictor): El predictor de MHCflurry ya cargado.
+        peptides (list): Lista de péptidos sin duplicados.
+        allele (str): El alelo HLA contra el que se puntúan los péptidos.
+        cache (PredictionCache, opcional): Caché persistente de predicciones. Por defecto es None.
+    Returns:
+        pandas.DataFrame: Una fila por péptido con las columnas "peptide", las columnas de PREDICTION_COLUMNS y "allele".
+    """
+    chunks = list(iter_allele_predictions(predictor, peptides, allele, cache))
+    if not chunks:
+        return pd.DataFrame(columns=["peptide"] + PREDICTION_COLUMNS + ["allele"])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def load_hla_genotypes(path):
+    """
+    Lee la tabla de genotipos HLA de clase I de cada paciente.
+    El archivo puede estar en formato ancho, con una columna "patientId" y hasta seis columnas de alelos
+    (por ejemplo "HLA-A_1", "HLA-A_2", "HLA-B_1", ...), o en formato largo con las columnas "patientId" y "allele".
+    Args:
+        path (str): Ruta del archivo CSV con los genotipos.
+    Returns:
+        pandas.DataFrame: DataFrame en formato largo con las columnas "patientId" y "allele", sin valores nulos ni duplicados.
+    """
+    genotypes_df = pd.read_csv(path)
+    if "allele" not in genotypes_df.columns:
+        genotypes_df = genotypes_df.melt(id_vars="patientId", value_name="allele")
+    genotypes_df = genotypes_df[["patientId", "allele"]].dropna()
+    return genotypes_df.drop_duplicates().reset_index(drop=True)
+
+
+def _patient_allele_occurrences(mutated_peptides_df, genotypes_df, default_alleles):
+    """
+    Combina cada aparición de un péptido con los alelos de su paciente (o los alelos por defecto si no tiene genotipo)
+    y obtiene los pares (péptido, alelo) distintos que hay que puntuar, incluidos los de los péptidos silvestres.
+    Returns:
+        tuple: Las apariciones (con "peptido" renombrado a "peptide" y "peptido_wt" a "peptide_wt"), los pares
+            distintos con las columnas "peptide" y "allele", si hay péptidos silvestres y las columnas de las apariciones.
+    """
+    with_reference = "peptido_wt" in mutated_peptides_df.columns
+    occurrence_columns = [column for column in mutated_peptides_df.columns if column not in ("peptido", "peptido_wt")]
+
+    # Asignar los alelos por defecto a los pacientes que no tienen genotipo
+    untyped_patients = set(mutated_peptides_df["patientId"]) - set(genotypes_df["patientId"])
+    if untyped_patients:
+        default_genotypes = pd.DataFrame({"patientId": sorted(untyped_patients)}).merge(
+            pd.DataFrame({"allele": list(default_alleles)}), how="cross")
+        genotypes_df = pd.concat([genotypes_df, default_genotypes], ignore_index=True)
+
+    # Cada aparición del péptido se combina con los alelos de su paciente
+    occurrences = mutated_peptides_df.rename(columns={"peptido": "peptide", "peptido_wt": "peptide_wt"})
+    occurrences = occurrences.merge(genotypes_df, on="patientId", how="inner")
+
+    # Cada par (péptido, alelo) distinto se puntúa una sola vez, junto con los péptidos silvestres
+    pairs = occurrences[["peptide", "allele"]]
+    if with_reference:
+        reference_pairs = occurrences[["peptide_wt", "allele"]].dropna().rename(columns={"peptide_wt": "peptide"})
+        pairs = pd.concat([pairs, reference_pairs], ignore_index=True)
+    return occurrences, pairs.drop_duplicates(), with_reference, occurrence_columns
+
+
+def _empty_allele_predictions():
+    """
+    Devuelve las predicciones únicas vacías, con las columnas de predict_allele, para cuando no hay pares (péptido, alelo).
+    """
+    return pd.DataFrame(columns=["peptide"] + PREDICTION_COLUMNS + ["allele"])
+
+
+def _join_predictions(occurrences, unique_predictions_df, with_reference, occurrence_columns):
+    """
+    Une las predicciones de los pares (péptido, alelo) distintos a cada aparición del péptido y, con péptidos
+    silvestres, calcula el DAI de forma vectorizada.
+    """
+    predictions_df = occurrences.merge(unique_predictions_df, on=["peptide", "allele"], how="left", validate="many_to_one")
+    if not with_reference:
+        return predictions_df[["peptide"] + PREDICTION_COLUMNS + occurrence_columns]
+
+    # Unir las predicciones de los péptidos silvestres y calcular el DAI
+    reference_predictions = unique_predictions_df[["peptide", "allele", "affinity", "presentation_percentile"]].rename(
+        columns={"peptide": "peptide_wt", "affinity": "affinity_wt", "presentation_percentile": "presentation_percentile_wt"})
+    predictions_df = predictions_df.merge(reference_predictions, on=["peptide_wt", "allele"], how="left", validate="many_to_one")
+    predictions_df["DAI"] = predictions_df["affinity_wt"] / predictions_df["affinity"]
+
+    reference_columns = ["DAI", "peptide_wt", "affinity_wt", "presentation_percentile_wt"]
+    return predictions_df[["peptide"] + PREDICTION_COLUMNS + reference_columns + occurrence_columns]
+
+
+def predict_patient_alleles(predictor, mutated_peptides_df, genotypes_df, cache=None, default_alleles=("HLA-A*02:01",)):
+    """
+    Predice la presentación de los péptidos mutados contra los alelos HLA de cada paciente.
+    Cada péptido se puntúa solo contra los alelos de los pacientes que lo portan, en lugar del producto cruzado
+    de todos los péptidos por todos los alelos. Los pares (péptido, alelo) distintos se agrupan por alelo y cada
+    grupo se envía al predictor en un único lote. Después se unen los resultados a cada aparición del péptido
+    mediante una unión por clave ('peptide', 'allele').
+    Si el DataFrame incluye la columna "peptido_wt", los péptidos silvestres se puntúan en el mismo lote
+    deduplicado (y con la misma caché) que los mutados, y se añade la columna "DAI" (afinidad del péptido
+    silvestre dividida entre la afinidad del mutado) junto a "presentation_percentile".
+    Args:
+        predictor (Class1PresentationPredictor): El predictor de MHCflurry ya cargado.
+        mutated_peptides_df (pandas.DataFrame): DataFrame con las columnas "peptido", "gen", "patientId" y "sampleId",
+            y opcionalmente "peptido_wt".
+        genotypes_df (pandas.DataFrame): Genotipos HLA en formato largo, con las columnas "patientId" y "allele".
+        cache (PredictionCache, opcional): Caché persistente de predicciones. Por defecto es None.
+        default_alleles (tuple, opcional): Alelos que se usan para los pacientes sin genotipo. Por defecto es ("HLA-A*02:01",).
+    Returns:
+        pandas.DataFrame: Una fila por aparición del péptido y alelo del paciente, con las predicciones de MHCflurry
+            y las columnas "gen", "patientId" y "sampleId" añadidas al final. Con péptidos silvestres se añaden
+            además las columnas "DAI", "peptide_wt", "affinity_wt" y "presentation_percentile_wt".
+    """
+    occurrences, pairs, with_reference, occurrence_columns = _patient_allele_occurrences(mutated_peptides_df, genotypes_df, default_alleles)
+
+    # Puntuar cada par (péptido, alelo) distinto una sola vez, en un lote por alelo. Sin pares (no hay péptidos o los
+    # pacientes no tienen alelos) el resultado es una tabla vacía con las columnas de salida
+    if pairs.empty:
+        unique_predictions_df = _empty_allele_predictions()
+    else:
+        unique_predictions_df = pd.concat(
+            [predict_allele(predictor, group["peptide"].tolist(), allele, cache) for allele, group in pairs.groupby("allele", sort=False)],
+            ignore_index=True)
+
+    # Unir las predicciones a cada aparición del péptido (paciente, muestra y gen)
+    return _join_predictions(occurrences, unique_predictions_df, with_reference, occurrence_columns)
+
+
+def write_patient_allele_predictions(predictor, mutated_peptides_df, genotypes_df, output_path, cache=None, default_alleles=("HLA-A*02:01",)):
+    """
+    Predice la presentación de los péptidos mutados contra los alelos HLA de cada paciente, como predict_patient_alleles,
+    pero sin reunir todas las predicciones en memoria. Los alelos se tratan de uno en uno: sus predicciones únicas
+    se escriben por fragmentos en una tabla Parquet temporal (con ShardedPredictor, a medida que terminan), esa tabla
+    se une con las apariciones del alelo y el resultado se añade a la tabla de salida. En memoria solo están las
+    apariciones de los péptidos y las predicciones y el resultado del alelo en curso.
+    Args:
+        predictor (Class1PresentationPredictor o ShardedPredictor): El predictor ya cargado.
+        mutated_peptides_df (pandas.DataFrame): Los péptidos mutados (ver predict_patient_alleles).
+        genotypes_df (pandas.DataFrame): Genotipos HLA en formato largo, con las columnas "patientId" y "allele".
+        output_path (str): Ruta de la tabla Parquet de salida, con o sin extensión.
+        cache (PredictionCache, opcional): Caché persistente de predicciones. Por defecto es None.
+        default_alleles (tuple, opcional): Alelos que se usan para los pacientes sin genotipo. Por defecto es ("HLA-A*02:01",).
+    Returns:
+        str: La ruta de la tabla guardada. Tiene las columnas de predict_patient_alleles, con las filas agrupadas por alelo.
+    """
+    occurrences, pairs, with_reference, occurrence_columns = _patient_allele_occurrences(mutated_peptides_df, genotypes_df, default_alleles)
+    occurrence_rows = occurrences.groupby("allele", sort=False).indices
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+
+    def allele_predictions():
+        if pairs.empty:
+            yield _join_predictions(occurrences, _empty_allele_predictions(), with_reference, occurrence_columns)
+        for number, (allele, group) in enumerate(pairs.groupby("allele", sort=False)):
+            allele_path = storage.write_batches(iter_allele_predictions(predictor, group["peptide"].tolist(), allele, cache),
+                                                os.path.join(work_dir, f"alelo_{number}"))
+            unique_predictions_df = storage.read_table(allele_path, categorical=False)
+            os.remove(allele_path)
+            yield _join_predictions(occurrences.iloc[occurrence_rows[allele]], unique_predictions_df, with_reference, occurrence_columns)
+
+    try:
+        return storage.write_batches(allele_predictions(), output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def predict_unique_peptides(predictor, mutated_peptides_df, alleles, cache=None):
+    """
+    Predice la presentación de los péptidos mutados puntuando una sola vez cada par (péptido, alelo) distinto.
+    Es el caso particular de predict_patient_alleles en el que todos los pacientes comparten los mismos alelos.
+    Args:
+        predictor (Class1PresentationPredictor): El predictor de MHCflurry ya cargado.
+        mutated_peptides_df (pandas.DataFrame): DataFrame con las columnas "peptido", "gen", "patientId" y "sampleId".
+        alleles (list): Lista de alelos HLA contra los que se puntúa cada péptido.
+        cache (PredictionCache, opcional): Caché persistente de predicciones. Por defecto es None.
+    Returns:
+        pandas.DataFrame: Las predicciones de MHCflurry de cada aparición del péptido, con las columnas
+            "gen", "patientId" y "sampleId" añadidas al final.
+    """
+    genotypes_df = pd.DataFrame({"patientId": mutated_peptides_df["patientId"].unique()}).merge(
+        pd.DataFrame({"allele": list(alleles)}), how="cross")
+    return predict_patient_alleles(predictor, mutated_peptides_df, genotypes_df, cache=cache)
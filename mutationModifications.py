@@ -1,5 +1,20 @@
+import re
+from collections import deque
+from itertools import chain, islice
+
+import numpy as np
+import pandas as pd
+
 # Description: Este script contiene funciones para modificar y clasificar mutaciones genéticas.
 
+# Tipos de mutación de cBioPortal que cambian la longitud de la proteína sin desplazar el marco de lectura.
+# Los desplazamientos del marco de lectura (Frame_Shift_Del y Frame_Shift_Ins) no se tratan: la notación de la
+# proteína ('K700Nfs*8') no incluye la cola nueva, y obtenerla requiere la secuencia codificante (CDS)
+INDEL_MUTATION_TYPES = ["In_Frame_Del", "In_Frame_Ins"]
+
+# Formatos del cambio de proteína: 'Q508_Q510del', 'S247dup', 'K12_L13insAB' y 'A12delinsKL'
+INDEL_PATTERN = re.compile(r"^[A-Z*](\d+)(?:_[A-Z*](\d+))?(del|dup|ins|delins)([A-Z*]*)$")
+
 def create_mutations_dict(muts):
     """
     Convierte una lista de objetos de mutación en una lista de diccionarios con atributos específicos.
@@ -98,8 +113,98 @@ def clasificar_mutacion(row):
     return "Otro"
 
 
+# Columnas que identifican una mutación dentro de una muestra
+MUTATION_ID_COLUMNS = ["sampleId", "chr", "startPosition", "endPosition", "referenceAllele", "variantAllele"]
+
+def add_mutation_ids(mutations_df):
+    """
+    Añade a cada mutación un identificador estable "mutationId", construido a partir de la muestra y de la
+    posición y los alelos genómicos (por ejemplo 'S1:7:140453136-140453136:A>T'). El identificador se conserva
+    en los péptidos y en las predicciones, de modo que cada predicción se puede unir con su mutación de origen.
+    Args:
+        mutations_df (pandas.DataFrame): DataFrame con las columnas de MUTATION_ID_COLUMNS.
+    Returns:
+        pandas.DataFrame: Una copia del DataFrame con la columna "mutationId".
+    """
+    parts = {column: mutations_df[column].astype(str) for column in MUTATION_ID_COLUMNS}
+    mutation_ids = (parts["sampleId"] + ":" + parts["chr"] + ":" + parts["startPosition"] + "-" + parts["endPosition"]
+                    + ":" + parts["referenceAllele"] + ">" + parts["variantAllele"])
+    return mutations_df.assign(mutationId=mutation_ids)
+
+
+def generate_peptide_windows(sequences, protein_index, positions, alts, lengths=9):
+    """
+    Genera en bloque todas las ventanas de las longitudes pedidas que contienen cada mutación puntual.
+    Junto a cada péptido mutado se devuelve la ventana equivalente de la proteína original (péptido silvestre).
+    Las proteínas se concatenan en un único buffer de bytes y, en una sola pasada, se extrae para cada mutación
+    el contexto de la proteína alrededor de la posición mutada (la mutación en el centro y max(lengths) - 1
+    residuos a cada lado). Todas las ventanas de todas las longitudes se obtienen después como cortes de ese
+    contexto, sin volver a recorrer la proteína ni construir cadenas o diccionarios por fila.
+    Para cada mutación las ventanas se ordenan por longitud y, dentro de cada longitud, en el mismo orden que
+    generate_mutated_peptides (primero la que tiene la mutación en la posición 0 del péptido).
+    Args:
+        sequences (list): Lista de secuencias de proteínas (str).
+        protein_index (array-like): Para cada mutación, el índice de su proteína en sequences, o -1 si no tiene secuencia.
+        positions (array-like): Para cada mutación, la posición mutada en la proteína (índice basado en 1).
+        alts (array-like): Para cada mutación, el aminoácido mutado (un carácter).
+        lengths (int o list, optional): La longitud o longitudes de los péptidos a generar. El valor predeterminado es 9.
+    Returns:
+        dict: Un diccionario con cuatro arrays de la misma longitud:
+            - "mutation_index" (numpy.ndarray): El índice de la mutación de la que procede cada péptido.
+            - "peptido" (numpy.ndarray): Los péptidos mutados como bytes de ancho fijo (dtype S{max(lengths)}).
+            - "peptido_wt" (numpy.ndarray): Los péptidos silvestres equivalentes, con el mismo formato.
+            - "longitud" (numpy.ndarray): La longitud de cada péptido.
+            - "posicion_mutacion" (numpy.ndarray): La posición de la mutación dentro del péptido (índice basado en 0).
+    """
+    lengths = sorted({lengths} if isinstance(lengths, int) else set(lengths))
+    max_length = lengths[-1]
+    protein_index = np.asarray(protein_index, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64) - 1  # Ajustar el índice
+    alt_codes = np.frombuffer("".join(alts).encode("ascii"), dtype=np.uint8)
+
+    # Concatenar las proteínas en un único buffer con una tabla de desplazamientos
+    encoded = [sequence.encode("ascii") for sequence in sequences]
+    protein_lengths = np.array([len(sequence) for sequence in encoded] + [0], dtype=np.int64)
+    protein_offsets = np.concatenate(([0], np.cumsum(protein_lengths[:-1])))
+    buffer = np.frombuffer(b"".join(encoded) + b"\0", dtype=np.uint8)
+
+    # Extraer una sola vez el contexto de cada mutación: max_length - 1 residuos a cada lado de la posición mutada
+    center = max_length - 1
+    context_cells = positions[:, None] + np.arange(-center, max_length)[None, :]
+    valid_cells = (protein_index[:, None] >= 0) & (context_cells >= 0) & (context_cells < protein_lengths[protein_index][:, None])
+    reference_context = buffer[np.where(valid_cells, protein_offsets[protein_index][:, None] + context_cells, len(buffer) - 1)]
+    context = reference_context.copy()
+    context[:, center] = alt_codes
+
+    mutation_index, peptides, reference_peptides, peptide_lengths, mutation_offsets = [], [], [], [], []
+    for length in lengths:
+        # La ventana con la mutación en la posición i del péptido empieza en la columna center - i del contexto
+        offsets = np.arange(length)
+        window_starts = center - offsets
+        valid = valid_cells[:, window_starts] & valid_cells[:, window_starts + length - 1]
+        rows, offset_in_peptide = np.nonzero(valid)
+        window_cells = (rows[:, None], window_starts[offset_in_peptide][:, None] + offsets[None, :])
+
+        mutation_index.append(rows)
+        peptides.append(np.ascontiguousarray(context[window_cells]).view(f"S{length}").ravel().astype(f"S{max_length}"))
+        reference_peptides.append(np.ascontiguousarray(reference_context[window_cells]).view(f"S{length}").ravel().astype(f"S{max_length}"))
+        peptide_lengths.append(np.full(len(rows), length))
+        mutation_offsets.append(offset_in_peptide)
+
+    mutation_index, peptides, reference_peptides = np.concatenate(mutation_index), np.concatenate(peptides), np.concatenate(reference_peptides)
+    peptide_lengths, mutation_offsets = np.concatenate(peptide_lengths), np.concatenate(mutation_offsets)
+
+    # Agrupar las ventanas por mutación, y dentro de cada mutación por longitud
+    order = np.lexsort((mutation_offsets, peptide_lengths, mutation_index))
+    return {
+        "mutation_index": mutation_index[order],
+        "peptido": peptides[order],
+        "peptido_wt": reference_peptides[order],
+        "longitud": peptide_lengths[order],
+        "posicion_mutacion": mutation_offsets[order],
+    }
+
 
-# 
 def generate_mutated_peptides(sequence, mutation, length=9):
     """
     Genera péptidos con la mutación en cada posición a partir de una secuencia dada de longitud length.
@@ -114,25 +219,9 @@ def generate_mutated_peptides(sequence, mutation, length=9):
     """
     if sequence is None:
         return []  # Devolver lista vacía si no hay secuencia
-    
-    position = int(mutation[1:-1]) - 1  # Ajustar el índice
-    mutated_peptides = []
 
-    # Generar péptidos con la mutación en cada posición del péptido
-    for i in range(length):
-        start = max(0, position - i)
-        end = min(len(sequence), position - i + length)
-        segment = sequence[start:end]
-
-        # Aplicar la mutación en la posición específica dentro del segmento
-        if i < len(segment):
-            segment = segment[:i] + mutation[-1] + segment[i+1:]
-
-        # Asegurarse de que el péptido tenga la longitud especificada
-        if len(segment) == length:
-            mutated_peptides.append(segment)
-
-    return mutated_peptides
+    windows = generate_peptide_windows([sequence], [0], [int(mutation[1:-1])], [mutation[-1]], lengths=length)
+    return windows["peptido"].astype(str).tolist()
 
 
 def generate_peptides(row):
@@ -148,6 +237,7 @@ def generate_peptides(row):
     Returns:
         list: Una lista de diccionarios, cada uno conteniendo:
             - "peptido" (str): La secuencia del péptido mutado.
+            - "peptido_wt" (str): La secuencia del péptido silvestre equivalente.
             - "gen" (str): El nombre del gen.
             - "patientId" (str): El ID del paciente.
             - "sampleId" (str): El ID de la muestra.
@@ -157,8 +247,147 @@ def generate_peptides(row):
     base_sequence = row["Protein_Sequence"]
     patient_id = row["patientId"]
     sample_id = row["sampleId"]
-    peptides = generate_mutated_peptides(base_sequence, mutation)
-    return [{"peptido": peptide, "gen": gene, "patientId": patient_id, "sampleId": sample_id} for peptide in peptides]
+    if base_sequence is None:
+        return []
+    windows = generate_peptide_windows([base_sequence], [0], [int(mutation[1:-1])], [mutation[-1]])
+    peptides = zip(windows["peptido"].astype(str), windows["peptido_wt"].astype(str))
+    return [{"peptido": peptide, "peptido_wt": peptide_wt, "gen": gene, "patientId": patient_id, "sampleId": sample_id} for peptide, peptide_wt in peptides]
+
+
+def generate_peptides_batch(mutations_df, lengths=9):
+    """
+    Genera los péptidos mutados de todas las mutaciones de un DataFrame en una sola llamada vectorizada.
+    Con una sola longitud produce los mismos péptidos y en el mismo orden que aplicar generate_peptides a cada
+    fila y expandir el resultado. Con varias longitudes, todas se generan en una sola pasada sobre la proteína.
+    Las mutaciones sin secuencia o cuyo cambio de proteína no tiene el formato 'A1B' no generan péptidos.
+    Args:
+        mutations_df (pandas.DataFrame): DataFrame con las columnas "Gene", "Protein Change", "Protein_Sequence",
+            "patientId" y "sampleId". Si tiene la columna "mutationId" (ver add_mutation_ids) se copia a cada péptido.
+        lengths (int o list, optional): La longitud o longitudes de los péptidos a generar. El valor predeterminado es 9.
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas "peptido", "gen", "patientId", "sampleId", "peptido_wt" (péptido silvestre), "longitud"
+            (longitud del péptido) y "posicion_mutacion" (posición de la mutación dentro del péptido, basada en 0).
+            Si la entrada tiene "mutationId", se incluye después de "sampleId".
+    """
+    protein_change = mutations_df["Protein Change"].astype("string")
+    positions = pd.to_numeric(protein_change.str[1:-1], errors="coerce")
+    alts = protein_change.str[-1]
+
+    # Solo se tratan las mutaciones con una posición numérica y un aminoácido mutado
+    parsed = positions.notna().to_numpy() & alts.notna().to_numpy()
+    mutations = mutations_df[parsed]
+    protein_index, sequences = pd.factorize(mutations["Protein_Sequence"])
+
+    windows = generate_peptide_windows(list(sequences), protein_index, positions[parsed].astype(np.int64), alts[parsed].tolist(), lengths)
+    rows = windows["mutation_index"]
+    peptides_df = pd.DataFrame({
+        "peptido": windows["peptido"].astype(str),
+        "gen": mutations["Gene"].to_numpy()[rows],
+        "patientId": mutations["patientId"].to_numpy()[rows],
+        "sampleId": mutations["sampleId"].to_numpy()[rows],
+        "peptido_wt": windows["peptido_wt"].astype(str),
+        "longitud": windows["longitud"],
+        "posicion_mutacion": windows["posicion_mutacion"],
+    })
+    if "mutationId" in mutations.columns:
+        peptides_df.insert(4, "mutationId", mutations["mutationId"].to_numpy()[rows])
+    return peptides_df
+
+def parse_indel(sequence, protein_change):
+    """
+    Interpreta el cambio de proteína de una inserción o deleción sin desplazamiento del marco de lectura.
+    La proteína mutada es sequence[:start] + novel + sequence[end:]. Los desplazamientos del marco de lectura
+    ('K700Nfs*8') no se reconocen, porque su notación no incluye la cola nueva de la proteína.
+    Args:
+        sequence (str): La secuencia original de la proteína.
+        protein_change (str): El cambio de proteína, por ejemplo 'Q508_Q510del', 'S247dup', 'K12_L13insAB' o 'A12delinsKL'.
+    Returns:
+        tuple o None: Una tupla (start, end, novel, truncated) con las posiciones basadas en 0 de la región sustituida,
+            los residuos nuevos y si la proteína mutada termina tras ellos (codón de parada).
+            None si el formato no se reconoce o las posiciones están fuera de la secuencia.
+    """
+    match = INDEL_PATTERN.match(protein_change)
+    if not match:
+        return None
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else first
+    kind, inserted = match.group(3), match.group(4)
+    if kind == "ins":
+        start, end, novel = first, first, inserted
+    elif kind == "dup":
+        start, end, novel = last, last, sequence[first - 1:last]
+    else:
+        start, end, novel = first - 1, last, inserted
+    truncated = "*" in novel
+
+    if start < 0 or end > len(sequence):
+        return None
+    return start, end, novel.split("*")[0], truncated
+
+
+def generate_indel_peptides(sequence, protein_change, lengths=9):
+    """
+    Genera de forma perezosa los péptidos nuevos que produce una inserción o deleción sin desplazamiento del marco de lectura.
+    Se recorre residuo a residuo la región mutada (max(lengths) - 1 residuos de contexto a cada lado y los residuos
+    nuevos) con una ventana deslizante, sin construir la proteína mutada completa, y se emiten las ventanas de cada
+    longitud que contienen algún residuo nuevo o, en las deleciones, que atraviesan el punto de unión.
+    Parámetros:
+        sequence (str): La secuencia original de la proteína.
+        protein_change (str): El cambio de proteína (ver parse_indel).
+        lengths (int o list, optional): La longitud o longitudes de los péptidos a generar. El valor predeterminado es 9.
+    Retorna:
+        generator: Tuplas (peptido, longitud, posicion_mutacion), donde posicion_mutacion es la posición del primer
+            residuo nuevo dentro del péptido (basada en 0). No genera nada si la secuencia es None o el formato no se reconoce.
+    """
+    parsed = parse_indel(sequence, protein_change) if sequence is not None else None
+    if parsed is None:
+        return
+    start, end, novel, truncated = parsed
+    lengths = sorted({lengths} if isinstance(lengths, int) else set(lengths))
+    max_length = lengths[-1]
+
+    # Región mutada: contexto izquierdo, residuos nuevos y contexto derecho (si la proteína continúa)
+    left_start = max(0, start - max_length + 1)
+    left = islice(sequence, left_start, start)
+    right = iter(()) if truncated else islice(sequence, end, end + max_length - 1)
+    first_novel = start - left_start
+    last_novel = first_novel + len(novel)
+
+    window = deque(maxlen=max_length)
+    for index, residue in enumerate(chain(left, novel, right)):
+        window.append(residue)
+        if index < first_novel:
+            continue
+        for length in lengths:
+            window_start = index - length + 1
+            if 0 <= window_start < last_novel:
+                yield "".join(islice(window, len(window) - length, None)), length, max(first_novel - window_start, 0)
+
+
+def generate_indel_peptides_batch(mutations_df, lengths=9):
+    """
+    Genera los péptidos nuevos de todas las inserciones y deleciones sin desplazamiento del marco de lectura de un DataFrame.
+    Args:
+        mutations_df (pandas.DataFrame): DataFrame con las columnas "Gene", "Protein Change", "Protein_Sequence",
+            "patientId" y "sampleId".
+        lengths (int o list, optional): La longitud o longitudes de los péptidos a generar. El valor predeterminado es 9.
+    Returns:
+        pandas.DataFrame: DataFrame con las mismas columnas que generate_peptides_batch. Como estas mutaciones no tienen
+            una ventana silvestre equivalente, "peptido_wt" queda vacía.
+    """
+    columns = ["peptido", "gen", "patientId", "sampleId", "mutationId", "peptido_wt", "longitud", "posicion_mutacion"]
+    with_ids = "mutationId" in mutations_df.columns
+    mutation_ids = mutations_df["mutationId"] if with_ids else pd.Series(None, index=mutations_df.index, dtype=object)
+    rows = [
+        (peptide, gene, patient_id, sample_id, mutation_id, None, length, offset)
+        for gene, protein_change, sequence, patient_id, sample_id, mutation_id in zip(
+            mutations_df["Gene"], mutations_df["Protein Change"], mutations_df["Protein_Sequence"],
+            mutations_df["patientId"], mutations_df["sampleId"], mutation_ids)
+        if isinstance(protein_change, str) and isinstance(sequence, str)
+        for peptide, length, offset in generate_indel_peptides(sequence, protein_change, lengths)
+    ]
+    peptides_df = pd.DataFrame(rows, columns=columns)
+    return peptides_df if with_ids else peptides_df.drop(columns="mutationId")
 
 # Clasificar las predicciones en WB y SB
 def classify_binding(row, presentation_percentile_hard = 0.5, presentation_percentile_soft = 2):
@@ -182,19 +411,86 @@ def classify_binding(row, presentation_percentile_hard = 0.5, presentation_perce
     else:
         return "N/A"  # No aplica
 
+# Clasificaciones de unión posibles, en orden de fuerza
+BINDING_CLASSES = ["SB", "WB", "N/A"]
+
+# Umbrales por defecto (SB, WB) de las puntuaciones de cada predictor. En todas, un valor menor indica mayor unión
+BINDING_THRESHOLDS = {
+    "presentation_percentile": (0.5, 2),  # Percentil de presentación de MHCflurry
+    "Rank": (0.5, 2),  # %Rank de NetMHC
+    "affinity": (50, 500),  # Afinidad en nM
+    "nM": (50, 500),  # Afinidad en nM de NetMHC
+}
+
+def classify_binding_batch(predictions_df, column="presentation_percentile", thresholds=None, allele_thresholds=None, allele_column="best_allele"):
+    """
+    Clasifica en bloque la fuerza de unión de todas las predicciones, con la misma semántica que classify_binding
+    pero sin una llamada a Python por fila: "SB" si la puntuación es menor o igual que el umbral estricto, "WB" si es
+    mayor que el estricto y menor que el suave, y "N/A" en otro caso (también si la puntuación falta).
+    Sirve para cualquier predictor indicando la columna de la puntuación (por ejemplo "Rank" para NetMHC).
+    Parámetros:
+        predictions_df (pandas.DataFrame): DataFrame con la columna de la puntuación.
+        column (str, opcional): Columna de la puntuación. Por defecto es "presentation_percentile".
+        thresholds (tuple, opcional): Umbrales (estricto, suave). Por defecto son los de BINDING_THRESHOLDS para la columna.
+        allele_thresholds (pandas.DataFrame o dict, opcional): Umbrales por alelo, como DataFrame con las columnas
+            "allele", "strong" y "weak" o como diccionario {alelo: (estricto, suave)}. Los alelos que no aparecen usan thresholds.
+        allele_column (str, opcional): Columna del alelo de cada predicción. Por defecto es "best_allele".
+    Retorna:
+        pandas.Series: La clasificación de cada predicción como categórica con las categorías de BINDING_CLASSES.
+    """
+    strong, weak = thresholds if thresholds is not None else BINDING_THRESHOLDS[column]
+    values = pd.to_numeric(predictions_df[column], errors="coerce").to_numpy(dtype=float)
+    strong_cut = np.full(len(values), strong, dtype=float)
+    weak_cut = np.full(len(values), weak, dtype=float)
+
+    if allele_thresholds is not None:
+        if isinstance(allele_thresholds, dict):
+            allele_thresholds = pd.DataFrame([(allele, *cuts) for allele, cuts in allele_thresholds.items()], columns=["allele", "strong", "weak"])
+        allele_thresholds = allele_thresholds.set_index("allele")
+        alleles = predictions_df[allele_column].astype(object)
+        strong_cut = alleles.map(allele_thresholds["strong"]).fillna(strong).to_numpy(dtype=float)
+        weak_cut = alleles.map(allele_thresholds["weak"]).fillna(weak).to_numpy(dtype=float)
+
+    labels = np.select([values <= strong_cut, values < weak_cut], BINDING_CLASSES[:2], default=BINDING_CLASSES[2])
+    return pd.Series(pd.Categorical(labels, categories=BINDING_CLASSES), index=predictions_df.index, name="Binding_Classification")
+
+# Clasificaciones de unión que se consideran neoantígenos
+NEOANTIGEN_CLASSES = ["SB", "WB"]
+
+def select_neoantigens(predictions_df):
+    """
+    Selecciona las predicciones clasificadas como neoantígenos (SB o WB).
+    Al leer un CSV pandas convierte "N/A" en NaN, pero en Parquet se conserva como texto, por lo que se filtra
+    por las clases en lugar de por los valores no nulos.
+    Parámetros:
+        predictions_df (pandas.DataFrame): DataFrame con la columna 'Binding_Classification'.
+    Retorna:
+        pandas.DataFrame: Las filas SB y WB. Si la columna es categórica se eliminan las categorías sin uso.
+    """
+    neoantigens = predictions_df[predictions_df["Binding_Classification"].isin(NEOANTIGEN_CLASSES)]
+    if isinstance(neoantigens["Binding_Classification"].dtype, pd.CategoricalDtype):
+        neoantigens = neoantigens.assign(Binding_Classification=neoantigens["Binding_Classification"].cat.remove_unused_categories())
+    return neoantigens
+
 def calcularNeoantigenosPaciente(clinical_df, predictions_df):
-    # Contar el número de neoantígenos SB y WB por paciente
-    neoantigen_counts = predictions_df.groupby('patientId')['Binding_Classification'].value_counts().unstack(fill_value=0)
+    # Contar el número de predicciones de cada clasificación por paciente
+    neoantigen_counts = predictions_df.groupby('patientId', observed=True)['Binding_Classification'].value_counts().unstack(fill_value=0)
+
+    # Las columnas SB y WB existen siempre, aunque ninguna predicción tenga esa clasificación, y el resto de clasificaciones
+    # (por ejemplo N/A) se conservan a continuación
+    neoantigen_counts.columns = neoantigen_counts.columns.astype(str)
+    classes = list(dict.fromkeys(NEOANTIGEN_CLASSES + list(neoantigen_counts.columns)))
+    neoantigen_counts = neoantigen_counts.reindex(columns=classes, fill_value=0)
 
     # Renombrar las columnas para mayor claridad
-    neoantigen_counts.rename(columns={'SB': 'Neoantigen_SB_Count', 'WB': 'Neoantigen_WB_Count'}, inplace=True)
+    neoantigen_counts.columns = [f'Neoantigen_{classification}_Count' for classification in classes]
 
     # Añadir columnas para los pacientes que no tienen neoantígenos SB o WB
     clinical_df = clinical_df.merge(neoantigen_counts, left_on='Patient ID', right_index=True, how='left')
 
-    # Rellenar los valores NaN con 0 para los pacientes sin neoantígenos SB o WB
-    clinical_df['Neoantigen_SB_Count'] = clinical_df['Neoantigen_SB_Count'].fillna(0)
-    clinical_df['Neoantigen_WB_Count'] = clinical_df['Neoantigen_WB_Count'].fillna(0)
+    # Rellenar los valores NaN con 0 para los pacientes sin predicciones
+    for column in neoantigen_counts.columns:
+        clinical_df[column] = clinical_df[column].fillna(0)
 
     return clinical_df
 
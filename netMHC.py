@@ -0,0 +1,136 @@
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import mutationModifications
+import pipeline
+import storage
+
+# Description: Este script contiene la exportación de los péptidos a NetMHC y la importación de sus resultados.
+
+# Carpeta de los archivos de entrada de NetMHC y carpeta de los resultados descargados de NetMHC
+INPUT_DIR = "archivosNetMHC"
+RESULTS_DIR = "archivosGeneradosNetMHC"
+
+# Prefijo de los archivos de entrada y número máximo de péptidos por archivo que admite el servidor de NetMHC
+INPUT_PREFIX = "unique_predictions_part_"
+CHUNK_SIZE = 5000
+
+# Columnas de los resultados de NetMHC y su tipo. La columna 'Peptide' se renombra a 'peptide',
+# la misma clave que las predicciones de MHCflurry
+RESULT_DTYPES = {
+    "Pos": "int64",
+    "Peptide": str,
+    "ID": str,
+    "nM": "float64",
+    "Rank": "float64",
+    "Core": str,
+    "H_Avg_Ranks": "float64",
+    "N_binders": "int64",
+    "Alelo": str,
+}
+
+
+def _write_peptides(peptides, path):
+    """
+    Escribe una lista de péptidos en el formato de entrada de NetMHC: un péptido por línea, sin cabecera.
+    """
+    with open(path, "w") as handle:
+        handle.writelines(peptide + "\n" for peptide in peptides)
+
+
+def export_peptides(predictions_path="resultados/unique_predictions", output_dir=INPUT_DIR, chunk_size=CHUNK_SIZE):
+    """
+    Genera los archivos de entrada de NetMHC con los péptidos distintos de las predicciones.
+    La tabla se recorre por bloques leyendo solo la columna 'peptide' y cada péptido se escribe una sola vez,
+    en el orden en que aparece por primera vez. Los archivos de una ejecución anterior se eliminan antes,
+    para que no queden partes obsoletas si ahora hay menos péptidos.
+    Args:
+        predictions_path (str, opcional): Ruta de la tabla de predicciones (ver storage.read_table).
+            Por defecto es 'resultados/unique_predictions'.
+        output_dir (str, opcional): Carpeta de los archivos de entrada. Por defecto es INPUT_DIR.
+        chunk_size (int, opcional): Número máximo de péptidos por archivo. Por defecto es CHUNK_SIZE.
+    Returns:
+        list: Las rutas de los archivos generados, 'unique_predictions_part_<n>.csv' con n desde 1.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for stale_path in glob.glob(os.path.join(output_dir, INPUT_PREFIX + "*.csv")):
+        os.remove(stale_path)
+
+    seen = set()
+    pending = []
+    paths = []
+
+    def flush(peptides):
+        path = os.path.join(output_dir, f"{INPUT_PREFIX}{len(paths) + 1}.csv")
+        _write_peptides(peptides, path)
+        paths.append(path)
+
+    for chunk in storage.iter_table(predictions_path, columns=["peptide"]):
+        for peptide in pd.unique(chunk["peptide"].astype(str)):
+            if peptide in seen:
+                continue
+            seen.add(peptide)
+            pending.append(peptide)
+            if len(pending) == chunk_size:
+                flush(pending)
+                pending = []
+    if pending:
+        flush(pending)
+    return paths
+
+
+def _result_order(path):
+    """
+    Clave de ordenación de los resultados: el número de parte del nombre ('..._NetMHC_<n>.csv') y después la ruta.
+    """
+    match = re.search(r"_(\d+)\.csv$", os.path.basename(path))
+    return (int(match.group(1)) if match else float("inf"), path)
+
+
+def read_result_file(path):
+    """
+    Lee un archivo de resultados de NetMHC (separado por ';' y con BOM) y clasifica sus predicciones.
+    Args:
+        path (str): Ruta del archivo de resultados.
+    Returns:
+        pandas.DataFrame: Las predicciones con las columnas de RESULT_DTYPES, 'Peptide' renombrada a 'peptide',
+            y la columna "Binding_Classification" (SB, WB o N/A según el %Rank, con los umbrales de MHCflurry).
+    """
+    df = pd.read_csv(path, sep=";", encoding="utf-8-sig", usecols=list(RESULT_DTYPES), dtype=RESULT_DTYPES)
+    df["Binding_Classification"] = mutationModifications.classify_binding_batch(df, column="Rank")
+    return df.rename(columns={"Peptide": "peptide"})
+
+
+def import_results(results_dir=RESULTS_DIR, output_path="predicciones_netMHC", n_workers=None):
+    """
+    Une los archivos de resultados de NetMHC en una sola tabla Parquet con la clave 'peptide'.
+    Los archivos se leen en paralelo en un pool de procesos con pipeline.bounded_map, que solo mantiene en curso
+    dos archivos por proceso, y cada uno se añade a la tabla como un grupo de filas con storage.write_batches en
+    cuanto está listo, por lo que en memoria no está el conjunto completo de resultados. Los archivos sin filas
+    se omiten. La tabla se escribe en un archivo temporal y se mueve a su ruta al terminar, así que una importación
+    interrumpida no deja una tabla incompleta.
+    Args:
+        results_dir (str, opcional): Carpeta con los archivos CSV de NetMHC. Por defecto es RESULTS_DIR.
+        output_path (str, opcional): Ruta de la tabla de salida, sin extensión. Por defecto es 'predicciones_netMHC'.
+        n_workers (int, opcional): Número de procesos. Por defecto es el número de CPUs; con 1 no se crea el pool.
+    Returns:
+        str: La ruta de la tabla Parquet guardada.
+    Raises:
+        FileNotFoundError: Si la carpeta no contiene archivos de resultados.
+    """
+    paths = sorted(glob.glob(os.path.join(results_dir, "*.csv")), key=_result_order)
+    if not paths:
+        raise FileNotFoundError(f"No hay resultados de NetMHC en {results_dir}")
+
+    output_path = os.path.splitext(output_path)[0] + storage.FORMATS["parquet"]
+    n_workers = min(n_workers or os.cpu_count(), len(paths))
+    executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    try:
+        return storage.write_batches(pipeline.bounded_map(executor, read_result_file, paths), output_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+
+# Description: Este script contiene la ejecución por etapas del pipeline, con un manifiesto de hashes para reanudarlo sin repetir etapas.
+
+MANIFEST_FILE = "manifest.json"
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo, leyéndolo por bloques.
+    Args:
+        path (str): Ruta del archivo.
+        chunk_size (int, opcional): Tamaño de cada bloque en bytes. Por defecto es 1 MiB.
+    Returns:
+        str: El hash en hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+
+def bounded_map(executor, function, *iterables, max_pending=None):
+    """
+    Aplica una función en un pool de procesos como executor.map, pero con como máximo max_pending tareas enviadas
+    y sin recoger. Las tareas se envían a medida que se consumen los resultados, de modo que ni los argumentos ni
+    los resultados que terminan antes de tiempo se acumulan en memoria.
+    Args:
+        executor (concurrent.futures.Executor): El pool. Con None la función se aplica en este proceso.
+        function (callable): La función a aplicar.
+        *iterables: Los argumentos de cada llamada, como en map.
+        max_pending (int, opcional): Número máximo de tareas en curso. Por defecto son dos por proceso del pool.
+    Yields:
+        Los resultados de cada llamada, en el orden de los argumentos.
+    """
+    arguments = zip(*iterables)
+    if executor is None:
+        for args in arguments:
+            yield function(*args)
+        return
+
+    max_pending = max_pending or 2 * getattr(executor, "_max_workers", os.cpu_count())
+    pending = deque()
+    try:
+        for args in arguments:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Si se deja de consumir el generador o una tarea falla, las tareas que aún no han empezado se cancelan
+        for future in pending:
+            future.cancel()
+
+
+class Stage:
+    def __init__(self, name, run, inputs=(), outputs=(), params=None):
+        """
+        Define una etapa del pipeline.
+        Args:
+            name (str): Nombre de la etapa. Es la clave de la etapa en el manifiesto.
+            run (callable): Función sin argumentos que lee las entradas y escribe las salidas de la etapa.
+            inputs (list, opcional): Rutas de los archivos que lee la etapa.
+            outputs (list, opcional): Rutas de los archivos que escribe la etapa.
+            params (dict, opcional): Parámetros de la etapa que afectan al resultado. Deben poder serializarse en JSON.
+        """
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+    def fingerprint(self):
+        """
+        Calcula el hash de la etapa a partir del contenido de sus entradas y de sus parámetros.
+        Returns:
+            str: El hash en hexadecimal.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"stage": self.name, "params": self.params}, sort_keys=True, default=str).encode("utf-8"))
+        for path in self.inputs:
+            digest.update(path.encode("utf-8"))
+            digest.update(hash_file(path).encode("ascii"))
+        return digest.hexdigest()
+
+
+class Pipeline:
+    def __init__(self, manifest_path):
+        """
+        Crea un pipeline cuyo estado se guarda en un manifiesto JSON.
+        Args:
+            manifest_path (str): Ruta del manifiesto. Guarda, para cada etapa completada, el hash de sus entradas y parámetros.
+        """
+        self.manifest_path = manifest_path
+        self.manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as manifest_file:
+                self.manifest = json.load(manifest_file)
+
+    def is_up_to_date(self, stage, fingerprint):
+        """
+        Comprueba si una etapa ya se ejecutó con las mismas entradas y parámetros y sus salidas siguen existiendo.
+        """
+        entry = self.manifest.get(stage.name)
+        return entry is not None and entry["hash"] == fingerprint and all(os.path.exists(path) for path in stage.outputs)
+
+    def run(self, stages, force=()):
+        """
+        Ejecuta las etapas en orden, saltando las que están al día según el manifiesto.
+        Cada etapa se registra en el manifiesto solo al terminar, de modo que si el proceso se interrumpe
+        la siguiente ejecución se reanuda desde la etapa que falló.
+        Args:
+            stages (list): Lista de objetos Stage en orden de ejecución.
+            force (list, opcional): Nombres de las etapas que se ejecutan aunque estén al día.
+        Returns:
+            list: Nombres de las etapas que se han ejecutado.
+        """
+        executed = []
+        for stage in stages:
+            fingerprint = stage.fingerprint()
+            if stage.name not in force and self.is_up_to_date(stage, fingerprint):
+                print(f"Etapa '{stage.name}' al día, se omite")
+                continue
+
+            start = time.time()
+            stage.run()
+            missing = [path for path in stage.outputs if not os.path.exists(path)]
+            if missing:
+                raise FileNotFoundError(f"La etapa '{stage.name}' no ha generado sus salidas: {missing}")
+
+            self.manifest[stage.name] = {"hash": fingerprint, "outputs": stage.outputs, "duration": time.time() - start}
+            self._save()
+            executed.append(stage.name)
+        return executed
+
+    def _save(self):
+        """
+        Guarda el manifiesto de forma atómica, escribiendo un archivo temporal y renombrándolo.
+        """
+        if os.path.dirname(self.manifest_path):
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        partial_path = self.manifest_path + ".part"
+        with open(partial_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(partial_path, self.manifest_path)
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+# Description: Este script contiene una caché persistente en disco (SQLite) para las predicciones de MHCflurry.
+
+# Columnas de la predicción de MHCflurry que se guardan en la caché
+PREDICTION_COLUMNS = ["affinity", "best_allele", "processing_score", "presentation_score", "presentation_percentile"]
+
+
+class PredictionCache:
+    def __init__(self, db_path, model_version, max_entries=5000000):
+        """
+        Abre (o crea) la caché de predicciones en un archivo SQLite.
+        Args:
+            db_path (str): Ruta del archivo SQLite donde se guardan las predicciones.
+            model_version (str): Versión de los modelos de MHCflurry. Forma parte de la clave, de modo que al
+                cambiar los modelos las predicciones antiguas dejan de utilizarse.
+            max_entries (int, opcional): Número máximo de predicciones guardadas. Al superarlo se eliminan
+                las menos usadas recientemente (LRU). Por defecto es 5.000.000.
+        """
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                peptide TEXT NOT NULL,
+                allele TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                affinity REAL,
+                best_allele TEXT,
+                processing_score REAL,
+                presentation_score REAL,
+                presentation_percentile REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (peptide, allele, model_version)
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS predictions_last_access ON predictions (last_access)")
+        self.connection.commit()
+
+    def get_many(self, peptides, allele):
+        """
+        Busca en bloque las predicciones guardadas para una lista de péptidos y un alelo.
+        Args:
+            peptides (list): Lista de péptidos a buscar.
+            allele (str): El alelo HLA de la predicción.
+        Returns:
+            pandas.DataFrame: Las predicciones encontradas, con la columna "peptide" y las columnas de PREDICTION_COLUMNS.
+                Los péptidos que no están en la caché no aparecen en el resultado.
+        """
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS query_peptides (peptide TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM query_peptides")
+            self.connection.executemany("INSERT OR IGNORE INTO query_peptides VALUES (?)", ((peptide,) for peptide in peptides))
+            cached = pd.read_sql_query(
+                f"SELECT p.peptide, {', '.join('p.' + column for column in PREDICTION_COLUMNS)} "
+                "FROM predictions p JOIN query_peptides q ON p.peptide = q.peptide "
+                "WHERE p.allele = ? AND p.model_version = ?",
+                self.connection, params=(allele, self.model_version))
+
+            # Marcar los aciertos como usados recientemente para la política LRU
+            self.connection.execute(
+                "UPDATE predictions SET last_access = ? WHERE allele = ? AND model_version = ? "
+                "AND peptide IN (SELECT peptide FROM query_peptides)",
+                (time.time(), allele, self.model_version))
+            self.connection.execute("DELETE FROM query_peptides")
+        return cached
+
+    def put_many(self, predictions_df, allele):
+        """
+        Guarda en bloque las predicciones de un alelo y aplica el límite de tamaño de la caché.
+        Args:
+            predictions_df (pandas.DataFrame): Predicciones con la columna "peptide" y las columnas de PREDICTION_COLUMNS.
+            allele (str): El alelo HLA de la predicción.
+        """
+        rows = predictions_df.reindex(columns=["peptide"] + PREDICTION_COLUMNS).astype(object)
+        rows = rows.where(rows.notna(), None)
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO predictions (peptide, allele, model_version, {', '.join(PREDICTION_COLUMNS)}, last_access) "
+                f"VALUES (?, ?, ?, {', '.join('?' for _ in PREDICTION_COLUMNS)}, ?)",
+                ((row[0], allele, self.model_version, *row[1:], now) for row in rows.itertuples(index=False)))
+        self.evict()
+
+    def evict(self):
+        """
+        Elimina las predicciones usadas menos recientemente hasta que la caché no supere max_entries.
+        """
+        with self.connection:
+            total = self.connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if total > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM predictions WHERE rowid IN "
+                    "(SELECT rowid FROM predictions ORDER BY last_access LIMIT ?)",
+                    (total - self.max_entries,))
+
+    def invalidate(self, model_version=None):
+        """
+        Invalida las predicciones guardadas.
+        Args:
+            model_version (str, opcional): Versión de los modelos cuyas predicciones se eliminan.
+                Si es None se vacía la caché completa.
+        """
+        with self.connection:
+            if model_version is None:
+                self.connection.execute("DELETE FROM predictions")
+            else:
+                self.connection.execute("DELETE FROM predictions WHERE model_version = ?", (model_version,))
+
+    def purge_stale_versions(self):
+        """
+        Elimina las predicciones de versiones de los modelos distintas de la actual.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM predictions WHERE model_version != ?", (self.model_version,))
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM predictions WHERE model_version = ?", (self.model_version,)).fetchone()[0]
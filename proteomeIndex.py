@@ -0,0 +1,149 @@
+import csv
+import mmap
+import os
+import re
+from itertools import chain
+
+# Description: Este script contiene un índice local del proteoma de UniProt para resolver genes y secuencias sin llamadas HTTP.
+
+SEQUENCES_FILE = "secuencias.bin"
+INDEX_FILE = "indice.tsv"
+
+# Cabecera FASTA de UniProt, por ejemplo: >sp|P04637|P53_HUMAN Cellular tumor antigen p53 OS=Homo sapiens OX=9606 GN=TP53 PE=1 SV=4
+HEADER_PATTERN = re.compile(r"^>(sp|tr)\|([^|]+)\|")
+GENE_PATTERN = re.compile(r"\sGN=(\S+)")
+TAXONOMY_PATTERN = re.compile(r"\sOX=(\d+)")
+
+
+def build_proteome_index(dump_path, index_dir, taxonomy_id="9606"):
+    """
+    Construye el índice local del proteoma a partir de una descarga de UniProt en formato FASTA o TSV.
+    Las secuencias se escriben una detrás de otra en un único archivo binario y se guarda una tabla con el gen,
+    el identificador de UniProt, el desplazamiento y la longitud de cada secuencia. El archivo de entrada se lee
+    en streaming, sin cargar el proteoma completo en memoria.
+    Args:
+        dump_path (str): Ruta de la descarga de UniProt. Si termina en .tsv se esperan las columnas "Entry",
+            "Reviewed", "Gene Names (primary)" y "Sequence"; en otro caso se lee como FASTA.
+        index_dir (str): Directorio donde se guarda el índice.
+        taxonomy_id (str, opcional): El ID de taxonomía del organismo. Por defecto es "9606" (Homo sapiens).
+            Solo se aplica a los archivos FASTA, que incluyen el campo OX.
+    Returns:
+        int: El número de secuencias indexadas.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    entries = _read_tsv(dump_path) if dump_path.endswith(".tsv") else _read_fasta(dump_path, taxonomy_id)
+
+    count = 0
+    offset = 0
+    with open(os.path.join(index_dir, SEQUENCES_FILE), "wb") as sequences_file, \
+            open(os.path.join(index_dir, INDEX_FILE), "w", newline="") as index_file:
+        writer = csv.writer(index_file, delimiter="\t")
+        writer.writerow(["accession", "gene", "reviewed", "offset", "length"])
+        for accession, gene, reviewed, sequence in entries:
+            encoded = sequence.encode("ascii")
+            sequences_file.write(encoded)
+            writer.writerow([accession, gene, int(reviewed), offset, len(encoded)])
+            offset += len(encoded)
+            count += 1
+    return count
+
+
+def _read_fasta(path, taxonomy_id):
+    """
+    Lee un FASTA de UniProt y genera tuplas (accession, gen, revisada, secuencia).
+    """
+    def entry(header, lines):
+        match = HEADER_PATTERN.match(header)
+        taxonomy = TAXONOMY_PATTERN.search(header)
+        if match and (taxonomy_id is None or (taxonomy and taxonomy.group(1) == taxonomy_id)):
+            gene = GENE_PATTERN.search(header)
+            return match.group(2), gene.group(1) if gene else "", match.group(1) == "sp", "".join(lines)
+        return None
+
+    header, lines = None, []
+    with open(path) as fasta:
+        # La cabecera vacía final sirve para emitir la última entrada
+        for line in chain(fasta, [">"]):
+            line = line.strip()
+            if line.startswith(">"):
+                parsed = entry(header, lines) if header is not None else None
+                if parsed:
+                    yield parsed
+                header, lines = line, []
+            elif line:
+                lines.append(line)
+
+
+def _read_tsv(path):
+    """
+    Lee una descarga TSV de UniProt y genera tuplas (accession, gen, revisada, secuencia).
+    """
+    with open(path, newline="") as tsv:
+        for row in csv.DictReader(tsv, delimiter="\t"):
+            genes = (row.get("Gene Names (primary)") or "").split(";")
+            yield row["Entry"], genes[0].strip(), row.get("Reviewed", "reviewed") == "reviewed", row["Sequence"]
+
+
+class ProteomeIndex:
+    def __init__(self, index_dir):
+        """
+        Abre un índice del proteoma construido con build_proteome_index. Las secuencias se leen de un archivo
+        mapeado en memoria, por lo que solo se cargan las páginas de las proteínas consultadas.
+        Args:
+            index_dir (str): Directorio del índice.
+        """
+        self.gene_to_accession = {}
+        self.locations = {}
+        reviewed_genes = set()
+        with open(os.path.join(index_dir, INDEX_FILE), newline="") as index_file:
+            for row in csv.DictReader(index_file, delimiter="\t"):
+                accession, gene, reviewed = row["accession"], row["gene"], row["reviewed"] == "1"
+                self.locations[accession] = (int(row["offset"]), int(row["length"]))
+                # Igual que la búsqueda de UniProt, se prefiere la primera entrada revisada (Swiss-Prot) del gen
+                if gene and (gene not in self.gene_to_accession or (reviewed and gene not in reviewed_genes)):
+                    self.gene_to_accession[gene] = accession
+                    if reviewed:
+                        reviewed_genes.add(gene)
+
+        self._file = open(os.path.join(index_dir, SEQUENCES_FILE), "rb")
+        self._sequences = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self._file.name) else b""
+
+    def get_uniprot_id(self, gene_name):
+        """
+        Recupera el ID de UniProt de un gen.
+        Args:
+            gene_name (str): El símbolo del gen.
+        Returns:
+            str o None: El ID de UniProt, o None si el gen no está en el índice.
+        """
+        return self.gene_to_accession.get(gene_name)
+
+    def get_protein_sequence(self, uniprot_id):
+        """
+        Recupera la secuencia de una proteína.
+        Args:
+            uniprot_id (str): El ID de UniProt de la proteína.
+        Returns:
+            str o None: La secuencia proteica, o None si la proteína no está en el índice.
+        """
+        location = self.locations.get(uniprot_id)
+        if location is None:
+            return None
+        offset, length = location
+        return self._sequences[offset:offset + length].decode("ascii")
+
+    def close(self):
+        """
+        Cierra el archivo de secuencias.
+        """
+        if isinstance(self._sequences, mmap.mmap):
+            self._sequences.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Uso: python proteomeIndex.py <descarga de UniProt (.fasta o .tsv)> <directorio del índice>
+    total = build_proteome_index(sys.argv[1], sys.argv[2])
+    print(f"Índice del proteoma construido con {total} secuencias en {sys.argv[2]}")
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import pipeline
+
+# Description: Este script contiene el renderizado en paralelo de las figuras, omitiendo las que no han cambiado desde la última vez.
+
+# Manifiesto con el hash de los datos de cada figura renderizada
+RENDER_MANIFEST = "cache/render_manifest.json"
+
+
+def hash_data(data):
+    """
+    Calcula el hash SHA-256 del contenido de un DataFrame o una Series, incluidos los nombres de las columnas y los tipos.
+    Args:
+        data (pandas.DataFrame o pandas.Series): Los datos de una figura.
+    Returns:
+        str: El hash en hexadecimal.
+    """
+    digest = hashlib.sha256()
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in data.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _local_modules(module):
+    """
+    Devuelve el módulo y, de forma recursiva, los módulos del proyecto (los que están en su misma carpeta) que usa,
+    ya sea importados (import statisticalTests) o a través de sus funciones (from statisticalTests import ...).
+    """
+    directory = os.path.dirname(os.path.abspath(module.__file__))
+    found, pending = {}, [module]
+    while pending:
+        current = pending.pop()
+        if current.__name__ in found:
+            continue
+        found[current.__name__] = current
+        for value in vars(current).values():
+            name = getattr(value, "__module__", None)
+            dependency = value if isinstance(value, types.ModuleType) else sys.modules.get(name) if isinstance(name, str) else None
+            path = getattr(dependency, "__file__", None)
+            if path and os.path.dirname(os.path.abspath(path)) == directory:
+                pending.append(dependency)
+    return [found[name] for name in sorted(found)]
+
+
+def hash_code(function):
+    """
+    Calcula el hash SHA-256 del código de una función de dibujo: el código fuente de su módulo completo y de los módulos
+    del proyecto de los que depende, de modo que cambiar una función auxiliar (por ejemplo, de statisticalTests) también
+    cambia el hash. Si la función no tiene un archivo de módulo, se usan su bytecode y sus constantes.
+    Args:
+        function (callable): La función de dibujo de una figura.
+    Returns:
+        str: El hash en hexadecimal.
+    """
+    digest = hashlib.sha256()
+    module = sys.modules.get(function.__module__)
+    if getattr(module, "__file__", None):
+        for dependency in _local_modules(module):
+            digest.update(dependency.__name__.encode("utf-8"))
+            digest.update(pipeline.hash_file(dependency.__file__).encode("ascii"))
+    else:
+        digest.update(function.__code__.co_code + repr(function.__code__.co_consts).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FigureTask:
+    def __init__(self, name, plot, data=None, params=None, inputs=(), outputs=()):
+        """
+        Define una figura a renderizar.
+        Args:
+            name (str): Nombre de la figura. Es la clave de la figura en el manifiesto.
+            plot (callable): Función de getGraphics (u otra función de módulo) que genera y guarda la figura.
+                Se llama como plot(data, **params), o plot(**params) si la figura no tiene datos.
+            data (pandas.DataFrame o pandas.Series, opcional): Datos de la figura. Conviene pasar solo las columnas
+                que usa, porque se envían al proceso que la renderiza y forman parte de su hash.
+            params (dict, opcional): Argumentos de plot. Deben poder serializarse en JSON.
+            inputs (list, opcional): Rutas de los archivos que lee plot por su cuenta.
+            outputs (list, opcional): Rutas de las imágenes que guarda plot.
+        """
+        self.name = name
+        self.plot = plot
+        self.data = data
+        self.params = params or {}
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def fingerprint(self):
+        """
+        Calcula el hash de la figura a partir de la función y su código, los parámetros, los datos y los archivos de entrada.
+        Returns:
+            str: El hash en hexadecimal.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"figure": self.name, "plot": f"{self.plot.__module__}.{self.plot.__qualname__}",
+                                  "code": hash_code(self.plot), "params": self.params}, sort_keys=True, default=str).encode("utf-8"))
+        if self.data is not None:
+            digest.update(hash_data(self.data).encode("ascii"))
+        for path in self.inputs:
+            digest.update(path.encode("utf-8"))
+            digest.update(pipeline.hash_file(path).encode("ascii"))
+        return digest.hexdigest()
+
+
+def _init_worker():
+    """
+    Inicializa un proceso del pool con el backend Agg de matplotlib, que renderiza sin pantalla.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(plot, data, params):
+    """
+    Renderiza una figura y cierra todas las figuras abiertas, para que el proceso no acumule memoria entre tareas.
+    Returns:
+        float: La duración del renderizado en segundos.
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.time()
+    try:
+        if data is None:
+            plot(**params)
+        else:
+            plot(data, **params)
+    finally:
+        plt.close("all")
+    return time.time() - start
+
+
+class FigureRenderer(pipeline.Pipeline):
+    def __init__(self, manifest_path=RENDER_MANIFEST):
+        """
+        Crea un renderizador de figuras cuyo estado se guarda en un manifiesto JSON, como el de pipeline.Pipeline.
+        Args:
+            manifest_path (str, opcional): Ruta del manifiesto. Por defecto es RENDER_MANIFEST.
+        """
+        super().__init__(manifest_path)
+
+    def run(self, tasks, force=(), n_workers=None):
+        """
+        Renderiza en un pool de procesos las figuras que han cambiado, omitiendo las que tienen el mismo hash
+        que en el último renderizado y cuyas imágenes siguen existiendo.
+        Cada figura se registra en el manifiesto al terminar, de modo que si una falla las demás no se repiten.
+        Args:
+            tasks (list): Lista de objetos FigureTask.
+            force (list, opcional): Nombres de las figuras que se renderizan aunque estén al día.
+            n_workers (int, opcional): Número de procesos. Por defecto es el número de CPUs; con 1 las figuras
+                se renderizan en este proceso, con el backend configurado.
+        Returns:
+            list: Nombres de las figuras renderizadas.
+        """
+        pending = []
+        for task in tasks:
+            fingerprint = task.fingerprint()
+            if task.name not in force and self.is_up_to_date(task, fingerprint):
+                continue
+            pending.append((task, fingerprint))
+        print(f"Figuras a renderizar: {len(pending)} de {len(tasks)}")
+        if not pending:
+            return []
+
+        for directory in {os.path.dirname(path) for task, _ in pending for path in task.outputs}:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        n_workers = min(n_workers or os.cpu_count(), len(pending))
+        executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) if n_workers > 1 else None
+        try:
+            if executor is None:
+                durations = (_render(task.plot, task.data, task.params) for task, _ in pending)
+            else:
+                durations = executor.map(_render, *zip(*[(task.plot, task.data, task.params) for task, _ in pending]))
+
+            rendered = []
+            for (task, fingerprint), duration in zip(pending, durations):
+                missing = [path for path in task.outputs if not os.path.exists(path)]
+                if missing:
+                    raise FileNotFoundError(f"La figura '{task.name}' no ha generado sus imágenes: {missing}")
+                self.manifest[task.name] = {"hash": fingerprint, "outputs": task.outputs, "duration": duration}
+                self._save()
+                rendered.append(task.name)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return rendered
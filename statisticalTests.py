@@ -0,0 +1,210 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import storage
+
+# Description: Este script contiene las pruebas estadísticas del análisis, calculadas en bloque y guardadas en una sola tabla que leen los gráficos.
+
+# Tabla con los resultados de todas las pruebas
+STATISTICS_TABLE = "resultados/estadisticas"
+
+# Columnas de los conteos de neoantígenos y su etiqueta en los boxplots
+NEOANTIGEN_TYPES = {"Neoantigen_SB_Count": "SB", "Neoantigen_WB_Count": "WB"}
+
+# Columnas de la tabla de resultados. En las pruebas de una sola variable las columnas de grupos quedan vacías
+STATISTICS_COLUMNS = ["test", "variable", "attribute", "group_1", "hue_1", "group_2", "hue_2",
+                      "statistic", "pvalue", "dof", "correction", "pvalue_adjusted"]
+
+# Correcciones por comparaciones múltiples disponibles
+CORRECTIONS = ["bonferroni", "holm", "fdr_bh"]
+
+
+def adjust_pvalues(pvalues, method="bonferroni"):
+    """
+    Corrige un conjunto de p-valores por comparaciones múltiples.
+    Args:
+        pvalues (array-like): Los p-valores de una familia de comparaciones.
+        method (str, opcional): "bonferroni", "holm" (Holm-Bonferroni) o "fdr_bh" (Benjamini-Hochberg).
+            El valor predeterminado es "bonferroni", la corrección que aplicaba statannot.
+    Returns:
+        numpy.ndarray: Los p-valores corregidos, en el mismo orden y como máximo 1.
+    Raises:
+        ValueError: Si el método no está en CORRECTIONS.
+    """
+    pvalues = np.asarray(pvalues, dtype=float)
+    n = len(pvalues)
+    if method == "bonferroni":
+        return np.minimum(pvalues * n, 1.0)
+    if method not in CORRECTIONS:
+        raise ValueError(f"Corrección desconocida: {method}. Opciones: {CORRECTIONS}")
+
+    order = np.argsort(pvalues)
+    ranked = pvalues[order]
+    if method == "holm":
+        adjusted = np.maximum.accumulate(ranked * (n - np.arange(n)))
+    else:
+        adjusted = np.minimum.accumulate((ranked * n / np.arange(1, n + 1))[::-1])[::-1]
+    result = np.empty(n)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def neoantigen_long_format(clinical_df, atributo):
+    """
+    Convierte los conteos de neoantígenos SB y WB a formato largo (una fila por paciente y tipo), como los boxplots.
+    Args:
+        clinical_df (pandas.DataFrame): Datos clínicos con el atributo y las columnas de NEOANTIGEN_TYPES.
+        atributo (str): El atributo por el que se agrupan los conteos.
+    Returns:
+        pandas.DataFrame: DataFrame con las columnas atributo, "Neoantigen_Type" (SB o WB) y "Count".
+    """
+    long_df = pd.melt(clinical_df, id_vars=[atributo], value_vars=list(NEOANTIGEN_TYPES),
+                      var_name='Neoantigen_Type', value_name='Count')
+    long_df['Neoantigen_Type'] = long_df['Neoantigen_Type'].replace(NEOANTIGEN_TYPES)
+    return long_df
+
+
+def default_box_pairs(long_df, atributo):
+    """
+    Genera los pares de cajas que se comparan por defecto: cada par de categorías del atributo, dentro de cada tipo de neoantígeno.
+    """
+    categorias = long_df[atributo].dropna().unique()
+    return [((valor1, type_), (valor2, type_)) for valor1, valor2 in combinations(categorias, 2)
+            for type_ in long_df['Neoantigen_Type'].unique()]
+
+
+def normality_tests(numeric_df):
+    """
+    Ejecuta las pruebas de Shapiro-Wilk y de Kolmogorov-Smirnov (frente a la normal estándar) de todas las columnas
+    a la vez, con una sola llamada vectorizada de cada prueba.
+    Args:
+        numeric_df (pandas.DataFrame): Variables numéricas sin valores nulos.
+    Returns:
+        pandas.DataFrame: Una fila por prueba y variable, con las columnas de STATISTICS_COLUMNS.
+    """
+    values = numeric_df.to_numpy(dtype=float)
+    shapiro = stats.shapiro(values, axis=0)
+    ks = stats.kstest(values, 'norm', axis=0)
+    rows = pd.concat([
+        pd.DataFrame({"test": "Shapiro-Wilk", "variable": numeric_df.columns, "statistic": shapiro.statistic, "pvalue": shapiro.pvalue}),
+        pd.DataFrame({"test": "Kolmogorov-Smirnov", "variable": numeric_df.columns, "statistic": ks.statistic, "pvalue": ks.pvalue}),
+    ], ignore_index=True)
+    return rows.reindex(columns=STATISTICS_COLUMNS)
+
+
+def mann_whitney_tests(clinical_df, attributes, correction="bonferroni"):
+    """
+    Ejecuta la prueba de Mann-Whitney bilateral de todos los pares de cajas de los boxplots de neoantígenos por atributo.
+    Las muestras de todos los pares de todos los atributos se apilan en dos matrices rellenas con NaN y se comparan
+    en una sola llamada de scipy. Los p-valores se corrigen dentro de cada atributo, que es la familia de
+    comparaciones de cada gráfico.
+    Args:
+        clinical_df (pandas.DataFrame): Datos clínicos con los atributos y las columnas de NEOANTIGEN_TYPES.
+        attributes (dict): Para cada atributo, su lista de pares de cajas ((valor1, tipo1), (valor2, tipo2)),
+            o None para comparar todos los pares de categorías dentro de cada tipo (ver default_box_pairs).
+        correction (str, opcional): Corrección por comparaciones múltiples (ver adjust_pvalues). Por defecto es "bonferroni".
+    Returns:
+        pandas.DataFrame: Una fila por par de cajas, con las columnas de STATISTICS_COLUMNS.
+    """
+    rows = []
+    samples = []
+    for atributo, box_pairs in attributes.items():
+        long_df = neoantigen_long_format(clinical_df, atributo).dropna(subset=['Count'])
+        boxes = {key: group['Count'].to_numpy(dtype=float) for key, group in long_df.groupby([atributo, 'Neoantigen_Type'], observed=True)}
+        for (group_1, hue_1), (group_2, hue_2) in (default_box_pairs(long_df, atributo) if box_pairs is None else box_pairs):
+            rows.append({"attribute": atributo, "group_1": group_1, "hue_1": hue_1, "group_2": group_2, "hue_2": hue_2})
+            samples.append((boxes.get((group_1, hue_1), np.array([])), boxes.get((group_2, hue_2), np.array([]))))
+
+    tests = pd.DataFrame(rows, columns=["attribute", "group_1", "hue_1", "group_2", "hue_2"])
+    if samples:
+        width = max(max(len(x), len(y)) for x, y in samples)
+        x = np.full((len(samples), width), np.nan)
+        y = np.full((len(samples), width), np.nan)
+        for i, (sample_x, sample_y) in enumerate(samples):
+            x[i, :len(sample_x)] = sample_x
+            y[i, :len(sample_y)] = sample_y
+        result = stats.mannwhitneyu(x, y, alternative='two-sided', axis=1, nan_policy='omit')
+        tests["statistic"], tests["pvalue"] = result.statistic, result.pvalue
+
+    tests["test"], tests["variable"], tests["correction"] = "Mann-Whitney", "Count", correction
+    tests["pvalue_adjusted"] = tests.groupby("attribute", sort=False)["pvalue"].transform(lambda pvalues: adjust_pvalues(pvalues, correction))
+    return tests.reindex(columns=STATISTICS_COLUMNS)
+
+
+def chi_square_test(contingency_table, variable, attribute):
+    """
+    Ejecuta la prueba de chi-cuadrado de independencia de una tabla de contingencia.
+    Args:
+        contingency_table (pandas.DataFrame): La tabla de contingencia (filas y columnas son las dos variables).
+        variable (str): Nombre de la variable de las filas.
+        attribute (str): Nombre de la variable de las columnas.
+    Returns:
+        pandas.DataFrame: Una fila con las columnas de STATISTICS_COLUMNS.
+    """
+    chi2, p, dof, _ = stats.chi2_contingency(contingency_table)
+    return pd.DataFrame([{"test": "Chi-cuadrado", "variable": variable, "attribute": attribute,
+                          "statistic": chi2, "pvalue": p, "dof": dof}], columns=STATISTICS_COLUMNS)
+
+
+def compute_statistics(numeric_df=None, clinical_df=None, attributes=None, contingency_tables=None, correction="bonferroni"):
+    """
+    Calcula todas las pruebas estadísticas del análisis y las une en una sola tabla.
+    Args:
+        numeric_df (pandas.DataFrame, opcional): Variables numéricas sin nulos para las pruebas de normalidad.
+        clinical_df (pandas.DataFrame, opcional): Datos clínicos para las pruebas de Mann-Whitney.
+        attributes (dict, opcional): Atributos y pares de cajas de las pruebas de Mann-Whitney (ver mann_whitney_tests).
+        contingency_tables (dict, opcional): Para cada par (variable de filas, variable de columnas), su tabla de contingencia.
+        correction (str, opcional): Corrección por comparaciones múltiples de Mann-Whitney. Por defecto es "bonferroni".
+    Returns:
+        pandas.DataFrame: Una fila por prueba, con las columnas de STATISTICS_COLUMNS.
+    """
+    parts = []
+    if numeric_df is not None:
+        parts.append(normality_tests(numeric_df))
+    if clinical_df is not None and attributes:
+        parts.append(mann_whitney_tests(clinical_df, attributes, correction=correction))
+    for (variable, attribute), contingency_table in (contingency_tables or {}).items():
+        parts.append(chi_square_test(contingency_table, variable, attribute))
+    if not parts:
+        return pd.DataFrame(columns=STATISTICS_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def save_statistics(statistics_df, path=STATISTICS_TABLE):
+    """
+    Guarda la tabla de pruebas estadísticas. Los valores de los grupos se guardan como texto, porque cada atributo tiene su tipo.
+    Returns:
+        str: La ruta de la tabla guardada.
+    """
+    statistics_df = statistics_df.copy()
+    for column in ["group_1", "hue_1", "group_2", "hue_2"]:
+        statistics_df[column] = statistics_df[column].map(lambda value: value if pd.isna(value) else str(value))
+    return storage.write_table(statistics_df, path)
+
+
+def load_statistics(path=STATISTICS_TABLE):
+    """
+    Lee la tabla de pruebas estadísticas guardada con save_statistics.
+    """
+    return storage.read_table(path)
+
+
+def box_pair_pvalues(statistics_df, atributo, box_pairs):
+    """
+    Busca en la tabla los p-valores corregidos de Mann-Whitney de los pares de cajas de un atributo.
+    Args:
+        statistics_df (pandas.DataFrame): La tabla de pruebas estadísticas.
+        atributo (str): El atributo del gráfico.
+        box_pairs (list): Pares de cajas ((valor1, tipo1), (valor2, tipo2)).
+    Returns:
+        list: El p-valor corregido de cada par, en el orden de box_pairs.
+    Raises:
+        KeyError: Si algún par no está en la tabla.
+    """
+    tests = statistics_df[(statistics_df["test"] == "Mann-Whitney") & (statistics_df["attribute"] == atributo)]
+    pvalues = {((str(row.group_1), str(row.hue_1)), (str(row.group_2), str(row.hue_2))): row.pvalue_adjusted
+               for row in tests.itertuples(index=False)}
+    return [pvalues[((str(group_1), str(hue_1)), (str(group_2), str(hue_2)))] for (group_1, hue_1), (group_2, hue_2) in box_pairs]
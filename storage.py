@@ -0,0 +1,244 @@
+import os
+
+import pandas as pd
+
+# Description: Este script contiene la capa de almacenamiento de las tablas intermedias del pipeline (Parquet, Feather o CSV).
+
+# Formato por defecto de las tablas intermedias
+DEFAULT_FORMAT = "parquet"
+
+# Extensiones admitidas, en orden de preferencia cuando existe más de una versión de la misma tabla
+FORMATS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+
+# Columnas con pocos valores distintos que se guardan y se leen como categóricas
+CATEGORICAL_COLUMNS = ["gen", "patientId", "Binding_Classification"]
+
+
+def _split_format(path):
+    """
+    Separa la ruta de una tabla en la ruta sin extensión y el formato indicado por su extensión (o None).
+    """
+    root, extension = os.path.splitext(path)
+    for table_format, format_extension in FORMATS.items():
+        if extension == format_extension:
+            return root, table_format
+    return path, None
+
+
+def resolve_table(path):
+    """
+    Busca el archivo de una tabla. Si la ruta no tiene extensión se prueban las de FORMATS en orden, de modo que
+    la versión tipada (Parquet o Feather) tiene prioridad sobre un CSV exportado o heredado.
+    Args:
+        path (str): Ruta de la tabla, con o sin extensión.
+    Returns:
+        str o None: La ruta del archivo encontrado, o None si la tabla no existe.
+    """
+    root, table_format = _split_format(path)
+    if table_format is not None:
+        return path if os.path.exists(path) else None
+    return next((root + extension for extension in FORMATS.values() if os.path.exists(root + extension)), None)
+
+
+def write_table(df, path, table_format=None, categorical_columns=CATEGORICAL_COLUMNS):
+    """
+    Guarda una tabla con tipos y compresión. Las columnas categóricas se guardan como diccionario,
+    por lo que ocupan una fracción del espacio y se recuperan como categóricas al leerlas.
+    Args:
+        df (pandas.DataFrame): La tabla a guardar.
+        path (str): Ruta de la tabla. Si no tiene extensión se añade la del formato.
+        table_format (str, opcional): "parquet", "feather" o "csv". Por defecto es el de la extensión de path o DEFAULT_FORMAT.
+        categorical_columns (list, opcional): Columnas que se convierten a categóricas. Por defecto es CATEGORICAL_COLUMNS.
+    Returns:
+        str: La ruta del archivo guardado.
+    """
+    root, path_format = _split_format(path)
+    table_format = table_format or path_format or DEFAULT_FORMAT
+    path = root + FORMATS[table_format]
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if table_format == "csv":
+        df.to_csv(path, index=False)
+        return path
+
+    df = df.reset_index(drop=True)
+    df = df.astype({column: "category" for column in categorical_columns if column in df.columns})
+    if table_format == "parquet":
+        df.to_parquet(path, index=False, compression="zstd")
+    else:
+        df.to_feather(path, compression="zstd")
+    return path
+
+
+def _arrow_table(df):
+    """
+    Convierte un bloque de una tabla a Arrow para write_batches. Las columnas categóricas se guardan con su tipo
+    original, porque cada bloque tendría un diccionario distinto, y las columnas que solo tienen nulos, como texto.
+    """
+    import pyarrow as pa
+
+    df = df.astype({column: df[column].cat.categories.dtype for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.cast(pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                                metadata=table.schema.metadata))
+
+
+def write_batches(batches, path):
+    """
+    Guarda en Parquet una tabla que llega por bloques, añadiendo cada bloque como un grupo de filas sin unirlos
+    en memoria. El esquema es el del primer bloque con filas; los bloques vacíos se omiten, salvo que lo estén todos.
+    La tabla se escribe en un archivo temporal y se mueve a su ruta al terminar, así que una escritura interrumpida
+    no deja una tabla incompleta. Las columnas categóricas se leen como tales con read_table.
+    Args:
+        batches (iterable): Los bloques de la tabla, como DataFrames con las mismas columnas.
+        path (str): Ruta de la tabla, con o sin extensión.
+    Returns:
+        str: La ruta del archivo guardado.
+    Raises:
+        ValueError: Si no hay ningún bloque.
+    """
+    import pyarrow.parquet as pq
+
+    path = _split_format(path)[0] + FORMATS["parquet"]
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + ".tmp"
+    writer = None
+    empty = None
+    try:
+        for df in batches:
+            if df.empty:
+                empty = df if empty is None else empty
+                continue
+            table = _arrow_table(df)
+            if writer is None:
+                writer = pq.ParquetWriter(temporary_path, table.schema, compression="zstd")
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:
+            if empty is None:
+                raise ValueError(f"No hay bloques que guardar en {path}")
+            table = _arrow_table(empty)
+            writer = pq.ParquetWriter(temporary_path, table.schema, compression="zstd")
+            writer.write_table(table)
+        writer.close()
+        writer = None
+        os.replace(temporary_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+            os.remove(temporary_path)
+    return path
+
+
+def table_columns(path):
+    """
+    Devuelve los nombres de las columnas de una tabla sin leer sus datos (el esquema en Parquet y Feather,
+    la cabecera en CSV).
+    Args:
+        path (str): Ruta de la tabla, con o sin extensión.
+    Returns:
+        list: Los nombres de las columnas.
+    Raises:
+        FileNotFoundError: Si la tabla no existe en ningún formato.
+    """
+    resolved = resolve_table(path)
+    if resolved is None:
+        raise FileNotFoundError(f"No existe la tabla {path}")
+
+    table_format = _split_format(resolved)[1]
+    if table_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(resolved).names
+    if table_format == "feather":
+        import pyarrow.feather as feather
+        return feather.read_table(resolved, memory_map=True).schema.names
+    return pd.read_csv(resolved, nrows=0).columns.tolist()
+
+
+def read_table(path, columns=None, categorical=True, categorical_columns=CATEGORICAL_COLUMNS, **csv_options):
+    """
+    Lee una tabla guardada con write_table o un CSV heredado.
+    Args:
+        path (str): Ruta de la tabla, con o sin extensión. Sin extensión se usa resolve_table.
+        columns (list, opcional): Columnas a leer. En Parquet y Feather solo se leen del disco esas columnas.
+            Por defecto se leen todas.
+        categorical (bool, opcional): Si es True las columnas de categorical_columns se devuelven como categóricas;
+            si es False, con su tipo original. Por defecto es True.
+        categorical_columns (list, opcional): Columnas categóricas. Por defecto es CATEGORICAL_COLUMNS.
+        **csv_options: Opciones adicionales para pandas.read_csv (por ejemplo sep).
+    Returns:
+        pandas.DataFrame: La tabla leída.
+    Raises:
+        FileNotFoundError: Si la tabla no existe en ningún formato.
+    """
+    resolved = resolve_table(path)
+    if resolved is None:
+        raise FileNotFoundError(f"No existe la tabla {path}")
+
+    table_format = _split_format(resolved)[1]
+    if table_format == "parquet":
+        df = pd.read_parquet(resolved, columns=columns)
+    elif table_format == "feather":
+        df = pd.read_feather(resolved, columns=columns)
+    else:
+        df = pd.read_csv(resolved, usecols=columns, **csv_options)
+        if columns is not None:
+            df = df[columns]
+
+    for column in categorical_columns:
+        if column not in df.columns:
+            continue
+        if categorical and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+        elif not categorical and isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+    return df
+
+
+def iter_table(path, columns=None, batch_size=100000, **csv_options):
+    """
+    Recorre una tabla por bloques de filas sin cargarla entera en memoria. En Parquet se leen del disco solo los
+    grupos de filas y las columnas pedidas; en CSV se usa la lectura por bloques de pandas.
+    Args:
+        path (str): Ruta de la tabla, con o sin extensión.
+        columns (list, opcional): Columnas a leer. Por defecto se leen todas.
+        batch_size (int, opcional): Número máximo de filas de cada bloque. Por defecto es 100000.
+        **csv_options: Opciones adicionales para pandas.read_csv (por ejemplo sep).
+    Yields:
+        pandas.DataFrame: Los bloques de la tabla, en orden y con los tipos con que se guardaron.
+    Raises:
+        FileNotFoundError: Si la tabla no existe en ningún formato.
+    """
+    resolved = resolve_table(path)
+    if resolved is None:
+        raise FileNotFoundError(f"No existe la tabla {path}")
+
+    table_format = _split_format(resolved)[1]
+    if table_format == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(resolved).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+    elif table_format == "feather":
+        df = pd.read_feather(resolved, columns=columns)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+    else:
+        for chunk in pd.read_csv(resolved, usecols=columns, chunksize=batch_size, **csv_options):
+            yield chunk if columns is None else chunk[columns]
+
+
+def export_csv(path, csv_path=None, **csv_options):
+    """
+    Exporta una tabla a CSV para los informes finales.
+    Args:
+        path (str): Ruta de la tabla, con o sin extensión.
+        csv_path (str, opcional): Ruta del CSV. Por defecto es la de la tabla con la extensión .csv.
+        **csv_options: Opciones adicionales para DataFrame.to_csv.
+    Returns:
+        str: La ruta del CSV guardado.
+    """
+    root = _split_format(path)[0]
+    csv_path = csv_path or root + FORMATS["csv"]
+    read_table(path, categorical=False).to_csv(csv_path, index=False, **csv_options)
+    return csv_path
@@ -0,0 +1,135 @@
+import unittest
+import os
+import tempfile
+import aggregation
+import pandas as pd
+
+
+class aggregationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.predictions_df = pd.DataFrame({
+            "peptide": ["AAAAAAAAA", "CCCCCCCCC", "AAAAAAAAA", "DDDDDDDDD", "AAAAAAAAA", "EEEEEEEEE"],
+            "gen": ["G2", "G2", "G2", "G1", "G2", "G1"],
+            "patientId": ["P1", "P1", "P2", "P3", "P1", "P3"],
+            "Binding_Classification": ["SB", "WB", "WB", "SB", "SB", "N/A"],
+        })
+        self.index = aggregation.NeoantigenIndex(self.predictions_df)
+
+    def test_incidence_matrices_count_occurrences(self):
+        self.assertEqual(self.index.peptide_patient.toarray().tolist(), [[2, 1, 0], [1, 0, 0], [0, 0, 1]])
+        self.assertEqual(self.index.gene_peptide.getnnz(axis=1).tolist(), [1, 2])
+
+    def test_repeated_matches_duplicated(self):
+        neoantigens = self.predictions_df[self.predictions_df["Binding_Classification"] != "N/A"].reset_index(drop=True)
+        for column in ["peptide", "gen"]:
+            expected = neoantigens[neoantigens.duplicated(subset=[column], keep=False)]
+            pd.testing.assert_frame_equal(self.index.repeated(column), expected)
+
+    def test_shared_lists_distinct_members_in_order_of_appearance(self):
+        shared = self.index.shared("peptide", "patientId")
+        self.assertEqual(shared["peptide"].tolist(), ["AAAAAAAAA"])
+        self.assertEqual(shared["patientId"].map(list).tolist(), [["P1", "P2"]])
+
+        shared = self.index.shared("gen", "peptide")
+        self.assertEqual(shared["gen"].tolist(), ["G2"])
+        self.assertEqual(shared["peptide"].map(list).tolist(), [["AAAAAAAAA", "CCCCCCCCC"]])
+
+    def test_write_reports_reads_predictions_once_and_writes_every_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            predictions_path = os.path.join(directory, "unique_predictions.csv")
+            self.predictions_df.to_csv(predictions_path, index=False)
+            reports = aggregation.write_reports(predictions_path, output_dir=directory)
+            for filename in reports:
+                self.assertTrue(os.path.exists(os.path.join(directory, filename)))
+            self.assertEqual(len(reports), 5)
+
+    def test_cohort_incidence_queries(self):
+        incidence = aggregation.CohortIncidence.from_predictions(self.predictions_df)
+        self.assertEqual(incidence.recurrent(2)["peptide"].tolist(), ["AAAAAAAAA"])
+        self.assertEqual(incidence.recurrent(1, column="gen").values.tolist(), [["G2", 2], ["G1", 1]])
+        self.assertEqual(incidence.top_public(2).values.tolist(), [["AAAAAAAAA", 2], ["CCCCCCCCC", 1]])
+        self.assertEqual(incidence.patients_with("AAAAAAAAA"), ["P1", "P2"])
+        self.assertEqual(incidence.jaccard("P1", "P2"), 0.5)
+        self.assertEqual(incidence.jaccard("P1", "P3"), 0.0)
+
+        overlap = incidence.overlap()
+        self.assertEqual(overlap[["patient_a", "patient_b", "shared"]].values.tolist(), [["P1", "P2", 1]])
+        self.assertEqual(overlap["jaccard"].tolist(), [0.5])
+        self.assertEqual(len(incidence.overlap(min_jaccard=0.6)), 0)
+        self.assertEqual(incidence.overlap(patients=["P2", "P1"])["shared"].tolist(), [1])
+        with self.assertRaises(KeyError):
+            incidence.overlap(patients=["P1", "P9"])
+
+    def test_cohort_incidence_save_and_load(self):
+        incidence = aggregation.CohortIncidence.from_predictions(self.predictions_df)
+        with tempfile.TemporaryDirectory() as directory:
+            incidence.save(directory)
+            loaded = aggregation.CohortIncidence.load(directory)
+        self.assertEqual(loaded.patients.tolist(), ["P1", "P2", "P3"])
+        self.assertEqual((loaded.matrices["peptide"] != incidence.matrices["peptide"]).nnz, 0)
+        pd.testing.assert_frame_equal(loaded.top_public(3, column="gen"), incidence.top_public(3, column="gen"))
+
+
+    def test_patient_counts_update_replaces_only_the_new_samples(self):
+        predictions_df = self.predictions_df.assign(sampleId=["S1", "S1", "S2", "S3", "S4", "S3"],
+                                                    allele=["A", "A", "B", "A", "B", "A"])
+        counts = aggregation.PatientCounts()
+        self.assertEqual(counts.update(predictions_df), ["P1", "P2", "P3"])
+        wide = counts.by_patient()
+        self.assertEqual(wide["Neoantigen_SB_Count"].tolist(), [2, 0, 1])
+        self.assertEqual(wide["Neoantigen_WB_Count"].tolist(), [1, 1, 0])
+        self.assertEqual(wide["Neoantigen_N/A_Count"].tolist(), [0, 0, 1])
+        self.assertEqual(wide["Neoantigen_Total_Count"].tolist(), [3, 1, 2])
+        self.assertEqual(wide["Neoantigen_Length_9_Count"].tolist(), [3, 1, 1])
+        self.assertEqual(wide["Neoantigen_Allele_B_Count"].tolist(), [1, 1, 0])
+
+        # Se vuelve a procesar la muestra S4 de P1 y se añade una muestra nueva de P4
+        new_df = pd.DataFrame({"peptide": ["AAAAAAAAA", "CCCCCCCCCC"], "patientId": ["P1", "P4"], "sampleId": ["S4", "S5"],
+                               "Binding_Classification": ["WB", "SB"], "allele": ["B", "A"]})
+        self.assertEqual(counts.update(new_df), ["P1", "P4"])
+        clinical_df = pd.DataFrame({"Patient ID": ["P1", "P2", "P3", "P4", "P5"], "Neoantigen_SB_Count": [-1] * 5})
+        result = counts.update_clinical(clinical_df, ["P1", "P4"])
+        self.assertEqual(result["Neoantigen_SB_Count"].tolist(), [1, -1, -1, 1, -1])
+        self.assertEqual(result["Neoantigen_WB_Count"].tolist(), [2, 0, 0, 0, 0])
+        self.assertEqual(result["Neoantigen_Length_10_Count"].tolist(), [0, 0, 0, 1, 0])
+        self.assertEqual(counts.update_clinical(clinical_df)["Neoantigen_SB_Count"].tolist(), [1, 0, 1, 1, 0])
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(len(aggregation.PatientCounts.load(directory).counts), 0)
+            counts.save(directory)
+            loaded = aggregation.PatientCounts.load(directory)
+        pd.testing.assert_frame_equal(loaded.by_patient(), counts.by_patient())
+
+
+    def test_patient_counts_sync_recounts_changed_samples_and_drops_removed_ones(self):
+        mutations_df = pd.DataFrame({"patientId": ["P1", "P1", "P2", "P3"], "Protein Change": ["A1B", "C2D", "A1B", "E3F"]})
+        counts = aggregation.PatientCounts()
+        self.assertEqual(counts.sync(self.predictions_df, mutations_df), ["P1", "P2", "P3"])
+        self.assertEqual(counts.sync(self.predictions_df, mutations_df), [])
+
+        # P2 desaparece, la mutación de P3 cambia y aparece P4
+        changed_mutations_df = pd.DataFrame({"patientId": ["P1", "P1", "P3", "P4"], "Protein Change": ["A1B", "C2D", "E3G", "F4H"]})
+        changed_df = pd.concat([self.predictions_df[self.predictions_df["patientId"] != "P2"].replace({"N/A": "WB"}),
+                                pd.DataFrame({"peptide": ["FFFFFFFFF"], "gen": ["G3"], "patientId": ["P4"], "Binding_Classification": ["SB"]})],
+                               ignore_index=True)
+        self.assertEqual(counts.sync(changed_df, changed_mutations_df), ["P2", "P3", "P4"])
+        expected = aggregation.PatientCounts()
+        expected.update(changed_df)
+        pd.testing.assert_frame_equal(counts.by_patient(), expected.by_patient())
+
+        # Las predicciones solo se vuelven a contar si cambian las entradas de la muestra o los parámetros comunes
+        self.assertEqual(counts.sync(changed_df.replace({"WB": "SB"}), changed_mutations_df), [])
+        self.assertEqual(counts.sync(changed_df, changed_mutations_df, key="otro modelo"), ["P1", "P3", "P4"])
+
+        # Una muestra cuyas mutaciones ya no generan predicciones se queda sin contadores
+        self.assertEqual(counts.sync(changed_df[changed_df["patientId"] != "P4"], changed_mutations_df.replace({"F4H": "F4K"}), key="otro modelo"), ["P4"])
+        self.assertNotIn("P4", counts.by_patient().index)
+
+        with tempfile.TemporaryDirectory() as directory:
+            counts.save(directory)
+            self.assertEqual(aggregation.PatientCounts.load(directory).sync(changed_df, changed_mutations_df.replace({"F4H": "F4K"}), key="otro modelo"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import json
+import tempfile
+import benchmark
+import mutationModifications
+import pandas as pd
+
+
+class benchmarkTest(unittest.TestCase):
+
+    def test_generate_cohort_is_reproducible_and_repeats_mutations(self):
+        mutations, proteome, clinical_df = benchmark.generate_cohort(20, 10, 50, duplication_rate=0.5, seed=1)
+        self.assertEqual(len(mutations), 200)
+        self.assertEqual(len(proteome), 50)
+        self.assertEqual(clinical_df["Patient ID"].nunique(), 20)
+
+        mutations_df = pd.DataFrame(mutationModifications.create_mutations_dict(mutations))
+        self.assertEqual(len(mutations_df.drop_duplicates(subset=["Gene", "Protein Change"])), 100)
+        for gene, protein_change in zip(mutations_df["Gene"], mutations_df["Protein Change"]):
+            position = int(protein_change[1:-1] if protein_change[-1] != "l" else protein_change[1:-3])
+            self.assertEqual(proteome[gene][1][position - 1], protein_change[0])
+
+        other, _, _ = benchmark.generate_cohort(20, 10, 50, duplication_rate=0.5, seed=1)
+        self.assertEqual([mutation.proteinChange for mutation in other], mutations_df["Protein Change"].tolist())
+
+    def test_run_benchmark_times_every_stage_and_detects_regressions(self):
+        runs = [benchmark.run_benchmark(n_patients, mutations_per_patient=5, proteome_size=20, lengths=9) for n_patients in [4, 8]]
+        for run in runs:
+            self.assertEqual(list(run["stages"]), benchmark.STAGES)
+            self.assertEqual(run["stages"]["mutations_dict"]["rows"], run["config"]["n_patients"] * 5)
+            self.assertEqual(run["stages"]["rendering"]["rows"], 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.json")
+            benchmark.save_results(runs, path)
+            with open(path, encoding="utf-8") as file:
+                results = json.load(file)
+        self.assertEqual(set(results["scaling_exponents"]), set(benchmark.STAGES) | {"total"})
+
+        slower = json.loads(json.dumps(results))
+        slower["runs"][0]["stages"]["prediction"]["seconds"] *= 2
+        self.assertEqual(benchmark.compare_results(results, results), [])
+        self.assertEqual([stage for _, stage, _, _ in benchmark.compare_results(results, slower)], ["prediction"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,26 @@
 import unittest
+import sys
 import pandas as pd
 import os
+import matplotlib
+import matplotlib.pyplot as plt
 import getGraphics
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def max_rss_bytes():
+    """
+    Pico de memoria residente del proceso en bytes, o 0 si la plataforma no lo proporciona.
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
 class TestGetGraphics(unittest.TestCase):
 
     def setUp(self):
@@ -116,6 +134,49 @@ class TestGetGraphics(unittest.TestCase):
         if os.path.exists('resultados/combinaciónmutaciones.csv'):
             os.remove('resultados/combinaciónmutaciones.csv')
 
+    def test_contarNeoantigenosPorTipoMutacion_counts_each_prediction_once(self):
+        # El paciente 1 tiene dos mutaciones de tipos distintos en el mismo gen: unir por 'patientId' y 'Gene'
+        # contaría cada uno de sus neoantígenos dos veces
+        mutations_df = pd.DataFrame({
+            'mutationId': ['M1', 'M2', 'M3'],
+            'patientId': [1, 1, 2],
+            'Gene': ['Gene1', 'Gene1', 'Gene2'],
+            'Clasificación': ['Tipo1', 'Tipo2', 'Tipo1']
+        })
+        predictions_df = pd.DataFrame({
+            'mutationId': ['M1', 'M1', 'M2', 'M3'],
+            'Binding_Classification': pd.Categorical(['SB', 'WB', 'SB', 'WB'], categories=['SB', 'WB', 'N/A'])
+        })
+        counts = getGraphics.contarNeoantigenosPorTipoMutacion(mutations_df, predictions_df)
+        self.assertEqual(counts['Número de Neoantígenos'].sum(), len(predictions_df))
+        self.assertEqual(counts.astype({'Binding_Classification': str}).values.tolist(),
+                         [['Tipo1', 'SB', 1], ['Tipo1', 'WB', 2], ['Tipo2', 'SB', 1]])
+
+    def test_figures_are_closed_and_peak_memory_stays_flat(self):
+        # Generar 200 gráficos: ninguna figura debe quedar abierta y el pico de memoria del proceso no debe crecer
+        # después de los primeros gráficos (180 figuras sin cerrar retendrían más de 100 MB)
+        series = self.clinical_df['Tumor Size']
+        with matplotlib.rc_context({'savefig.dpi': 20}):
+            for plot in range(200):
+                if plot == 20:
+                    peak = max_rss_bytes()
+                getGraphics.graficoqq(series, 'memoria')
+                self.assertEqual(plt.get_fignums(), [])
+        if resource is not None:
+            self.assertLess(max_rss_bytes() - peak, 30 * 2**20)
+
+        file_path = 'Figuras/Gráfico q-q por memoria.png'
+        self.assertTrue(os.path.exists(file_path))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    def test_figura_closes_the_figure_on_error(self):
+        with self.assertRaises(ValueError):
+            with getGraphics.figura('Figuras 2/error.png') as (fig, ax):
+                raise ValueError
+        self.assertEqual(plt.get_fignums(), [])
+        self.assertFalse(os.path.exists('Figuras 2/error.png'))
+
     def test_matrizCorrelacion(self):
         # Llamar a la función para generar el heatmap de la matriz de correlación
         getGraphics.matrizCorrelacion(self.clinical_df)
@@ -0,0 +1,167 @@
+import unittest
+import os
+import tempfile
+import threading
+from unittest import mock
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import getInformation
+
+UNIPROT_ENTRIES = [
+    ("Q9XXXX", "unreviewed", "TP53", "MEEPQ"),
+    ("P04637", "reviewed", "TP53", "MEEPQSDPSV"),
+    ("P38398", "reviewed", "BRCA1", "MDLSALRVEE"),
+    ("P01116", "reviewed", "KRAS", "MTEYKLVVVG"),
+    ("P00533", "reviewed", "THROTTLED", "MRPSGTAGAA"),
+]
+
+
+class StubUniProtHandler(BaseHTTPRequestHandler):
+    """Servidor falso que imita los endpoints stream y search de la API REST de UniProt."""
+
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)["query"][0]
+        StubUniProtHandler.requests.append((url.path, query))
+        # FAILGENE siempre falla y THROTTLED se limita la primera vez que se consulta
+        throttled = "THROTTLED" in query and sum("THROTTLED" in previous for _, previous in StubUniProtHandler.requests) == 1
+        if "FAILGENE" in query or throttled:
+            self.send_response(429 if throttled else 503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        rows = ["Entry\tReviewed\tGene Names (primary)\tSequence"]
+        for accession, reviewed, gene, sequence in UNIPROT_ENTRIES:
+            # El sinónimo RASK2 de KRAS solo se encuentra con la búsqueda individual
+            if f"gene_exact:{gene}" in query or (gene == "KRAS" and url.path.endswith("search") and "RASK2" in query):
+                rows.append(f"{accession}\t{reviewed}\t{gene}\t{sequence}")
+        body = ("\n".join(rows) + "\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubCBioPortalClient:
+    """Cliente falso de cBioPortal que devuelve las mutaciones por páginas."""
+
+    def __init__(self, mutations, overlap=0, reordered_pages=()):
+        self.mutations = mutations
+        self.overlap = overlap
+        self.reordered_pages = set(reordered_pages)
+        self.pages_requested = []
+        self.sort_keys = set()
+        self.Mutations = self
+
+    def getMutationsInMolecularProfileBySampleListIdUsingGET(self, molecularProfileId, sampleListId, projection, pageSize=None,
+                                                             pageNumber=None, sortBy=None, direction=None):
+        if projection == "META":
+            headers = {"total-count": str(len(self.mutations))}
+            return SimpleNamespace(response=lambda: SimpleNamespace(incoming_response=SimpleNamespace(headers=headers)))
+        self.pages_requested.append(pageNumber)
+        self.sort_keys.add((sortBy, direction))
+        mutations = self.mutations
+        if pageNumber in self.reordered_pages:
+            # Las dos mutaciones empatadas en el borde de la página cambian de orden en esta petición
+            boundary = pageNumber * pageSize
+            mutations = mutations[:boundary - 1] + [mutations[boundary], mutations[boundary - 1]] + mutations[boundary + 1:]
+        # Con overlap > 0 cada página repite las últimas mutaciones de la anterior, como si el orden cambiara entre peticiones
+        start = max(pageNumber * pageSize - self.overlap, 0)
+        page = mutations[start:start + pageSize]
+        return SimpleNamespace(result=lambda: page)
+
+
+def stub_mutation(index):
+    return SimpleNamespace(
+        chr="17", startPosition=7577120 + index, endPosition=7577120 + index, referenceAllele="C", variantAllele="T",
+        variantType="SNP", gene=SimpleNamespace(hugoGeneSymbol="TP53"), proteinChange=f"R{273 + index}H",
+        patientId=f"P{index}", sampleId=f"S{index}", tumorAltCount=None if index % 2 else 10, tumorRefCount=20,
+        mutationType="Missense_Mutation", molecularProfileId="study_mutations", studyId="study")
+
+
+class getInformationTest(unittest.TestCase):
+
+    def setUp(self):
+        StubUniProtHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubUniProtHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resolve_genes_bulk(self):
+        genes = ["TP53", "BRCA1", "TP53", "RASK2", "NOTAGENE", None]
+        result = getInformation.resolve_genes_bulk(genes, batch_size=2, max_workers=2, requests_per_second=None, base_url=self.base_url)
+        self.assertEqual(result, {
+            "TP53": ("P04637", "MEEPQSDPSV"),
+            "BRCA1": ("P38398", "MDLSALRVEE"),
+            "RASK2": ("P01116", "MTEYKLVVVG"),
+            "NOTAGENE": (None, None),
+        })
+        paths = [path for path, _ in StubUniProtHandler.requests]
+        self.assertEqual(paths.count("/uniprotkb/stream"), 2)
+        self.assertEqual(paths.count("/uniprotkb/search"), 2)
+
+    def test_resolve_genes_bulk_reports_failures_without_aborting(self):
+        with mock.patch.object(getInformation.RateLimiter, "wait", autospec=True) as wait:
+            result = getInformation.resolve_genes_bulk(["TP53", "FAILGENE", "THROTTLED"], batch_size=1, max_workers=2,
+                                                       requests_per_second=None, base_url=self.base_url, retries=2, backoff_factor=0)
+        self.assertEqual(result, {
+            "TP53": ("P04637", "MEEPQSDPSV"),
+            "FAILGENE": getInformation.UNIPROT_FAILED,
+            "THROTTLED": ("P00533", "MRPSGTAGAA"),
+        })
+        # Cada reintento pasa por el limitador: 1 petición de TP53, 3 de FAILGENE y 2 de THROTTLED
+        self.assertEqual(len(StubUniProtHandler.requests), 6)
+        self.assertEqual(wait.call_count, 6)
+
+    def test_resolve_genes_bulk_survives_connection_errors(self):
+        self.server.shutdown()
+        self.server.server_close()
+        result = getInformation.resolve_genes_bulk(["TP53", "BRCA1"], requests_per_second=None, base_url=self.base_url,
+                                                   retries=1, backoff_factor=0)
+        self.assertEqual(result, {"TP53": getInformation.UNIPROT_FAILED, "BRCA1": getInformation.UNIPROT_FAILED})
+
+    def test_mutations_snapshot_is_paged_and_reused(self):
+        client = StubCBioPortalClient([stub_mutation(index) for index in range(5)])
+        with tempfile.TemporaryDirectory() as directory:
+            df = getInformation.get_mutations_dataframe("study", snapshot_dir=directory, page_size=2, client=client)
+            self.assertEqual(client.pages_requested, [0, 1, 2])
+            self.assertEqual(client.sort_keys, {("startPosition", "ASC")})
+            self.assertEqual(df["Protein Change"].tolist(), ["R273H", "R274H", "R275H", "R276H", "R277H"])
+            self.assertTrue(os.path.exists(os.path.join(directory, "study.parquet")))
+
+            # La segunda vez se lee la instantánea sin llamar a la API
+            df = getInformation.get_mutations_dataframe("study", columns=["Gene", "patientId"], snapshot_dir=directory, client=client)
+            self.assertEqual(client.pages_requested, [0, 1, 2])
+            self.assertEqual(df.columns.tolist(), ["Gene", "patientId"])
+
+    def test_mutations_snapshot_drops_mutations_repeated_between_pages(self):
+        client = StubCBioPortalClient([stub_mutation(index) for index in range(6)], overlap=1)
+        with tempfile.TemporaryDirectory() as directory:
+            df = getInformation.get_mutations_dataframe("study", snapshot_dir=directory, page_size=3, client=client)
+        self.assertEqual(client.pages_requested, [0, 1, 2])
+        self.assertEqual(df["Protein Change"].tolist(), ["R273H", "R274H", "R275H", "R276H", "R277H", "R278H"])
+
+    def test_mutations_snapshot_detects_mutations_skipped_between_pages(self):
+        mutations = [stub_mutation(index) for index in range(5)]
+        mutations[2].startPosition = mutations[1].startPosition
+        # La segunda página se pide con las mutaciones empatadas 1 y 2 en otro orden: la 1 se repite y la 2 se pierde
+        client = StubCBioPortalClient(mutations, reordered_pages=[1])
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(getInformation.MutationsSnapshotError):
+                getInformation.fetch_mutations_snapshot("study", snapshot_dir=directory, page_size=2, client=client)
+            self.assertEqual(os.listdir(directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import main
+import aggregation
+import predictionCache
+import pandas as pd
+from benchmark import StubPredictor
+
+
+SEQUENCE = "MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ"
+
+
+def mutation(patient_id, sample_id, protein_change, position):
+    return {"patientId": patient_id, "sampleId": sample_id, "Gene": "G", "Mutation Type": "Missense_Mutation",
+            "Protein Change": protein_change, "chr": "1", "startPosition": position, "endPosition": position,
+            "referenceAllele": "A", "variantAllele": "G"}
+
+
+class StubUniProtCache:
+    """Caché de UniProt falsa con un solo gen."""
+
+    def bulk_get_uniprot_info(self, genes):
+        return {gene: ("X", SEQUENCE) for gene in set(genes) if isinstance(gene, str)}
+
+    def stats(self):
+        return {}
+
+
+class mainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_directory = os.getcwd()
+        os.chdir(self.directory.name)
+        self.mutations = [mutation("P1", "S1", "K2E", 1), mutation("P2", "S2", "A8V", 2)]
+        self.failing_studies = set()
+        mock.patch("getInformation.fetch_mutations_snapshot", side_effect=self.fetch).start()
+        for study_id in ["s1", "s2"]:
+            pd.DataFrame({"Patient ID": ["P1", "P2", "P3"], "Sample Class": "Tumor"}).to_csv(f"{study_id}.tsv", sep="\t", index=False)
+
+    def tearDown(self):
+        mock.patch.stopall()
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+    def fetch(self, study_id, snapshot_dir, refresh=False):
+        if study_id in self.failing_studies:
+            raise RuntimeError(f"cBioPortal no responde para {study_id}")
+        os.makedirs(snapshot_dir, exist_ok=True)
+        pd.DataFrame(self.mutations).to_parquet(os.path.join(snapshot_dir, f"{study_id}.parquet"))
+
+    def run_study(self, force=()):
+        prediction_cache = predictionCache.PredictionCache("predicciones.sqlite", model_version="v")
+        return main.run_study("s1", "s1.tsv", StubPredictor(), StubUniProtCache(), prediction_cache,
+                              output_dir="resultados", force=force)
+
+    def test_aggregate_updates_only_the_patients_with_new_samples(self):
+        self.run_study()
+        first_df = pd.read_csv("resultados/s1_clinical_data_with_neoantigens.csv").set_index("Patient ID")
+
+        self.mutations.append(mutation("P2", "S3", "S14P", 3))
+        with mock.patch.object(aggregation.PatientCounts, "update", autospec=True,
+                               side_effect=aggregation.PatientCounts.update) as update:
+            self.assertIn("aggregate", self.run_study(force=["fetch"]))
+        self.assertEqual(update.call_count, 1)
+        self.assertEqual(update.call_args.args[1]["sampleId"].unique().tolist(), ["S3"])
+
+        second_df = pd.read_csv("resultados/s1_clinical_data_with_neoantigens.csv").set_index("Patient ID")
+        count_columns = ["Neoantigen_SB_Count", "Neoantigen_WB_Count"]
+        pd.testing.assert_frame_equal(second_df.loc[["P1", "P3"]], first_df.loc[["P1", "P3"]])
+        self.assertGreater(second_df.loc["P2", count_columns].sum(), first_df.loc["P2", count_columns].sum())
+
+        # Los recuentos salen de los contadores, no del CSV anterior: editarlo o borrarlo no cambia el resultado
+        edited_df = second_df.reset_index()
+        edited_df["Neoantigen_SB_Count"] = 99
+        edited_df.to_csv("resultados/s1_clinical_data_with_neoantigens.csv", index=False)
+        self.run_study(force=["aggregate"])
+        pd.testing.assert_frame_equal(pd.read_csv("resultados/s1_clinical_data_with_neoantigens.csv").set_index("Patient ID"), second_df)
+
+        unique_predictions = pd.read_parquet("resultados/unique_predictions.parquet")
+        expected = unique_predictions[unique_predictions["Binding_Classification"] == "SB"].groupby("patientId", observed=True).size()
+        self.assertEqual(second_df["Neoantigen_SB_Count"].tolist(), [expected.get(patient, 0) for patient in ["P1", "P2", "P3"]])
+
+    def test_mutations_without_gene_get_no_sequence(self):
+        self.mutations.append(dict(mutation("P3", "S4", "K2E", 4), Gene=None))
+        self.run_study()
+        mutations_df = pd.read_parquet("resultados/mutations_uniprot.parquet")
+        self.assertEqual(mutations_df["Protein_Sequence"].isna().tolist(), [False, False, True])
+
+    def test_binding_reports_have_one_row_per_peptide_with_its_best_allele(self):
+        with open("s1_hla_genotypes.csv", "w") as handle:
+            handle.write("patientId,allele\nP1,HLA-A*02:01\nP1,HLA-B*07:02\nP2,HLA-A*02:01\nP2,HLA-B*07:02\n")
+        pd.DataFrame({"allele": ["HLA-B*07:02"], "strong": [1.0], "weak": [3.0]}).to_csv("umbrales_union.csv", index=False)
+        self.run_study()
+        unique_predictions = pd.read_parquet("resultados/unique_predictions.parquet")
+        for classification, name in [("SB", "strong_binding_peptides"), ("WB", "weak_binding_peptides")]:
+            report_df = pd.read_csv(f"resultados/{name}.csv")
+            self.assertFalse(report_df.duplicated(subset=["peptide", "gen", "patientId"]).any())
+            expected = unique_predictions[unique_predictions["Binding_Classification"] == classification]
+            self.assertEqual(sorted(zip(report_df["peptide"], report_df["best_allele"])),
+                             sorted(zip(expected["peptide"], expected["best_allele"].astype(str))))
+
+    def test_main_runs_several_studies_with_shared_caches_and_predictor(self):
+        predictor = StubPredictor()
+        load_predictor = mock.patch("mhcPredictions.load_predictor", return_value=predictor).start()
+        mock.patch("mhcPredictions.get_model_version", return_value="v").start()
+        resolver = mock.patch("getInformation.resolve_genes_bulk",
+                              side_effect=lambda genes, **options: {gene: ("X", SEQUENCE) for gene in genes}).start()
+
+        main.main(["--study", "s1", "s1.tsv", "--study", "s2", "s2.tsv", "--workers", "1"])
+
+        for study_id in ["s1", "s2"]:
+            self.assertTrue(os.path.exists(f"resultados/{study_id}/{study_id}_clinical_data_with_neoantigens.csv"))
+            self.assertTrue(os.path.exists(f"resultados/{study_id}/unique_predictions.parquet"))
+        self.assertFalse(os.path.exists("s1_clinical_data_with_neoantigens.csv"))
+        pd.testing.assert_frame_equal(pd.read_parquet("resultados/s2/unique_predictions.parquet"),
+                                      pd.read_parquet("resultados/s1/unique_predictions.parquet"))
+
+        # Un solo predictor y, como s2 tiene las mismas mutaciones, UniProt y MHCflurry solo se consultan para s1
+        load_predictor.assert_called_once_with()
+        resolver.assert_called_once()
+        predicted = [peptide for peptides, _ in predictor.calls for peptide in peptides]
+        self.assertGreater(len(predicted), 0)
+        self.assertEqual(len(predicted), len(set(predicted)))
+
+    def test_run_studies_closes_the_predictor_when_a_study_fails(self):
+        predictor = StubPredictor()
+        predictor.close = mock.Mock()
+        mock.patch("mhcPredictions.ShardedPredictor", return_value=predictor).start()
+        mock.patch("mhcPredictions.get_model_version", return_value="v").start()
+        mock.patch("getInformation.resolve_genes_bulk",
+                   side_effect=lambda genes, **options: {gene: ("X", SEQUENCE) for gene in genes}).start()
+        self.failing_studies.add("s2")
+
+        with self.assertRaises(RuntimeError):
+            main.run_studies([("s1", "s1.tsv"), ("s2", "s2.tsv")], n_workers=2)
+        predictor.close.assert_called_once_with()
+        self.assertTrue(os.path.exists("resultados/s1/s1_clinical_data_with_neoantigens.csv"))
+
+
+if __name__ == '__main__':
+    unittest.main()
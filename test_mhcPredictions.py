@@ -0,0 +1,126 @@
+import unittest
+import os
+import tempfile
+import mhcPredictions
+import predictionCache
+import pandas as pd
+from benchmark import StubPredictor, load_stub_predictor
+
+
+class mhcPredictionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mutated_peptides_df = pd.DataFrame({
+            "peptido": ["AAAAAAAAA", "CCCCCCCCC", "AAAAAAAAA", "AAAAAAAAA"],
+            "gen": ["G1", "G2", "G1", "G1"],
+            "patientId": ["P1", "P1", "P2", "P3"],
+            "sampleId": ["S1", "S1", "S2", "S3"],
+        })
+
+    def test_predict_unique_peptides_scores_each_peptide_once(self):
+        predictor = StubPredictor()
+        mhcPredictions.predict_unique_peptides(predictor, self.mutated_peptides_df, alleles=["HLA-A*02:01"])
+        self.assertEqual(predictor.calls, [(["AAAAAAAAA", "CCCCCCCCC"], ["HLA-A*02:01"])])
+
+    def test_predict_unique_peptides_joins_every_occurrence(self):
+        predictor = StubPredictor()
+        result = mhcPredictions.predict_unique_peptides(predictor, self.mutated_peptides_df, alleles=["HLA-A*02:01"])
+        self.assertEqual(result["peptide"].tolist(), self.mutated_peptides_df["peptido"].tolist())
+        self.assertEqual(result["patientId"].tolist(), ["P1", "P1", "P2", "P3"])
+        self.assertEqual(result["presentation_percentile"].tolist(), [0.0, 2.0, 0.0, 0.0])
+        self.assertEqual(result.columns[-3:].tolist(), ["gen", "patientId", "sampleId"])
+
+    def test_predict_patient_alleles_scores_only_carried_alleles(self):
+        genotypes_df = pd.DataFrame({
+            "patientId": ["P1", "P1", "P2"],
+            "allele": ["HLA-A*02:01", "HLA-B*07:02", "HLA-B*07:02"],
+        })
+        predictor = StubPredictor()
+        result = mhcPredictions.predict_patient_alleles(predictor, self.mutated_peptides_df, genotypes_df, default_alleles=["HLA-C*07:01"])
+        calls = {alleles[0]: sorted(peptides) for peptides, alleles in predictor.calls}
+        self.assertEqual(calls, {
+            "HLA-A*02:01": ["AAAAAAAAA", "CCCCCCCCC"],
+            "HLA-B*07:02": ["AAAAAAAAA", "CCCCCCCCC"],
+            "HLA-C*07:01": ["AAAAAAAAA"],
+        })
+        self.assertEqual(len(result), 6)
+        self.assertEqual(result[result["patientId"] == "P3"]["best_allele"].tolist(), ["HLA-C*07:01"])
+
+    def test_predict_patient_alleles_without_pairs_returns_an_empty_table(self):
+        genotypes_df = pd.DataFrame({"patientId": ["P1"], "allele": ["HLA-A*02:01"]})
+        columns = mhcPredictions.predict_patient_alleles(StubPredictor(), self.mutated_peptides_df, genotypes_df).columns.tolist()
+
+        # Sin péptidos, o con pacientes sin genotipo y sin alelos por defecto, no hay nada que puntuar
+        for mutated_peptides_df, default_alleles in [(self.mutated_peptides_df.iloc[:0], ["HLA-A*02:01"]),
+                                                     (self.mutated_peptides_df[self.mutated_peptides_df["patientId"] != "P1"], [])]:
+            predictor = StubPredictor()
+            result = mhcPredictions.predict_patient_alleles(predictor, mutated_peptides_df, genotypes_df, default_alleles=default_alleles)
+            self.assertEqual(predictor.calls, [])
+            self.assertEqual(len(result), 0)
+            self.assertEqual(result.columns.tolist(), columns)
+
+    def test_predict_unique_peptides_scores_reference_peptides_in_same_batch(self):
+        mutated_peptides_df = self.mutated_peptides_df.assign(peptido_wt=["AAAAAAAAC", "AAAAAAAAA", "AAAAAAAAC", "AAAAAAAAC"])
+        predictor = StubPredictor()
+        result = mhcPredictions.predict_unique_peptides(predictor, mutated_peptides_df, alleles=["HLA-A*02:01"])
+        self.assertEqual(predictor.calls, [(["AAAAAAAAA", "CCCCCCCCC", "AAAAAAAAC"], ["HLA-A*02:01"])])
+        self.assertEqual(result["DAI"].tolist(), [2.0, 1.0, 2.0, 2.0])
+        self.assertEqual(result.columns.tolist().index("DAI"), result.columns.tolist().index("presentation_percentile") + 1)
+
+    def test_predict_unique_peptides_only_scores_cache_misses(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = predictionCache.PredictionCache(os.path.join(directory, "cache.sqlite"), model_version="v1")
+            first = mhcPredictions.predict_unique_peptides(StubPredictor(), self.mutated_peptides_df.iloc[:2], alleles=["HLA-A*02:01"], cache=cache)
+
+            predictor = StubPredictor()
+            result = mhcPredictions.predict_unique_peptides(predictor, self.mutated_peptides_df, alleles=["HLA-A*02:01"], cache=cache)
+            self.assertEqual(predictor.calls, [])
+            pd.testing.assert_frame_equal(result.iloc[:2], first)
+
+            # Al cambiar la versión de los modelos no se reutilizan las predicciones guardadas
+            cache_v2 = predictionCache.PredictionCache(os.path.join(directory, "cache.sqlite"), model_version="v2")
+            predictor = StubPredictor()
+            mhcPredictions.predict_unique_peptides(predictor, self.mutated_peptides_df, alleles=["HLA-A*02:01"], cache=cache_v2)
+            self.assertEqual(len(predictor.calls), 1)
+
+    def test_sharded_predictor_matches_single_process(self):
+        peptides = ["AAAAAAAAA", "CCCCCCCCC", "DDDDDDDDD", "EEEEEEEEE", "FFFFFFFFF"]
+        expected = StubPredictor().predict(peptides, ["HLA-A*02:01"]).reindex(columns=["peptide"] + predictionCache.PREDICTION_COLUMNS)
+        with tempfile.TemporaryDirectory() as directory:
+            with mhcPredictions.ShardedPredictor(load_stub_predictor, max_workers=2, shard_size=2, shard_dir=directory) as predictor:
+                result = predictor.predict(peptides, ["HLA-A*02:01"])
+            self.assertEqual(os.listdir(directory), [])
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_write_patient_allele_predictions_streams_the_same_predictions(self):
+        mutated_peptides_df = self.mutated_peptides_df.assign(peptido_wt=["AAAAAAAAC", None, "AAAAAAAAC", "AAAAAAAAC"])
+        genotypes_df = pd.DataFrame({"patientId": ["P1", "P1", "P2"], "allele": ["HLA-A*02:01", "HLA-B*07:02", "HLA-B*07:02"]})
+        expected = mhcPredictions.predict_patient_alleles(StubPredictor(), mutated_peptides_df, genotypes_df, default_alleles=["HLA-C*07:01"])
+        key = ["best_allele", "patientId", "peptide"]
+        expected = expected.sort_values(key).reset_index(drop=True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mhcPredictions.ShardedPredictor(load_stub_predictor, max_workers=2, shard_size=1, shard_dir=directory, max_pending=2) as predictor:
+                path = mhcPredictions.write_patient_allele_predictions(predictor, mutated_peptides_df, genotypes_df,
+                                                                       os.path.join(directory, "predicciones"), default_alleles=["HLA-C*07:01"])
+                self.assertEqual([len(shard) for shard in predictor.iter_predict(["AAAAAAAAA", "CCCCCCCCC", "DDDDDDDDD"], ["HLA-A*02:01"])], [1, 1, 1])
+            self.assertEqual(sorted(os.listdir(directory)), ["predicciones.parquet"])
+            result = pd.read_parquet(path).sort_values(key).reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_prediction_cache_eviction_and_invalidation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = predictionCache.PredictionCache(os.path.join(directory, "cache.sqlite"), model_version="v1", max_entries=2)
+            predictions = StubPredictor().predict(["AAAAAAAAA", "CCCCCCCCC", "DDDDDDDDD"], ["HLA-A*02:01"])
+            cache.put_many(predictions.iloc[:2], "HLA-A*02:01")
+            cache.get_many(["AAAAAAAAA"], "HLA-A*02:01")
+            cache.put_many(predictions.iloc[2:], "HLA-A*02:01")
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(sorted(cache.get_many(predictions["peptide"], "HLA-A*02:01")["peptide"]), ["AAAAAAAAA", "DDDDDDDDD"])
+
+            cache.invalidate("v1")
+            self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,19 @@
 import unittest
 import mutationModifications 
 import pandas as pd
+
+
+def reference_peptides(sequence, protein_change, length):
+    """
+    Implementación de referencia por cortes: las ventanas de la secuencia mutada que contienen la mutación,
+    empezando por la que comienza en la mutación, como tuplas (péptido, péptido silvestre, posición de la mutación).
+    """
+    index = int(protein_change[1:-1]) - 1
+    mutated = sequence[:index] + protein_change[-1] + sequence[index + 1:]
+    return [(mutated[start:start + length], sequence[start:start + length], index - start)
+            for start in range(index, index - length, -1) if start >= 0 and start + length <= len(sequence)]
+
+
 class mutationModification(unittest.TestCase):
 
     def test_delecion(self):
@@ -48,6 +61,110 @@ class mutationModification(unittest.TestCase):
         expected = ["BABCDEFGH", "HBABCDEFG", "GHBABCDEF", "FGHBABCDE", "EFGHBABCD", "DEFGHBABC", "CDEFGHBAB", "BCDEFGHBA", "ABCDEFGHB"]
         self.assertEqual(mutationModifications.generate_mutated_peptides(sequence, mutation), expected)
     
+    def test_generate_peptides_batch_matches_reference_slicing(self):
+        sequence = "ABCDEFGHIJKLMNOP"
+        mutations_df = pd.DataFrame({
+            "Gene": ["G1", "G2", "G3", "G4", "G5", "G6"],
+            "Protein Change": ["A1Z", "P16Z", "H8Z", "B5D", "C3E", "I9B"],
+            "Protein_Sequence": [sequence, sequence, sequence, None, "ABCDEFGH", "ABCDEFGHIABCDEFGHIABCDEFGHI"],
+            "patientId": ["P1", "P1", "P2", "P2", "P3", "P3"],
+            "sampleId": ["S1", "S1", "S2", "S2", "S3", "S3"]
+        })
+        result_df = mutationModifications.generate_peptides_batch(mutations_df)
+
+        expected = [{"peptido": peptide, "gen": row["Gene"], "patientId": row["patientId"], "sampleId": row["sampleId"],
+                     "peptido_wt": wild_type, "longitud": 9, "posicion_mutacion": offset}
+                    for _, row in mutations_df.iterrows() if row["Protein_Sequence"] is not None
+                    for peptide, wild_type, offset in reference_peptides(row["Protein_Sequence"], row["Protein Change"], 9)]
+        self.assertEqual(result_df.to_dict("records"), expected)
+
+        # Las mutaciones en el primer y el último residuo solo tienen una ventana, y una proteína más corta que el péptido ninguna
+        by_gene = result_df.groupby("gen")
+        self.assertEqual(by_gene.get_group("G1")[["peptido", "peptido_wt", "posicion_mutacion"]].values.tolist(), [["ZBCDEFGHI", "ABCDEFGHI", 0]])
+        self.assertEqual(by_gene.get_group("G2")[["peptido", "peptido_wt", "posicion_mutacion"]].values.tolist(), [["HIJKLMNOZ", "HIJKLMNOP", 8]])
+        self.assertEqual(by_gene.get_group("G3")["peptido"].tolist(),
+                         ["ZIJKLMNOP", "GZIJKLMNO", "FGZIJKLMN", "EFGZIJKLM", "DEFGZIJKL", "CDEFGZIJK", "BCDEFGZIJ", "ABCDEFGZI"])
+        self.assertEqual(set(result_df["gen"]), {"G1", "G2", "G3", "G6"})
+        self.assertEqual(by_gene.get_group("G6")["peptido_wt"].tolist()[0], "IABCDEFGH")
+
+    def test_generate_peptides_batch_multiple_lengths(self):
+        mutations_df = pd.DataFrame({
+            "Gene": ["G1"],
+            "Protein Change": ["I9B"],
+            "Protein_Sequence": ["ABCDEFGHIABCDEFGHIABCDEFGHI"],
+            "patientId": ["P1"],
+            "sampleId": ["S1"]
+        })
+        result_df = mutationModifications.generate_peptides_batch(mutations_df, lengths=[8, 9, 10, 11])
+        self.assertEqual(result_df["longitud"].value_counts().sort_index().tolist(), [8, 9, 9, 9])
+        self.assertEqual(result_df.loc[result_df["longitud"] == 11, "peptido"].tolist(),
+                         ["BABCDEFGHIA", "HBABCDEFGHI", "GHBABCDEFGH", "FGHBABCDEFG", "EFGHBABCDEF",
+                          "DEFGHBABCDE", "CDEFGHBABCD", "BCDEFGHBABC", "ABCDEFGHBAB"])
+
+    def test_generate_peptides_batch_multiple_lengths_near_protein_ends(self):
+        mutations_df = pd.DataFrame({
+            "Gene": ["G1", "G2"],
+            "Protein Change": ["B2Z", "K11Z"],
+            "Protein_Sequence": ["ABCDEFGHIJKL", "ABCDEFGHIJKL"],
+            "patientId": ["P1", "P1"],
+            "sampleId": ["S1", "S1"]
+        })
+        result_df = mutationModifications.generate_peptides_batch(mutations_df, lengths=[8, 9, 10, 11])
+        self.assertEqual(result_df[["gen", "peptido", "peptido_wt", "longitud", "posicion_mutacion"]].values.tolist(), [
+            ["G1", "ZCDEFGHI", "BCDEFGHI", 8, 0], ["G1", "AZCDEFGH", "ABCDEFGH", 8, 1],
+            ["G1", "ZCDEFGHIJ", "BCDEFGHIJ", 9, 0], ["G1", "AZCDEFGHI", "ABCDEFGHI", 9, 1],
+            ["G1", "ZCDEFGHIJK", "BCDEFGHIJK", 10, 0], ["G1", "AZCDEFGHIJ", "ABCDEFGHIJ", 10, 1],
+            ["G1", "ZCDEFGHIJKL", "BCDEFGHIJKL", 11, 0], ["G1", "AZCDEFGHIJK", "ABCDEFGHIJK", 11, 1],
+            ["G2", "EFGHIJZL", "EFGHIJKL", 8, 6], ["G2", "DEFGHIJZ", "DEFGHIJK", 8, 7],
+            ["G2", "DEFGHIJZL", "DEFGHIJKL", 9, 7], ["G2", "CDEFGHIJZ", "CDEFGHIJK", 9, 8],
+            ["G2", "CDEFGHIJZL", "CDEFGHIJKL", 10, 8], ["G2", "BCDEFGHIJZ", "BCDEFGHIJK", 10, 9],
+            ["G2", "BCDEFGHIJZL", "BCDEFGHIJKL", 11, 9], ["G2", "ABCDEFGHIJZ", "ABCDEFGHIJK", 11, 10],
+        ])
+
+    def test_mutation_ids_are_carried_to_every_peptide(self):
+        mutations_df = mutationModifications.add_mutation_ids(pd.DataFrame({
+            "Gene": ["G1", "G1", "G2"],
+            "Protein Change": ["I9B", "E5_F6del", "A2C"],
+            "Protein_Sequence": ["ABCDEFGHIABCDEFGHIABCDEFGHI", "ABCDEFGHIJ", "ABCDEFGHIJ"],
+            "patientId": ["P1", "P1", "P2"],
+            "sampleId": ["S1", "S1", "S2"],
+            "chr": ["7", "7", "X"],
+            "startPosition": [100, 200, 300],
+            "endPosition": [100, 205, 300],
+            "referenceAllele": ["A", "GCTTTC", "C"],
+            "variantAllele": ["T", "-", "G"]
+        }))
+        self.assertEqual(mutations_df["mutationId"].tolist(), ["S1:7:100-100:A>T", "S1:7:200-205:GCTTTC>-", "S2:X:300-300:C>G"])
+
+        missense_df = mutationModifications.generate_peptides_batch(mutations_df.iloc[[0, 2]])
+        self.assertEqual(missense_df.columns[4], "mutationId")
+        self.assertEqual(missense_df["mutationId"].value_counts().to_dict(), {"S1:7:100-100:A>T": 9, "S2:X:300-300:C>G": 2})
+
+        indel_df = mutationModifications.generate_indel_peptides_batch(mutations_df.iloc[[1]], lengths=3)
+        self.assertEqual(indel_df["mutationId"].tolist(), ["S1:7:200-205:GCTTTC>-"] * 2)
+        self.assertNotIn("mutationId", mutationModifications.generate_indel_peptides_batch(mutations_df.iloc[[1]].drop(columns="mutationId"), lengths=3).columns)
+
+    def test_generate_indel_peptides_deletion(self):
+        peptides = list(mutationModifications.generate_indel_peptides("ABCDEFGHIJ", "E5_F6del", 3))
+        self.assertEqual(peptides, [("CDG", 3, 2), ("DGH", 3, 1)])
+
+    def test_generate_indel_peptides_insertion(self):
+        peptides = [peptide for peptide, _, _ in mutationModifications.generate_indel_peptides("ABCDEFGHIJ", "E5_F6insXY", 3)]
+        self.assertEqual(peptides, ["DEX", "EXY", "XYF", "YFG"])
+
+    def test_generate_indel_peptides_stop_codon(self):
+        peptides = list(mutationModifications.generate_indel_peptides("ABCDEFGHIJ", "F6delinsW*", [3, 4]))
+        self.assertEqual(peptides, [("DEW", 3, 2), ("CDEW", 4, 3)])
+
+    def test_frameshifts_are_not_supported(self):
+        self.assertNotIn("Frame_Shift_Del", mutationModifications.INDEL_MUTATION_TYPES)
+        self.assertNotIn("Frame_Shift_Ins", mutationModifications.INDEL_MUTATION_TYPES)
+        self.assertEqual(list(mutationModifications.generate_indel_peptides("ABCDEFGHIJ", "F6Wfs*8", 3)), [])
+
+    def test_generate_indel_peptides_unknown_format(self):
+        self.assertEqual(list(mutationModifications.generate_indel_peptides("ABCDEFGHIJ", "X6_splice", 3)), [])
+        self.assertEqual(list(mutationModifications.generate_indel_peptides(None, "E5del", 3)), [])
+
     def test_classify_binding_strong(self):
         row = {"presentation_percentile": 0.3}
         self.assertEqual(mutationModifications.classify_binding(row), "SB")
@@ -116,6 +233,49 @@ class mutationModification(unittest.TestCase):
         result_df = mutationModifications.calcularNeoantigenosPaciente(clinical_df, predictions_df)
         pd.testing.assert_frame_equal(result_df, expected_df)
 
+    def test_calcularNeoantigenosPaciente_without_wb_keeps_every_class(self):
+        clinical_df = pd.DataFrame({
+            'Patient ID': ['P001', 'P002']
+        })
+        predictions_df = pd.DataFrame({
+            'patientId': ['P001', 'P001', 'P002'],
+            'Binding_Classification': ['SB', 'N/A', 'N/A']
+        })
+        expected_df = pd.DataFrame({
+            'Patient ID': ['P001', 'P002'],
+            'Neoantigen_SB_Count': [1, 0],
+            'Neoantigen_WB_Count': [0, 0],
+            'Neoantigen_N/A_Count': [1, 1]
+        })
+        result_df = mutationModifications.calcularNeoantigenosPaciente(clinical_df, predictions_df)
+        pd.testing.assert_frame_equal(result_df, expected_df)
+
+    def test_select_neoantigens_drops_unclassified_rows(self):
+        predictions_df = pd.DataFrame({
+            'patientId': ['P001', 'P001', 'P002'],
+            'Binding_Classification': pd.Categorical(['SB', 'N/A', 'WB'])
+        })
+        result_df = mutationModifications.select_neoantigens(predictions_df)
+        self.assertEqual(result_df['patientId'].tolist(), ['P001', 'P002'])
+        self.assertEqual(result_df['Binding_Classification'].cat.categories.tolist(), ['SB', 'WB'])
+
+    def test_classify_binding_batch_matches_row_classifier(self):
+        predictions_df = pd.DataFrame({'presentation_percentile': [0.0, 0.5, 0.6, 1.99, 2.0, 35.0, float('nan')]})
+        expected = predictions_df.apply(mutationModifications.classify_binding, axis=1).tolist()
+        result = mutationModifications.classify_binding_batch(predictions_df)
+        self.assertEqual(result.tolist(), expected)
+        self.assertEqual(result.cat.categories.tolist(), ['SB', 'WB', 'N/A'])
+
+    def test_classify_binding_batch_other_columns_and_allele_thresholds(self):
+        predictions_df = pd.DataFrame({
+            'Rank': [0.3, 1.0, 3.0, 0.3, 1.0, 3.0],
+            'Alelo': ['HLA-A0201', 'HLA-A0201', 'HLA-A0201', 'HLA-B0702', 'HLA-B0702', 'HLA-B0702']
+        })
+        result = mutationModifications.classify_binding_batch(predictions_df, column='Rank')
+        self.assertEqual(result.tolist(), ['SB', 'WB', 'N/A', 'SB', 'WB', 'N/A'])
+        result = mutationModifications.classify_binding_batch(predictions_df, column='Rank', allele_thresholds={'HLA-B0702': (0.2, 5)}, allele_column='Alelo')
+        self.assertEqual(result.tolist(), ['SB', 'WB', 'N/A', 'WB', 'WB', 'WB'])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+import netMHC
+import storage
+import pandas as pd
+
+
+class netMHCTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.directory.name, *parts)
+
+    def test_export_peptides_writes_distinct_peptides_in_chunks(self):
+        predictions_df = pd.DataFrame({"peptide": ["AAAAAAAAA", "CCCCCCCCC", "AAAAAAAAA", "DDDDDDDDD", "EEEEEEEEE", "CCCCCCCCC"]})
+        storage.write_table(predictions_df, self.path("unique_predictions"))
+        os.makedirs(self.path("entrada"))
+        with open(self.path("entrada", netMHC.INPUT_PREFIX + "9.csv"), "w") as handle:
+            handle.write("OBSOLETO\n")
+
+        paths = netMHC.export_peptides(self.path("unique_predictions"), self.path("entrada"), chunk_size=2)
+        self.assertEqual([os.path.basename(path) for path in paths], [netMHC.INPUT_PREFIX + f"{n}.csv" for n in [1, 2]])
+        self.assertEqual(sorted(os.listdir(self.path("entrada"))), sorted(os.path.basename(path) for path in paths))
+        peptides = [pd.read_csv(path, header=None)[0].tolist() for path in paths]
+        self.assertEqual(peptides, [["AAAAAAAAA", "CCCCCCCCC"], ["DDDDDDDDD", "EEEEEEEEE"]])
+
+    def test_import_results_parses_and_classifies_every_file(self):
+        os.makedirs(self.path("resultados"))
+        header = "Pos;Peptide;ID;nM;Rank;Core;H_Avg_Ranks;N_binders;Alelo\n"
+        files = {
+            "1_NetMHC_2.csv": "0;CCCCCCCCC;PEPLIST;300.0;1.5;CCCCCCCCC;1.5;1;HLA-A0201\n",
+            "2_NetMHC_10.csv": "0;DDDDDDDDD;PEPLIST;9000.0;20.0;DDDDDDDDD;20.0;0;HLA-A0201\n",
+            "3_NetMHC_1.csv": "0;AAAAAAAAA;PEPLIST;12.0;0.1;AAAAAAAAA;0.1;1;HLA-A0201\n",
+        }
+        for filename, rows in files.items():
+            with open(self.path("resultados", filename), "w", encoding="utf-8-sig") as handle:
+                handle.write(header + rows)
+
+        for n_workers in [1, 2]:
+            path = netMHC.import_results(self.path("resultados"), self.path("predicciones_netMHC"), n_workers=n_workers)
+            self.assertEqual(path, self.path("predicciones_netMHC.parquet"))
+            result = storage.read_table(path, categorical=False)
+            self.assertEqual(result.columns[0], "Pos")
+            self.assertEqual(result["peptide"].tolist(), ["AAAAAAAAA", "CCCCCCCCC", "DDDDDDDDD"])
+            self.assertEqual(result["Binding_Classification"].tolist(), ["SB", "WB", "N/A"])
+            self.assertEqual(result["nM"].tolist(), [12.0, 300.0, 9000.0])
+
+    def test_import_results_skips_empty_files(self):
+        os.makedirs(self.path("resultados"))
+        header = "Pos;Peptide;ID;nM;Rank;Core;H_Avg_Ranks;N_binders;Alelo\n"
+        files = {
+            "1_NetMHC_1.csv": "",
+            "2_NetMHC_2.csv": "0;AAAAAAAAA;PEPLIST;12.0;0.1;AAAAAAAAA;0.1;1;HLA-A0201\n",
+            "3_NetMHC_3.csv": "",
+        }
+        for filename, rows in files.items():
+            with open(self.path("resultados", filename), "w", encoding="utf-8-sig") as handle:
+                handle.write(header + rows)
+
+        for n_workers in [1, 2]:
+            path = netMHC.import_results(self.path("resultados"), self.path("predicciones_netMHC"), n_workers=n_workers)
+            result = storage.read_table(path, categorical=False)
+            self.assertEqual(result["peptide"].tolist(), ["AAAAAAAAA"])
+            self.assertEqual(result["Binding_Classification"].tolist(), ["SB"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+import pipeline
+
+
+class pipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.directory.name, "entrada.txt")
+        self.output_path = os.path.join(self.directory.name, "salida.txt")
+        self.manifest_path = os.path.join(self.directory.name, "manifest.json")
+        with open(self.input_path, "w") as file:
+            file.write("AAAAAAAAA\n")
+        self.runs = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_stage(self, params=None, fail=False):
+        def run():
+            self.runs.append(params)
+            if fail:
+                raise RuntimeError("fallo en la etapa")
+            with open(self.input_path) as source, open(self.output_path, "w") as target:
+                target.write(source.read().lower())
+        return pipeline.Stage("peptides", run, inputs=[self.input_path], outputs=[self.output_path], params=params)
+
+    def test_stage_is_skipped_when_inputs_and_params_are_unchanged(self):
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [9]})]), ["peptides"])
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [9]})]), [])
+        self.assertEqual(len(self.runs), 1)
+
+    def test_stage_is_rerun_when_inputs_params_or_outputs_change(self):
+        pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [9]})])
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [8, 9]})]), ["peptides"])
+
+        with open(self.input_path, "a") as file:
+            file.write("CCCCCCCCC\n")
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [8, 9]})]), ["peptides"])
+
+        os.remove(self.output_path)
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [8, 9]})]), ["peptides"])
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage({"lengths": [8, 9]})], force=["peptides"]), ["peptides"])
+
+    def test_failed_stage_is_not_recorded(self):
+        with self.assertRaises(RuntimeError):
+            pipeline.Pipeline(self.manifest_path).run([self.make_stage(fail=True)])
+        self.assertFalse(os.path.exists(self.manifest_path))
+        self.assertEqual(pipeline.Pipeline(self.manifest_path).run([self.make_stage()]), ["peptides"])
+
+
+    def test_bounded_map_keeps_at_most_max_pending_tasks(self):
+        from concurrent.futures import ThreadPoolExecutor
+        submitted = []
+
+        def arguments():
+            for value in range(10):
+                submitted.append(value)
+                yield value
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = pipeline.bounded_map(executor, lambda value: value * 2, arguments(), max_pending=3)
+            self.assertEqual(next(results), 0)
+            self.assertEqual(len(submitted), 3)
+            self.assertEqual(list(results), [value * 2 for value in range(1, 10)])
+        self.assertEqual(list(pipeline.bounded_map(None, pow, [2, 3], [2, 2])), [4, 9])
+
+if __name__ == '__main__':
+    unittest.main()
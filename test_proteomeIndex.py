@@ -0,0 +1,54 @@
+import unittest
+import os
+import tempfile
+import proteomeIndex
+import uniProtCache
+
+FASTA = """>tr|A0A024R161|A0A024R161_HUMAN Guanine nucleotide-binding protein OS=Homo sapiens OX=9606 GN=DNAJC25-GNG10 PE=3 SV=1
+MGAPLLSPGWGAGAAGRRWWMLLAPLLPALLLVRPAGALVEGLYCGTRDCYEVLGVSRSA
+GKAEIARAYRQLARRYHPDRYRPQPGDEGPGRTPQSAEEAFLLVATAYETLKDEETRKDY
+>tr|Q9XXXX|Q9XXXX_HUMAN Unreviewed p53 OS=Homo sapiens OX=9606 GN=TP53 PE=4 SV=1
+MEEPQSD
+>sp|P04637|P53_HUMAN Cellular tumor antigen p53 OS=Homo sapiens OX=9606 GN=TP53 PE=1 SV=4
+MEEPQSDPSVEPPLSQETFSDLWKLLPENNVLSPLPSQAMDDLMLSPDDIEQWFTEDPGP
+>sp|P02340|P53_MOUSE Cellular tumor antigen p53 OS=Mus musculus OX=10090 GN=Tp53 PE=1 SV=4
+MTAMEESQSDISLELPLSQETFSGLWKLLPPEDILPSPHCMDDLLLPQDVEEFFEGPSEA
+"""
+
+
+class proteomeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        fasta_path = os.path.join(self.directory.name, "uniprot.fasta")
+        with open(fasta_path, "w") as fasta:
+            fasta.write(FASTA)
+        self.count = proteomeIndex.build_proteome_index(fasta_path, os.path.join(self.directory.name, "indice"))
+        self.index = proteomeIndex.ProteomeIndex(os.path.join(self.directory.name, "indice"))
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_build_filters_taxonomy(self):
+        self.assertEqual(self.count, 3)
+        self.assertIsNone(self.index.get_uniprot_id("Tp53"))
+
+    def test_get_uniprot_id_prefers_reviewed(self):
+        self.assertEqual(self.index.get_uniprot_id("TP53"), "P04637")
+        self.assertEqual(self.index.get_uniprot_id("DNAJC25-GNG10"), "A0A024R161")
+        self.assertIsNone(self.index.get_uniprot_id("BRCA1"))
+
+    def test_get_protein_sequence(self):
+        self.assertEqual(self.index.get_protein_sequence("P04637"), "MEEPQSDPSVEPPLSQETFSDLWKLLPENNVLSPLPSQAMDDLMLSPDDIEQWFTEDPGP")
+        self.assertEqual(len(self.index.get_protein_sequence("A0A024R161")), 120)
+        self.assertIsNone(self.index.get_protein_sequence("P00000"))
+
+    def test_uniprot_cache_offline(self):
+        cache = uniProtCache.UniProtCache(proteome_index=self.index, use_http=False)
+        self.assertEqual(cache.cached_get_uniprot_info("TP53")[0], "P04637")
+        self.assertEqual(cache.cached_get_uniprot_info("BRCA1"), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
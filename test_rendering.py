@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import tempfile
+import importlib
+import rendering
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+def plot_series(series, path):
+    plt.figure()
+    plt.plot(series.to_numpy())
+    plt.savefig(path)
+
+
+class renderingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.directory.name, "render_manifest.json")
+        self.data = {name: pd.Series([1.0, 2.0, 3.0], name=name) for name in ["a", "b"]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def tasks(self):
+        tasks = []
+        for name, series in self.data.items():
+            path = os.path.join(self.directory.name, "figuras", f"{name}.png")
+            tasks.append(rendering.FigureTask(name, plot_series, series, {"path": path}, outputs=[path]))
+        return tasks
+
+    def test_hash_data_depends_on_values_and_columns(self):
+        df = pd.DataFrame({"x": [1, 2], "y": ["a", "b"]})
+        self.assertEqual(rendering.hash_data(df), rendering.hash_data(df.copy()))
+        self.assertNotEqual(rendering.hash_data(df), rendering.hash_data(df.assign(x=[1, 3])))
+        self.assertNotEqual(rendering.hash_data(df), rendering.hash_data(df.rename(columns={"y": "z"})))
+
+    def test_renders_only_figures_whose_data_changed(self):
+        for n_workers in [1, 2]:
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            self.data["b"] = pd.Series([1.0, 2.0, 3.0], name="b")
+            self.assertEqual(rendering.FigureRenderer(self.manifest_path).run(self.tasks(), n_workers=n_workers), ["a", "b"])
+            self.assertEqual(rendering.FigureRenderer(self.manifest_path).run(self.tasks(), n_workers=n_workers), [])
+
+            self.data["b"] = pd.Series([3.0, 2.0, 1.0], name="b")
+            self.assertEqual(rendering.FigureRenderer(self.manifest_path).run(self.tasks(), n_workers=n_workers), ["b"])
+
+            os.remove(os.path.join(self.directory.name, "figuras", "a.png"))
+            self.assertEqual(rendering.FigureRenderer(self.manifest_path).run(self.tasks(), force=["b"], n_workers=n_workers), ["a", "b"])
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_fingerprint_changes_with_the_code_of_the_plot_and_its_helpers(self):
+        # Un módulo de figuras que usa una función auxiliar de otro módulo del proyecto
+        modules_dir = os.path.join(self.directory.name, "modulos")
+        os.makedirs(modules_dir)
+        files = {
+            "figuras_prueba.py": "from auxiliares_prueba import dibujar\n\ndef figura(series, path):\n    dibujar(series, path)\n",
+            "auxiliares_prueba.py": "def dibujar(series, path):\n    pass\n",
+        }
+        for filename, source in files.items():
+            with open(os.path.join(modules_dir, filename), "w") as handle:
+                handle.write(source)
+        sys.path.insert(0, modules_dir)
+        self.addCleanup(sys.path.remove, modules_dir)
+        self.addCleanup(sys.modules.pop, "figuras_prueba", None)
+        self.addCleanup(sys.modules.pop, "auxiliares_prueba", None)
+        figuras_prueba = importlib.import_module("figuras_prueba")
+
+        task = rendering.FigureTask("a", figuras_prueba.figura, self.data["a"], {"path": "a.png"}, outputs=["a.png"])
+        fingerprint = task.fingerprint()
+        self.assertEqual(task.fingerprint(), fingerprint)
+
+        # Cambiar solo la función auxiliar también obliga a volver a renderizar la figura
+        with open(os.path.join(modules_dir, "auxiliares_prueba.py"), "a") as handle:
+            handle.write("    plt.close()\n")
+        self.assertNotEqual(task.fingerprint(), fingerprint)
+
+    def test_missing_output_is_an_error(self):
+        task = rendering.FigureTask("vacía", plot_series, self.data["a"], {"path": os.path.join(self.directory.name, "a.png")},
+                                    outputs=[os.path.join(self.directory.name, "otra.png")])
+        with self.assertRaises(FileNotFoundError):
+            rendering.FigureRenderer(self.manifest_path).run([task], n_workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
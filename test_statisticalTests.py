@@ -0,0 +1,66 @@
+import unittest
+import os
+import tempfile
+import statisticalTests
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+class statisticalTestsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clinical_df = pd.DataFrame({
+            'Sex': ['Male', 'Female', 'Male', 'Female', 'Male', 'Female', None],
+            'Diagnosis Age': [25, 35, 45, 55, 65, 30, 40],
+            'Neoantigen_SB_Count': [1, 5, 2, 7, 3, 9, 4],
+            'Neoantigen_WB_Count': [10, 12, np.nan, 15, 11, 20, 13],
+        })
+
+    def test_adjust_pvalues(self):
+        pvalues = [0.01, 0.04, 0.03, 0.5]
+        np.testing.assert_allclose(statisticalTests.adjust_pvalues(pvalues), [0.04, 0.16, 0.12, 1.0])
+        np.testing.assert_allclose(statisticalTests.adjust_pvalues(pvalues, "holm"), [0.04, 0.09, 0.09, 0.5])
+        np.testing.assert_allclose(statisticalTests.adjust_pvalues(pvalues, "fdr_bh"), [0.04, 0.0533333, 0.0533333, 0.5], rtol=1e-5)
+        with self.assertRaises(ValueError):
+            statisticalTests.adjust_pvalues(pvalues, "sidak")
+
+    def test_normality_tests_match_scipy_per_column(self):
+        numeric_df = self.clinical_df[['Diagnosis Age', 'Neoantigen_SB_Count']]
+        result = statisticalTests.normality_tests(numeric_df).set_index(['test', 'variable'])
+        for column in numeric_df.columns:
+            self.assertAlmostEqual(result.loc[('Shapiro-Wilk', column), 'pvalue'], stats.shapiro(numeric_df[column]).pvalue)
+            self.assertAlmostEqual(result.loc[('Kolmogorov-Smirnov', column), 'pvalue'], stats.kstest(numeric_df[column], 'norm').pvalue)
+
+    def test_mann_whitney_tests_match_scipy_with_bonferroni(self):
+        result = statisticalTests.mann_whitney_tests(self.clinical_df, {'Sex': None})
+        self.assertEqual(result[['group_1', 'hue_1', 'group_2', 'hue_2']].values.tolist(),
+                         [['Male', 'SB', 'Female', 'SB'], ['Male', 'WB', 'Female', 'WB']])
+
+        male, female = self.clinical_df['Sex'] == 'Male', self.clinical_df['Sex'] == 'Female'
+        expected = [stats.mannwhitneyu(self.clinical_df.loc[male, column].dropna(), self.clinical_df.loc[female, column].dropna(),
+                                       alternative='two-sided').pvalue
+                    for column in ['Neoantigen_SB_Count', 'Neoantigen_WB_Count']]
+        np.testing.assert_allclose(result['pvalue'], expected)
+        np.testing.assert_allclose(result['pvalue_adjusted'], np.minimum(np.array(expected) * 2, 1))
+
+    def test_statistics_table_round_trip_and_lookup(self):
+        contingency_table = pd.DataFrame({'SB': [10, 20], 'WB': [30, 25]}, index=['Transición', 'Transversión'])
+        statistics_df = statisticalTests.compute_statistics(
+            numeric_df=self.clinical_df[['Diagnosis Age']], clinical_df=self.clinical_df, attributes={'Sex': None},
+            contingency_tables={('Clasificación', 'Binding_Classification'): contingency_table})
+        self.assertEqual(statistics_df['test'].tolist(), ['Shapiro-Wilk', 'Kolmogorov-Smirnov', 'Mann-Whitney', 'Mann-Whitney', 'Chi-cuadrado'])
+        self.assertEqual(statistics_df['dof'].iloc[-1], 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = statisticalTests.save_statistics(statistics_df, os.path.join(directory, 'estadisticas'))
+            loaded = statisticalTests.load_statistics(path)
+        box_pairs = [(('Female', 'WB'), ('Male', 'WB'))]
+        with self.assertRaises(KeyError):
+            statisticalTests.box_pair_pvalues(loaded, 'Sex', box_pairs)
+        box_pairs = [(('Male', 'WB'), ('Female', 'WB')), (('Male', 'SB'), ('Female', 'SB'))]
+        self.assertEqual(statisticalTests.box_pair_pvalues(loaded, 'Sex', box_pairs), statistics_df['pvalue_adjusted'].iloc[[3, 2]].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import tempfile
+import storage
+import pandas as pd
+
+
+class storageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "unique_predictions")
+        self.predictions_df = pd.DataFrame({
+            "peptide": ["AAAAAAAAA", "CCCCCCCCC", "DDDDDDDDD"],
+            "presentation_percentile": [0.1, 1.5, 30.0],
+            "gen": ["G1", "G1", "G2"],
+            "patientId": ["P1", "P2", "P2"],
+            "Binding_Classification": ["SB", "WB", "N/A"],
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip_keeps_types_and_categories(self):
+        for table_format in ["parquet", "feather"]:
+            path = storage.write_table(self.predictions_df, self.path, table_format=table_format)
+            self.assertTrue(path.endswith("." + table_format))
+            result = storage.read_table(path)
+            self.assertEqual(result["Binding_Classification"].tolist(), ["SB", "WB", "N/A"])
+            for column in storage.CATEGORICAL_COLUMNS:
+                self.assertIsInstance(result[column].dtype, pd.CategoricalDtype)
+            pd.testing.assert_frame_equal(storage.read_table(path, categorical=False), self.predictions_df)
+
+    def test_read_table_prunes_columns(self):
+        storage.write_table(self.predictions_df, self.path)
+        result = storage.read_table(self.path, columns=["patientId", "peptide"])
+        self.assertEqual(result.columns.tolist(), ["patientId", "peptide"])
+
+    def test_typed_table_has_priority_over_csv(self):
+        self.assertIsNone(storage.resolve_table(self.path))
+        self.predictions_df.iloc[:1].to_csv(self.path + ".csv", index=False)
+        self.assertEqual(len(storage.read_table(self.path)), 1)
+
+        storage.write_table(self.predictions_df, self.path)
+        self.assertEqual(storage.resolve_table(self.path), self.path + ".parquet")
+
+        csv_path = storage.export_csv(self.path)
+        self.assertEqual(csv_path, self.path + ".csv")
+        self.assertEqual(storage.resolve_table(self.path), self.path + ".parquet")
+        exported = pd.read_csv(csv_path, keep_default_na=False)
+        self.assertEqual(exported["Binding_Classification"].tolist(), ["SB", "WB", "N/A"])
+
+
+    def test_write_batches_skips_empty_blocks_and_types_null_columns(self):
+        batches = [
+            pd.DataFrame({"peptide": pd.Series([], dtype=object), "peptide_wt": pd.Series([], dtype=object), "affinity": pd.Series([], dtype=float)}),
+            pd.DataFrame({"peptide": ["AAAAAAAAA"], "peptide_wt": [None], "affinity": [10.0]}),
+            pd.DataFrame({"peptide": ["CCCCCCCCC"], "peptide_wt": ["CCCCCCCCA"], "affinity": [20.0]}),
+        ]
+        path = storage.write_batches(iter(batches), self.path)
+        self.assertEqual(path, self.path + ".parquet")
+        result = storage.read_table(path)
+        self.assertEqual(result["peptide"].tolist(), ["AAAAAAAAA", "CCCCCCCCC"])
+        self.assertEqual(result["peptide_wt"].tolist(), [None, "CCCCCCCCA"])
+        self.assertEqual(os.listdir(self.directory.name), ["unique_predictions.parquet"])
+
+        self.assertEqual(len(storage.read_table(storage.write_batches(batches[:1], self.path))), 0)
+        with self.assertRaises(ValueError):
+            storage.write_batches([], self.path)
+
+if __name__ == '__main__':
+    unittest.main()
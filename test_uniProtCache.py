@@ -0,0 +1,90 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+import requests
+import getInformation
+import uniProtCache
+
+
+class uniProtCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "uniprot.sqlite")
+        self.get_uniprot_id = mock.patch("getInformation.get_uniprot_id", side_effect=lambda gene: {"TP53": "P04637"}.get(gene)).start()
+        self.get_protein_sequence = mock.patch("getInformation.get_protein_sequence", return_value="MEEPQSD").start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.directory.cleanup()
+
+    def test_persists_between_instances(self):
+        uniProtCache.UniProtCache(db_path=self.db_path).cached_get_uniprot_info("TP53")
+        cache = uniProtCache.UniProtCache(db_path=self.db_path)
+        self.assertEqual(cache.cached_get_uniprot_info("TP53"), ("P04637", "MEEPQSD"))
+        self.assertEqual(self.get_uniprot_id.call_count, 1)
+        self.assertEqual(self.get_protein_sequence.call_count, 1)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 0})
+
+    def test_negative_results_use_shorter_ttl(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path, ttl=3600, negative_ttl=0)
+        self.assertEqual(cache.cached_get_uniprot_info("BRCA1"), (None, None))
+        cache.cached_get_uniprot_info("BRCA1")
+        cache.cached_get_uniprot_info("TP53")
+        cache.cached_get_uniprot_info("TP53")
+        self.assertEqual(self.get_uniprot_id.call_count, 3)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 4})
+
+    def test_request_errors_are_not_cached(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path)
+        self.get_uniprot_id.side_effect = getInformation.UniProtRequestError("503")
+        self.assertEqual(cache.cached_get_uniprot_info("TP53"), (None, None))
+        self.get_uniprot_id.side_effect = requests.ConnectionError()
+        self.assertEqual(cache.cached_get_uniprot_info("TP53"), (None, None))
+        self.get_uniprot_id.side_effect = lambda gene: "P04637"
+        self.assertEqual(cache.cached_get_uniprot_info("TP53"), ("P04637", "MEEPQSD"))
+        self.assertEqual(self.get_uniprot_id.call_count, 3)
+
+    def test_hits_do_not_rewrite_recent_last_access(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path)
+        cache.cached_get_uniprot_info("TP53")
+        changes = cache.connection.total_changes
+        cache.cached_get_uniprot_info("TP53")
+        cache.bulk_get_uniprot_info(["TP53"])
+        self.assertEqual(cache.connection.total_changes, changes)
+
+        cache.connection.execute("UPDATE genes SET last_access = 0")
+        changes = cache.connection.total_changes
+        cache.cached_get_uniprot_info("TP53")
+        self.assertEqual(cache.connection.total_changes, changes + 1)
+
+    def test_bulk_get_uniprot_info_resolves_only_uncached_genes(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path)
+        cache.cached_get_uniprot_info("TP53")
+        with mock.patch("getInformation.resolve_genes_bulk", return_value={"KRAS": ("P01116", "MTEY"), "NOTAGENE": (None, None)}) as resolver:
+            result = cache.bulk_get_uniprot_info(["TP53", "KRAS", "KRAS", "NOTAGENE"], max_workers=4)
+        resolver.assert_called_once_with({"KRAS", "NOTAGENE"}, max_workers=4)
+        self.assertEqual(result, {"TP53": ("P04637", "MEEPQSD"), "KRAS": ("P01116", "MTEY"), "NOTAGENE": (None, None)})
+        self.assertEqual(cache.cached_get_uniprot_info("KRAS"), ("P01116", "MTEY"))
+
+    def test_bulk_get_uniprot_info_does_not_cache_failures(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path)
+        failure = {"KRAS": ("P01116", "MTEY"), "DOWN": getInformation.UNIPROT_FAILED}
+        with mock.patch("getInformation.resolve_genes_bulk", return_value=failure):
+            self.assertEqual(cache.bulk_get_uniprot_info(["KRAS", "DOWN"]), {"KRAS": ("P01116", "MTEY"), "DOWN": (None, None)})
+        with mock.patch("getInformation.resolve_genes_bulk", return_value={"DOWN": ("P00533", "MRPS")}) as resolver:
+            self.assertEqual(cache.bulk_get_uniprot_info(["KRAS", "DOWN"]), {"KRAS": ("P01116", "MTEY"), "DOWN": ("P00533", "MRPS")})
+        resolver.assert_called_once_with({"DOWN"})
+
+    def test_evicts_least_recently_used(self):
+        cache = uniProtCache.UniProtCache(db_path=self.db_path, max_entries=2)
+        cache.store("genes", [("A", "P1"), ("B", "P2")])
+        cache.connection.execute("UPDATE genes SET last_access = 0 WHERE gene = 'A'")
+        cache.store("genes", [("C", "P3")])
+        genes = [row[0] for row in cache.connection.execute("SELECT gene FROM genes ORDER BY gene")]
+        self.assertEqual(genes, ["B", "C"])
+
+
+if __name__ == '__main__':
+    unittest.main()
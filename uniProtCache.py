@@ -1,26 +1,199 @@
+import os
+import sqlite3
+import time
+
+import requests
+
 import getInformation
 
+# Tiempos de validez por defecto de las entradas de la caché (en segundos)
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+# Antigüedad mínima de last_access para volver a escribirlo en un acierto (en segundos)
+ACCESS_UPDATE_INTERVAL = 3600
+
 class UniProtCache:
-    def __init__(self):
-        self.uniprot_cache = {}
-        self.sequence_cache = {}
+    def __init__(self, proteome_index=None, use_http=True, db_path=":memory:", ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=200000):
+        """
+        Crea la caché de información de UniProt.
+        Los resultados se guardan en SQLite. Con una ruta de archivo la caché persiste entre ejecuciones y, al usar el
+        modo WAL, varios procesos pueden compartirla. Las entradas caducan tras ttl segundos, las búsquedas sin
+        resultado (None) tras negative_ttl segundos, y al superar max_entries se eliminan las usadas menos recientemente.
+        Args:
+            proteome_index (ProteomeIndex, opcional): Índice local del proteoma. Si se proporciona, los genes y las
+                secuencias se resuelven primero en él, sin llamadas a la API. Por defecto es None.
+            use_http (bool, opcional): Si es True, los genes y secuencias que no están en el índice local se buscan
+                en la API de UniProt. Con False el pipeline funciona sin conexión. Por defecto es True.
+            db_path (str, opcional): Ruta del archivo SQLite. Por defecto es ":memory:" (caché solo en memoria).
+            ttl (float, opcional): Segundos de validez de una entrada encontrada. Por defecto son 30 días.
+            negative_ttl (float, opcional): Segundos de validez de una búsqueda sin resultado. Por defecto es 1 día.
+            max_entries (int, opcional): Número máximo de entradas de cada tabla. Por defecto es 200.000.
+        """
+        self.proteome_index = proteome_index
+        self.use_http = use_http
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if db_path != ":memory:" and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=30)
+        if db_path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS genes (gene TEXT PRIMARY KEY, uniprot_id TEXT, fetched_at REAL, last_access REAL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sequences (uniprot_id TEXT PRIMARY KEY, sequence TEXT, fetched_at REAL, last_access REAL)")
+
+    def _get_uniprot_id(self, gene):
+        uniprot_id = self.proteome_index.get_uniprot_id(gene) if self.proteome_index is not None else None
+        if uniprot_id is None and self.use_http:
+            uniprot_id = getInformation.get_uniprot_id(gene)
+        return uniprot_id
+
+    def _get_protein_sequence(self, uniprot_id):
+        sequence = self.proteome_index.get_protein_sequence(uniprot_id) if self.proteome_index is not None else None
+        if sequence is None and self.use_http:
+            sequence = getInformation.get_protein_sequence(uniprot_id)
+        return sequence
+
+    def _lookup(self, table, key_column, value_column, key, fetch):
+        """
+        Busca una entrada en la caché y, si no está o ha caducado, la obtiene con fetch y la guarda.
+        Solo se guardan las búsquedas completadas: si la consulta a UniProt falla se devuelve None sin guardarlo,
+        para no confundir un error transitorio con una búsqueda sin resultado. En un acierto, last_access solo se
+        actualiza si tiene más de ACCESS_UPDATE_INTERVAL segundos, lo que basta para el orden de la política LRU.
+        """
+        now = time.time()
+        row = self.connection.execute(
+            f"SELECT {value_column}, fetched_at, last_access FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        if row is not None:
+            value, fetched_at, last_access = row
+            if now - fetched_at < (self.ttl if value is not None else self.negative_ttl):
+                self.hits += 1
+                if now - last_access >= ACCESS_UPDATE_INTERVAL:
+                    with self.connection:
+                        self.connection.execute(f"UPDATE {table} SET last_access = ? WHERE {key_column} = ?", (now, key))
+                return value
+
+        self.misses += 1
+        try:
+            value = fetch(key)
+        except (requests.RequestException, getInformation.UniProtRequestError) as error:
+            print(error)
+            return None
+        self.store(table, [(key, value)])
+        return value
+
+    def store(self, table, items):
+        """
+        Guarda varias entradas en la caché y aplica el límite de tamaño.
+        Args:
+            table (str): "genes" (gen -> ID de UniProt) o "sequences" (ID de UniProt -> secuencia).
+            items (list): Lista de tuplas (clave, valor). Un valor None se guarda como búsqueda sin resultado.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                                        ((key, value, now, now) for key, value in items))
+            total = self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if total > self.max_entries:
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY last_access LIMIT ?)",
+                    (total - self.max_entries,))
+
+    def stats(self):
+        """
+        Devuelve los contadores de aciertos y fallos de la caché.
+        Returns:
+            dict: Un diccionario con las claves "hits" y "misses".
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _fresh_entries(self, table, key_column, value_column, keys):
+        """
+        Busca en bloque las entradas de la caché que no han caducado.
+        """
+        now = time.time()
+        keys = list(keys)
+        fresh = {}
+        stale_access = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT {key_column}, {value_column}, fetched_at, last_access FROM {table} WHERE {key_column} IN ({', '.join('?' for _ in chunk)})",
+                chunk).fetchall()
+            for key, value, fetched_at, last_access in rows:
+                if now - fetched_at < (self.ttl if value is not None else self.negative_ttl):
+                    fresh[key] = value
+                    if now - last_access >= ACCESS_UPDATE_INTERVAL:
+                        stale_access.append(key)
+        with self.connection:
+            self.connection.executemany(f"UPDATE {table} SET last_access = ? WHERE {key_column} = ?", ((now, key) for key in stale_access))
+        return fresh
+
+    def bulk_get_uniprot_info(self, genes, **resolver_options):
+        """
+        Recupera la información de UniProt de un conjunto de genes, resolviendo cada gen distinto una sola vez.
+        Los genes que están en la caché se leen en bloque. El resto se resuelve con el índice local del proteoma,
+        si lo hay, y después con getInformation.resolve_genes_bulk, que consulta UniProt de forma concurrente y por lotes.
+        Args:
+            genes (iterable): Los símbolos de los genes. Puede contener repetidos.
+            **resolver_options: Opciones para getInformation.resolve_genes_bulk (max_workers, requests_per_second, base_url, ...).
+        Returns:
+            dict: Un diccionario gen -> (ID de UniProt, secuencia), con la misma forma que cached_get_uniprot_info.
+                Los genes cuya consulta ha fallado tienen (None, None) pero no se guardan en la caché.
+        """
+        unique_genes = {gene for gene in genes if isinstance(gene, str)}
+        gene_ids = self._fresh_entries("genes", "gene", "uniprot_id", unique_genes)
+        sequences = self._fresh_entries("sequences", "uniprot_id", "sequence", {uniprot_id for uniprot_id in gene_ids.values() if uniprot_id})
+        cached_genes = {gene for gene, uniprot_id in gene_ids.items() if uniprot_id is None or uniprot_id in sequences}
+        self.hits += len(cached_genes)
+
+        missing = unique_genes - cached_genes
+        self.misses += len(missing)
+        if self.proteome_index is not None:
+            for gene in list(missing):
+                uniprot_id = gene_ids.get(gene) or self.proteome_index.get_uniprot_id(gene)
+                sequence = self.proteome_index.get_protein_sequence(uniprot_id) if uniprot_id else None
+                if sequence is not None:
+                    gene_ids[gene], sequences[uniprot_id] = uniprot_id, sequence
+                    missing.discard(gene)
+        failed = set()
+        if missing and self.use_http:
+            for gene, info in getInformation.resolve_genes_bulk(missing, **resolver_options).items():
+                # Los genes cuya consulta ha fallado no se guardan: se volverán a consultar en la siguiente ejecución
+                if info is getInformation.UNIPROT_FAILED:
+                    failed.add(gene)
+                    continue
+                gene_ids[gene], sequence = info
+                if gene_ids[gene]:
+                    sequences[gene_ids[gene]] = sequence
+        for gene in missing:
+            gene_ids.setdefault(gene, None)
+
+        resolved = unique_genes - cached_genes - failed
+        self.store("genes", [(gene, gene_ids[gene]) for gene in resolved])
+        self.store("sequences", [(gene_ids[gene], sequences.get(gene_ids[gene])) for gene in resolved if gene_ids[gene]])
+        return {gene: (gene_ids[gene], sequences.get(gene_ids[gene]) if gene_ids[gene] else None) for gene in unique_genes}
 
     def cached_get_uniprot_info(self, gene):
         """
         Recupera información de UniProt para un gen dado, utilizando una caché para minimizar llamadas redundantes a la API.
+        Si hay un índice local del proteoma se consulta primero y la API solo se usa como alternativa.
         Args:
             gene (str): El símbolo del gen para el cual se desea recuperar información de UniProt.
         Returns:
             tuple: Una tupla que contiene el ID de UniProt y la secuencia de la proteína. Si no se encuentra el ID de UniProt,
                el segundo elemento de la tupla será None.
         """
-        if gene not in self.uniprot_cache:
-            self.uniprot_cache[gene] = getInformation.get_uniprot_id(gene)
-        uniprot_id = self.uniprot_cache[gene]
+        uniprot_id = self._lookup("genes", "gene", "uniprot_id", gene, self._get_uniprot_id)
         
         if uniprot_id:
-            if uniprot_id not in self.sequence_cache:
-                    self.sequence_cache[uniprot_id] = getInformation.get_protein_sequence(uniprot_id)
-            return uniprot_id, self.sequence_cache[uniprot_id]
+            return uniprot_id, self._lookup("sequences", "uniprot_id", "sequence", uniprot_id, self._get_protein_sequence)
         else:
             return uniprot_id, None